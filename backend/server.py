@@ -1,23 +1,67 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Query
+from fastapi import FastAPI, APIRouter, HTTPException, Query, Request, Response
 from dotenv import load_dotenv
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import IndexModel, ASCENDING, DESCENDING, TEXT, ReturnDocument, UpdateOne
+from pymongo.collation import Collation, CollationStrength
+from pymongo.errors import BulkWriteError, CollectionInvalid, DuplicateKeyError, OperationFailure
 import os
+import re
+import time
+import asyncio
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, ValidationError
 from typing import List, Optional
 import uuid
-from datetime import datetime, timezone
+import io
+import csv
+import json
+import base64
+import binascii
+import zlib
+import numpy as np
+from datetime import datetime, timezone, timedelta
+from dateutil.relativedelta import relativedelta
 from enum import Enum
+from functools import lru_cache
+
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse
+except ImportError:  # orjson is optional, responses fall back to the stdlib encoder
+    orjson = None
+    ORJSONResponse = None
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
 
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Return trusted MongoDB documents from list endpoints without re-validating them through response_model
+FAST_RESPONSES = os.environ.get('FAST_RESPONSES', '1') == '1'
+
+# Responses smaller than this are sent uncompressed
+COMPRESSION_MINIMUM_SIZE = 1024
+
+# Run the recurring-transaction scheduler in this process (set to 0 on workers that should never generate)
+RECURRING_SCHEDULER = os.environ.get('RECURRING_SCHEDULER', '1') == '1'
+
+# GET /alerts is polled by every open dashboard tab; slower responses are logged
+ALERTS_LATENCY_BUDGET_MS = float(os.environ.get('ALERTS_LATENCY_BUDGET_MS', '250'))
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# tz_aware: BSON dates come back as UTC-aware datetimes, comparable with datetime.now(timezone.utc)
+client = AsyncIOMotorClient(mongo_url, tz_aware=True)
 db = client[os.environ['DB_NAME']]
 
 # Create the main app without a prefix
@@ -169,6 +213,7 @@ class Stock(BaseModel):
     lots: float
     buy_price: float  # Average buy price per share
     current_price: float
+    price_as_of: Optional[datetime] = None  # Quote time of current_price, set by /prices/bulk
     buy_date: datetime
     notes: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -196,6 +241,8 @@ class Deposit(BaseModel):
     start_date: datetime
     maturity_date: datetime
     is_auto_renewal: bool = False
+    renewals: int = 0  # Terms rolled over automatically
+    interest_earned: float = 0  # Net interest rolled into `amount` by renewals
     notes: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -218,6 +265,7 @@ class Gold(BaseModel):
     weight_grams: float
     buy_price_per_gram: float
     current_price_per_gram: float
+    price_as_of: Optional[datetime] = None  # Quote time of current_price_per_gram, set by /prices/bulk
     purchase_location: str
     buy_date: datetime
     certificate_number: Optional[str] = None
@@ -246,6 +294,7 @@ class MutualFund(BaseModel):
     units: float
     buy_nav: float  # NAB saat beli
     current_nav: float  # NAB saat ini
+    price_as_of: Optional[datetime] = None  # Quote time of current_nav, set by /prices/bulk
     buy_date: datetime
     notes: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -292,6 +341,51 @@ class DebtCreate(BaseModel):
     start_date: Optional[datetime] = None
     notes: Optional[str] = None
 
+# Market Price Models
+class MarketPrice(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str  # "<asset_class>:<symbol>"
+    asset_class: str  # stocks, gold, mutual_funds
+    symbol: str  # Ticker, gold type or fund product name, upper-cased
+    price: float  # Per share, per gram or NAV per unit
+    quoted_at: datetime
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class MarketQuote(BaseModel):
+    asset_class: str
+    symbol: str
+    price: float = Field(..., gt=0)
+    quoted_at: Optional[datetime] = None  # Defaults to the sheet's quoted_at
+
+
+class DebtPayment(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    debt_id: str
+    creditor: str
+    amount: float
+    installments: int = 1
+    account: str  # Account the money left
+    transaction_id: str  # The matching expense transaction
+    balance_after: float
+    date: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    notes: Optional[str] = None
+
+class DebtPaymentCreate(BaseModel):
+    amount: float = Field(..., gt=0)
+    account: str
+    installments: int = Field(1, ge=0)  # Installments this payment covers
+    payment_method: PaymentMethod = PaymentMethod.TRANSFER
+    date: Optional[datetime] = None
+    notes: Optional[str] = None
+
+class DebtSimulationRequest(BaseModel):
+    strategies: List[str] = ["avalanche", "snowball", "minimum"]  # avalanche, snowball, custom, minimum
+    extra_payment: float = Field(0, ge=0)  # Paid on top of every minimum each month
+    custom_order: List[str] = []  # Debt ids the custom strategy pays off first, in order
+    debt_ids: Optional[List[str]] = None  # Defaults to every active debt
+    months: int = Field(360, ge=1, le=600)
+
 
 # Bill Payment History
 class BillPayment(BaseModel):
@@ -391,7 +485,7 @@ class RecurringTransaction(BaseModel):
     amount: float
     type: TransactionType
     category: str
-    account: str
+    account: Optional[str] = None  # Unset on legacy bills; the scheduler skips them until one is chosen
     frequency: str = "Monthly"  # Daily, Weekly, Monthly, Yearly
     day_of_month: int = 1  # For monthly
     is_active: bool = True
@@ -410,6 +504,48 @@ class RecurringTransactionCreate(BaseModel):
     day_of_month: int = 1
     notes: Optional[str] = None
 
+class SmartCategorizeBatch(BaseModel):
+    descriptions: List[str] = Field(..., max_length=10000)
+    type: Optional[TransactionType] = None
+
+
+# Categorization Rule Models
+class CategorizationRule(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str
+    priority: int = 100  # Lower runs first; the first matching rule wins
+    # Conditions: every one that is set must hold
+    description_pattern: Optional[str] = None
+    pattern_type: str = "keyword"  # keyword (whole words, any case), regex
+    min_amount: Optional[float] = None
+    max_amount: Optional[float] = None
+    account: Optional[str] = None
+    type: Optional[TransactionType] = None
+    tags: List[str] = []  # Transaction must carry all of these
+    # Actions
+    category: TransactionCategory
+    sub_category: Optional[TransactionSubCategory] = None
+    add_tags: List[str] = []
+    is_active: bool = True
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class CategorizationRuleCreate(BaseModel):
+    name: str
+    priority: int = 100
+    description_pattern: Optional[str] = None
+    pattern_type: str = "keyword"
+    min_amount: Optional[float] = None
+    max_amount: Optional[float] = None
+    account: Optional[str] = None
+    type: Optional[TransactionType] = None
+    tags: List[str] = []
+    category: TransactionCategory
+    sub_category: Optional[TransactionSubCategory] = None
+    add_tags: List[str] = []
+    is_active: bool = True
+
 
 # Smart Category Keywords
 CATEGORY_KEYWORDS = {
@@ -426,29 +562,2051 @@ CATEGORY_KEYWORDS = {
     "Investment": ["dividen", "dividend", "bunga", "interest", "investasi"],
 }
 
+# Words of a description; digit-only tokens are dropped (reference numbers never match a keyword)
+WORD_PATTERN = re.compile(r"[^\W_]+")
+
+def normalize_description(description: str) -> str:
+    """Lowercase words of a description joined by single spaces, the smart-categorize cache key"""
+    return " ".join([word for word in WORD_PATTERN.findall(description.lower()) if not word.isdecimal()])
+
+class KeywordMatcher:
+    """Multi-word keyword matcher compiled once from a {category: [keywords]} table.
+    
+    Keywords are indexed by their first word, so a description costs one dict lookup per word
+    whatever the table size, and only whole words match ("rs" no longer hits "bersama").
+    When several keywords match, the one with the most words wins, then the longest,
+    then the earliest in the table.
+    """
+    
+    def __init__(self, table: dict):
+        self.entries = []
+        self.first_words = {}
+        for category, keywords in table.items():
+            for keyword in keywords:
+                words = tuple(normalize_description(keyword).split())
+                rank = (-len(words), -len(keyword), len(self.entries))
+                self.first_words.setdefault(words[0], []).append((words, rank))
+                self.entries.append((keyword, category))
+    
+    def match(self, normalized: str):
+        """Return the winning (keyword, category) for a normalized description, or None"""
+        words = normalized.split()
+        if self.first_words.keys().isdisjoint(words):
+            return None
+        best = None
+        for position, word in enumerate(words):
+            for keyword_words, rank in self.first_words.get(word, ()):
+                if len(keyword_words) > 1 and tuple(words[position:position + len(keyword_words)]) != keyword_words:
+                    continue
+                if best is None or rank < best:
+                    best = rank
+        return self.entries[best[2]] if best else None
+    
+    def matches(self, normalized: str):
+        """Every (keyword, label) entry found in a normalized description"""
+        words = normalized.split()
+        if self.first_words.keys().isdisjoint(words):
+            return []
+        found = []
+        for position, word in enumerate(words):
+            for keyword_words, rank in self.first_words.get(word, ()):
+                if len(keyword_words) == 1 or tuple(words[position:position + len(keyword_words)]) == keyword_words:
+                    found.append(self.entries[rank[2]])
+        return found
+
+CATEGORY_MATCHER = KeywordMatcher(CATEGORY_KEYWORDS)
+
+@lru_cache(maxsize=10000)
+def match_category(normalized: str):
+    """Cached CATEGORY_MATCHER lookup; statements repeat the same merchants constantly"""
+    return CATEGORY_MATCHER.match(normalized)
+
+# Suggestions by (normalized description, type), valid while CATEGORY_MODEL.version is unchanged
+SUGGESTION_CACHE_SIZE = 10000
+SUGGESTION_CACHE = {"version": None, "entries": {}}
+
+def category_scope(type) -> Optional[set]:
+    """Categories a suggestion may pick for a transaction type (None = any)"""
+    if type == TransactionType.INCOME.value:
+        return INCOME_CATEGORIES
+    if type == TransactionType.EXPENSE.value:
+        return EXPENSE_CATEGORIES
+    return None
+
+def suggest_category(description: str, type: Optional[str] = None):
+    """Smart-categorize one description (see suggest_categories)"""
+    type = getattr(type, "value", type)
+    if SUGGESTION_CACHE["version"] == CATEGORY_MODEL.version:
+        cached = SUGGESTION_CACHE["entries"].get((normalize_description(description), type if isinstance(type, str) else None))
+        if cached is not None:
+            return dict(cached)
+    return suggest_categories([(description, type)])[0]
+
+def suggest_categories(items):
+    """Smart-categorize (description, type) pairs, in order.
+    
+    The ledger-trained model answers when it is reasonably sure; otherwise a keyword match,
+    then the model's best guess, then the "Other" category of the transaction type.
+    Statements repeat merchants, so suggestions are cached per normalized description; the
+    uncached ones are scored by the model in one batch per type.
+    """
+    if SUGGESTION_CACHE["version"] != CATEGORY_MODEL.version or len(SUGGESTION_CACHE["entries"]) > SUGGESTION_CACHE_SIZE:
+        SUGGESTION_CACHE.update(version=CATEGORY_MODEL.version, entries={})
+    entries = SUGGESTION_CACHE["entries"]
+    
+    keys = []
+    missing = {}
+    for description, type in items:
+        type = getattr(type, "value", type)
+        key = (normalize_description(description), type if isinstance(type, str) else None)
+        keys.append(key)
+        if key not in entries:
+            missing.setdefault(key[1], {})[key[0]] = None
+    
+    for type, normalized in missing.items():
+        allowed = category_scope(type)
+        predictions = CATEGORY_MODEL.predict_many([category_features(text) for text in normalized], allowed)
+        for text, probabilities in zip(normalized, predictions):
+            entries[(text, type)] = build_suggestion(text, type, allowed, probabilities)
+    return [dict(entries[key]) for key in keys]
+
+def build_suggestion(normalized: str, type: Optional[str], allowed: Optional[set], probabilities):
+    """Combine the model's probabilities with the keyword match into one suggestion"""
+    match = match_category(normalized)
+    if match and allowed is not None and match[1] not in allowed:
+        match = None
+    
+    result = {"probability": None, "probabilities": {}, "matched_keyword": match[0] if match else None}
+    if probabilities:
+        category, probability = next(iter(probabilities.items()))
+        result["probability"] = round(probability, 4)
+        result["probabilities"] = {c: round(p, 4) for c, p in list(probabilities.items())[:3]}
+    
+    if probabilities and (probability >= 0.5 or match is None):
+        confidence = "high" if probability >= 0.8 else "medium" if probability >= 0.5 else "low"
+        return {"suggested_category": category, "confidence": confidence, "source": "model", **result}
+    if match is not None:
+        return {"suggested_category": match[1], "confidence": "high", "source": "keyword", **result}
+    fallback = "Other Income" if type == TransactionType.INCOME.value else "Other Expense"
+    return {"suggested_category": fallback, "confidence": "low", "source": "default", **result}
+
 
 # ==================== HELPER FUNCTIONS ====================
-def serialize_datetime(obj):
-    """Convert datetime objects to ISO string for MongoDB"""
-    if isinstance(obj, dict):
-        return {k: serialize_datetime(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [serialize_datetime(item) for item in obj]
-    elif isinstance(obj, datetime):
-        return obj.isoformat()
-    return obj
-
-def deserialize_datetime(obj):
-    """Convert ISO string to datetime objects"""
-    if isinstance(obj, dict):
-        for key in ['date', 'created_at', 'updated_at', 'timestamp', 'buy_date', 'start_date', 'maturity_date', 'target_date', 'payment_date']:
-            if key in obj and isinstance(obj[key], str):
+# Fields stored as native BSON dates (older documents may still hold ISO strings)
+DATETIME_FIELDS = ['date', 'created_at', 'updated_at', 'buy_date', 'start_date', 'maturity_date', 'target_date', 'payment_date', 'price_as_of']
+
+def to_utc(value: datetime) -> datetime:
+    """Treat naive datetimes as UTC and convert aware ones to UTC"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def parse_datetime(value) -> datetime:
+    """Parse an ISO string (or pass through a datetime) as a UTC datetime, raising ValueError"""
+    if isinstance(value, datetime):
+        return to_utc(value)
+    return to_utc(datetime.fromisoformat(value))
+
+def coerce_datetimes(data: dict):
+    """Convert ISO strings in DATETIME_FIELDS of a raw update dict to datetimes, in place"""
+    for key in DATETIME_FIELDS:
+        if isinstance(data.get(key), str):
+            try:
+                data[key] = parse_datetime(data[key])
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid datetime for '{key}': {data[key]}")
+    return data
+
+def date_range_filter(start=None, end=None, end_exclusive: bool = False):
+    """Range condition on a date field that matches both BSON dates and legacy ISO strings.
+    
+    A date-only inclusive `end` ("2025-01-31") covers that whole day: both branches stop before
+    the next day, so legacy strings with a time ("2025-01-31T10:00:00") are kept. Once the
+    datetime migration has finished only the BSON branch is emitted.
+    """
+    date_range = {}
+    string_range = {}
+    try:
+        if start:
+            date_range["$gte"] = parse_datetime(start)
+            string_range["$gte"] = start if isinstance(start, str) else date_range["$gte"].isoformat()
+        if end:
+            end_dt = parse_datetime(end)
+            if isinstance(end, str) and len(end) == 10 and not end_exclusive:
+                end_dt += timedelta(days=1)
+                end = end_dt.strftime('%Y-%m-%d')
+                end_exclusive = True
+            date_range["$lt" if end_exclusive else "$lte"] = end_dt
+            string_range["$lt" if end_exclusive else "$lte"] = end if isinstance(end, str) else end_dt.isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be ISO formatted, e.g. 2025-01-31")
+    
+    if DATETIME_MIGRATION["done"]:
+        return date_range
+    return {"$or": [date_range, {"$type": "string", **string_range}]}
+
+def add_date_condition(query: dict, field: str, condition: dict):
+    """Attach a date_range_filter() result to a query, keeping its $or clauses separate"""
+    if "$or" in condition:
+        query.setdefault("$and", []).append({"$or": [{field: branch} for branch in condition["$or"]]})
+    else:
+        query[field] = condition
+    return query
+
+
+class DocumentCodec:
+    """Converts a model's datetime fields between MongoDB documents and Python.
+    
+    The datetime fields are found once from the Pydantic model, so encode/decode only touch
+    those keys instead of walking every value of the document.
+    """
+    
+    def __init__(self, model):
+        self.model = model
+        self.datetime_fields = tuple(
+            name for name, field in model.model_fields.items()
+            if is_datetime_annotation(field.annotation)
+        )
+        # Only the model's own fields, so unvalidated fast responses never leak internal keys
+        self.projection = {"_id": 0, **{name: 1 for name in model.model_fields}}
+    
+    def decode(self, doc: dict) -> dict:
+        """Parse legacy ISO strings in the datetime fields, in place"""
+        for field in self.datetime_fields:
+            value = doc.get(field)
+            if value.__class__ is str:
                 try:
-                    obj[key] = datetime.fromisoformat(obj[key])
-                except:
+                    doc[field] = datetime.fromisoformat(value)
+                except ValueError:
                     pass
-        return obj
-    return obj
+        return doc
+    
+    def encode(self, doc: dict) -> dict:
+        """Normalize the datetime fields to UTC for BSON storage, in place"""
+        for field in self.datetime_fields:
+            value = doc.get(field)
+            if value.__class__ is datetime:
+                doc[field] = to_utc(value)
+        return doc
+
+def is_datetime_annotation(annotation) -> bool:
+    """True for `datetime` and `Optional[datetime]` field annotations"""
+    if annotation is datetime:
+        return True
+    return datetime in getattr(annotation, "__args__", ())
+
+def to_document(obj: BaseModel) -> dict:
+    """Dump a model into a MongoDB document using its compiled codec"""
+    return MODEL_CODECS[type(obj)].encode(obj.model_dump())
+
+def decode_documents(model, docs: list) -> list:
+    """Decode documents read from MongoDB with the model's compiled codec"""
+    decode = MODEL_CODECS[model].decode
+    return [decode(doc) for doc in docs]
+
+def fast_list_response(model, docs: list, headers: Optional[dict] = None):
+    """Serialize documents read with the model's projection straight to JSON.
+    
+    Returning a Response makes FastAPI skip response_model validation; the route keeps its
+    response_model for the OpenAPI schema. With FAST_RESPONSES off the documents are
+    returned as-is and validated as usual.
+    """
+    docs = decode_documents(model, docs)
+    if not FAST_RESPONSES:
+        return docs
+    if ORJSONResponse is not None:
+        return ORJSONResponse(docs, headers=headers)
+    return JSONResponse(jsonable_encoder(docs), headers=headers)
+
+
+# How the `search` parameter is matched: "literal" (the default) matches the input as an escaped
+# case-insensitive substring; "text" opts into the text index (whole words, relevance-ranked)
+SEARCH_MODES = ["literal", "text"]
+
+def build_transaction_query(
+    search: Optional[str] = None,
+    search_mode: str = "literal",
+    type: Optional[str] = None,
+    category: Optional[str] = None,
+    account: Optional[str] = None,
+    status: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None
+):
+    """Build the transactions filter shared by listing and analytics routes"""
+    query = {}
+    
+    if search and search_mode == "text":
+        query["$text"] = {"$search": search}
+    elif search:
+        pattern = re.escape(search)
+        query["$or"] = [
+            {"description": {"$regex": pattern, "$options": "i"}},
+            {"notes": {"$regex": pattern, "$options": "i"}},
+            {"tags": {"$regex": pattern, "$options": "i"}}
+        ]
+    
+    if type:
+        query["type"] = type
+    
+    if category:
+        query["category"] = category
+    
+    if account:
+        query["account"] = account
+    
+    if status:
+        query["status"] = status
+    
+    if date_from or date_to:
+        add_date_condition(query, "date", date_range_filter(date_from, date_to))
+    
+    if min_amount is not None or max_amount is not None:
+        query["amount"] = {}
+        if min_amount is not None:
+            query["amount"]["$gte"] = min_amount
+        if max_amount is not None:
+            query["amount"]["$lte"] = max_amount
+    
+    return query
+
+# Fields GET /transactions may sort on; each has an (field, id) index for keyset pagination
+TRANSACTION_SORT_FIELDS = ["date", "amount", "created_at"]
+
+def encode_cursor(sort_by: str, direction: int, value, last_id: str) -> str:
+    """Opaque keyset cursor for the row after (value, last_id)"""
+    if isinstance(value, datetime):
+        value = {"$date": value.isoformat()}
+    payload = json.dumps([sort_by, direction, value, last_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor: str):
+    """Inverse of encode_cursor(), raising ValueError for anything malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_by, direction, value, last_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (TypeError, binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if sort_by not in TRANSACTION_SORT_FIELDS or direction not in (1, -1) or not isinstance(last_id, str):
+        raise ValueError("Invalid cursor")
+    if isinstance(value, dict):
+        value = parse_datetime(value.get("$date", ""))
+    return sort_by, direction, value, last_id
+
+def keyset_condition(sort_by: str, direction: int, last_value, last_id: str) -> dict:
+    """Rows after (last_value, last_id) in (sort_by, id) order.
+    
+    MongoDB sorts null/missing values before all others and $gt/$lt never match them, so they get
+    their own branches: they come first ascending and last descending.
+    """
+    op = "$lt" if direction == -1 else "$gt"
+    if last_value is None:
+        branches = [{sort_by: None, "id": {op: last_id}}]
+        if direction == 1:
+            branches.append({sort_by: {"$ne": None}})
+    else:
+        branches = [{sort_by: {op: last_value}}, {sort_by: last_value, "id": {op: last_id}}]
+        if direction == -1:
+            branches.append({sort_by: None})
+    return {"$or": branches}
+
+# Transaction export: columns in output order and rows fetched/flushed per batch
+EXPORT_COLUMNS = [
+    "id", "date", "description", "amount", "type", "category", "sub_category", "account",
+    "payment_method", "status", "notes", "tags", "created_at", "updated_at"
+]
+EXPORT_BATCH_SIZE = 500
+
+# Rows per insert_many call in POST /transactions/import
+IMPORT_BATCH_SIZE = 1000
+
+# "YYYY-MM" bucket of a transaction date, for both BSON dates and legacy ISO strings
+MONTH_KEY_EXPR = {"$cond": [
+    {"$eq": [{"$type": "$date"}, "date"]},
+    {"$dateToString": {"format": "%Y-%m", "date": "$date"}},
+    {"$substrBytes": ["$date", 0, 7]}
+]}
+
+def month_bounds(month_year: str):
+    """Return the ("YYYY-MM-01", next month "YYYY-MM-01") date bounds for a month"""
+    year, month = (int(part) for part in month_year.split('-'))
+    if not 1 <= month <= 12:
+        raise ValueError(f"Invalid month: {month_year}")
+    if month == 12:
+        next_month = f"{year + 1}-01-01"
+    else:
+        next_month = f"{year}-{str(month + 1).zfill(2)}-01"
+    return f"{year}-{str(month).zfill(2)}-01", next_month
+
+# Most months a `months` range or list may cover (ten years)
+MAX_MONTHS_SPAN = 120
+
+MONTH_PATTERN = re.compile(r"(\d{4})-(\d{1,2})")
+
+def normalize_month(month_year: str) -> str:
+    """Zero-pad a YYYY-M or YYYY-MM month ("2025-3" becomes "2025-03"), raising ValueError otherwise"""
+    match = MONTH_PATTERN.fullmatch(month_year.strip())
+    if not match or not 1 <= int(match.group(2)) <= 12:
+        raise ValueError(f"Invalid month: {month_year}")
+    return f"{match.group(1)}-{int(match.group(2)):02d}"
+
+def parse_months(months: str):
+    """Expand "2025-01:2025-12" into every month of the range, or split a comma-separated list.
+    
+    Months may be unpadded ("2025-3"); more than MAX_MONTHS_SPAN months raise ValueError.
+    """
+    if ':' in months:
+        first, last = (normalize_month(part) for part in months.split(':', 1))
+        year, month = int(first[:4]), int(first[5:])
+        span = (int(last[:4]) - year) * 12 + int(last[5:]) - month + 1
+        if span > MAX_MONTHS_SPAN:
+            raise ValueError(f"Range spans {span} months")
+        result = []
+        for _ in range(span):
+            result.append(f"{year}-{month:02d}")
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return result
+    
+    result = [normalize_month(m) for m in months.split(',') if m.strip()]
+    if len(result) > MAX_MONTHS_SPAN:
+        raise ValueError(f"{len(result)} months listed")
+    return result
+
+async def attach_budget_spending(budgets):
+    """Fill in `spent` for every budget using one aggregation over all their categories and months"""
+    if not budgets:
+        return budgets
+    
+    months = sorted({b['month_year'] for b in budgets})
+    categories = sorted({b['category'] for b in budgets})
+    month_start, _ = month_bounds(months[0])
+    _, month_end = month_bounds(months[-1])
+    
+    match = {"type": "expense", "category": {"$in": categories}}
+    add_date_condition(match, "date", date_range_filter(month_start, month_end, end_exclusive=True))
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {"category": "$category", "month_year": MONTH_KEY_EXPR},
+            "total": {"$sum": "$amount"}
+        }}
+    ]
+    
+    results = await db.transactions.aggregate(pipeline).to_list(None)
+    spent = {(r['_id']['category'], r['_id']['month_year']): r['total'] for r in results}
+    
+    for budget in budgets:
+        budget['spent'] = spent.get((budget['category'], budget['month_year']), 0)
+    return budgets
+
+
+# Compiled once per stored model at import time
+MODEL_CODECS = {
+    model: DocumentCodec(model)
+    for model in [
+        Account, Transaction, Stock, Deposit, Gold, MutualFund, MarketPrice, Debt, DebtPayment, BillPayment,
+        FinancialGoal, GoalContribution, Budget, RecurringTransaction, CategorizationRule
+    ]
+}
+
+
+# ==================== INDEXES ====================
+def id_index():
+    """Unique index on the application-level `id` field"""
+    return IndexModel([("id", ASCENDING)], name="id_unique", unique=True)
+
+# Account names are unique ignoring case; queries on `name` must pass this collation to use the index
+ACCOUNT_NAME_COLLATION = Collation(locale="en", strength=CollationStrength.SECONDARY)
+
+# Declared index catalog, applied at startup by ensure_indexes()
+INDEX_CATALOG = {
+    "accounts": [
+        id_index(),
+        IndexModel([("name", ASCENDING)], name="name_ci_unique", unique=True, collation=ACCOUNT_NAME_COLLATION),
+    ],
+    "transactions": [
+        id_index(),
+        # Every sortable field is paired with `id` so keyset pagination never needs an in-memory sort
+        IndexModel([("date", DESCENDING), ("id", DESCENDING)], name="date_id"),
+        IndexModel([("amount", DESCENDING), ("id", DESCENDING)], name="amount_id"),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+        IndexModel([("type", ASCENDING), ("category", ASCENDING), ("date", DESCENDING), ("id", DESCENDING)], name="type_category_date_id"),
+        IndexModel([("account", ASCENDING), ("date", DESCENDING), ("id", DESCENDING)], name="account_date_id"),
+        # Backs ?search_mode=text; no stemming or stop words since entries mix Indonesian and English
+        IndexModel(
+            [("description", TEXT), ("notes", TEXT), ("tags", TEXT)], name="search_text",
+            weights={"description": 10, "tags": 5, "notes": 1}, default_language="none"
+        ),
+    ],
+    "stocks": [id_index()],
+    "deposits": [
+        id_index(),
+        IndexModel([("is_auto_renewal", ASCENDING), ("maturity_date", ASCENDING)], name="auto_renewal_maturity"),
+    ],
+    "gold": [id_index()],
+    "mutual_funds": [id_index()],
+    "market_prices": [id_index()],
+    # Time-series collection (see TIMESERIES_COLLECTIONS); points have no `id`
+    "price_history": [
+        IndexModel([("meta.asset_class", ASCENDING), ("meta.symbol", ASCENDING), ("quoted_at", ASCENDING)], name="asset_symbol_time"),
+    ],
+    "debts": [
+        id_index(),
+        IndexModel([("creditor", ASCENDING), ("is_active", ASCENDING)], name="creditor_active"),
+        # At most one open auto-created debt per charged account, so concurrent charges cannot open two
+        IndexModel([("charge_account", ASCENDING)], name="charge_account_active_unique", unique=True,
+                   partialFilterExpression={"charge_account": {"$exists": True}, "is_active": True}),
+    ],
+    "debt_payments": [
+        id_index(),
+        IndexModel([("debt_id", ASCENDING), ("date", DESCENDING)], name="debt_date"),
+    ],
+    "bill_payments": [
+        id_index(),
+        IndexModel([("bill_id", ASCENDING), ("month_year", ASCENDING)], name="bill_month"),
+    ],
+    "financial_goals": [
+        id_index(),
+        IndexModel([("is_achieved", ASCENDING), ("target_amount", ASCENDING)], name="achieved_target"),
+    ],
+    "goal_contributions": [
+        id_index(),
+        IndexModel([("goal_id", ASCENDING), ("date", DESCENDING)], name="goal_date"),
+    ],
+    "budgets": [
+        id_index(),
+        IndexModel([("category", ASCENDING), ("month_year", ASCENDING)], name="category_month_unique", unique=True),
+    ],
+    "recurring_bills": [
+        id_index(),
+        IndexModel([("is_active", ASCENDING), ("day_of_month", ASCENDING)], name="active_day_of_month"),
+        IndexModel([("is_active", ASCENDING), ("next_due", ASCENDING)], name="active_next_due"),
+    ],
+    "recurring_payments": [
+        id_index(),
+        IndexModel([("recurring_id", ASCENDING), ("month_year", ASCENDING)], name="recurring_month_unique", unique=True),
+        IndexModel([("claimed_at", ASCENDING)], name="pending_claimed_at",
+                   partialFilterExpression={"status": "pending"}),
+    ],
+    # Legacy bills may predate the `id` field
+    "bills": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True,
+                   partialFilterExpression={"id": {"$exists": True}}),
+        IndexModel([("due_date", ASCENDING)], name="due_date"),
+    ],
+    "dashboard_summary": [id_index()],
+    "migrations": [id_index()],
+    "category_model": [id_index()],
+    "categorization_rules": [id_index()],
+    "scheduler_locks": [id_index()],
+    "investment_stocks": [id_index()],
+    "investment_deposits": [id_index()],
+    "investment_gold": [id_index()],
+    "investment_mutual_funds": [id_index()],
+}
+
+# Collections created as MongoDB time-series collections (MongoDB 5.0+) before their indexes
+TIMESERIES_COLLECTIONS = {
+    "price_history": {"timeField": "quoted_at", "metaField": "meta", "granularity": "hours"},
+}
+
+# Indexes replaced by a newer catalog entry, as {retired: replacement}. ensure_indexes() drops a
+# retired index only once its replacement is built, so a failed build keeps the old one serving.
+RETIRED_INDEXES = {
+    "accounts": {"name": "name_ci_unique"},
+    "transactions": {"date": "date_id", "type_category_date": "type_category_date_id", "account_date": "account_date_id"},
+}
+
+# Whether accounts.name_ci_unique is built; until it is, create_account checks for duplicates itself
+ACCOUNT_NAME_INDEX = {"enforced": False}
+
+# Index options that must match for an existing index to count as in sync
+INDEX_OPTIONS = ["unique", "sparse", "partialFilterExpression", "collation", "expireAfterSeconds"]
+
+def index_key(expected: dict):
+    """Key of a declared index as index_information() reports it (text fields become _fts/_ftsx)"""
+    key = []
+    for field, kind in expected["key"].items():
+        if kind != TEXT:
+            key.append((field, kind))
+        elif ("_fts", TEXT) not in key:
+            key += [("_fts", TEXT), ("_ftsx", 1)]
+    return key
+
+def index_matches(expected: dict, actual: dict) -> bool:
+    """Compare a declared IndexModel document with an entry from index_information()"""
+    if index_key(expected) != [(k, v) for k, v in actual["key"]]:
+        return False
+    text_fields = [field for field, kind in expected["key"].items() if kind == TEXT]
+    if text_fields:
+        # The text fields themselves only show up in the weights
+        weights = {field: expected.get("weights", {}).get(field, 1) for field in text_fields}
+        if dict(actual.get("weights", {})) != weights:
+            return False
+        if actual.get("default_language") != expected.get("default_language", "english"):
+            return False
+    for option in INDEX_OPTIONS:
+        want = expected.get(option)
+        have = actual.get(option)
+        if option == "collation" and want is not None and have is not None:
+            # Mongo fills in defaults for every collation field, only compare declared ones
+            have = {k: have.get(k) for k in want}
+        if option == "unique":
+            want, have = bool(want), bool(have)
+        if want != have:
+            return False
+    return True
+
+async def get_index_drift():
+    """Compare INDEX_CATALOG against the indexes that actually exist in MongoDB"""
+    collections = {}
+    for name, indexes in INDEX_CATALOG.items():
+        actual = await db[name].index_information()
+        expected = {index.document["name"]: index.document for index in indexes}
+        
+        missing = [n for n in expected if n not in actual]
+        mismatched = [n for n in expected if n in actual and not index_matches(expected[n], actual[n])]
+        unexpected = [n for n in actual if n not in expected and n != "_id_"]
+        
+        collections[name] = {
+            "in_sync": not missing and not mismatched,
+            "missing": missing,
+            "mismatched": mismatched,
+            "unexpected": unexpected
+        }
+    
+    return {
+        "in_sync": all(c["in_sync"] for c in collections.values()),
+        "collections": collections
+    }
+
+async def ensure_timeseries_collections():
+    """Create missing TIMESERIES_COLLECTIONS; older servers fall back to a regular collection"""
+    existing = set(await db.list_collection_names())
+    for name, options in TIMESERIES_COLLECTIONS.items():
+        if name in existing:
+            continue
+        try:
+            await db.create_collection(name, timeseries=options)
+        except CollectionInvalid:
+            pass  # Another worker created it first
+        except OperationFailure as e:
+            logger.warning(f"Could not create time-series collection {name}, using a regular collection: {e}")
+
+async def ensure_indexes():
+    """Create every index declared in INDEX_CATALOG, retire the ones they replace and report drift"""
+    await ensure_timeseries_collections()
+    for name, indexes in INDEX_CATALOG.items():
+        for index in indexes:
+            # One index at a time so a single conflict (e.g. duplicate data) does not block the rest
+            try:
+                await db[name].create_indexes([index])
+            except OperationFailure as e:
+                logger.warning(f"Could not create index {name}.{index.document['name']}: {e}")
+    
+    for name, retired in RETIRED_INDEXES.items():
+        existing = await db[name].index_information()
+        expected = {index.document["name"]: index.document for index in INDEX_CATALOG[name]}
+        for index_name, replacement in retired.items():
+            if index_name not in existing:
+                continue
+            if replacement in existing and index_matches(expected[replacement], existing[replacement]):
+                await db[name].drop_index(index_name)
+            else:
+                logger.warning(f"Keeping index {name}.{index_name} until {replacement} is built")
+    
+    drift = await get_index_drift()
+    accounts = drift["collections"]["accounts"]
+    ACCOUNT_NAME_INDEX["enforced"] = "name_ci_unique" not in accounts["missing"] + accounts["mismatched"]
+    if not ACCOUNT_NAME_INDEX["enforced"]:
+        logger.error(
+            "accounts.name_ci_unique is not built (are there account names differing only in case?); "
+            "account names are only checked for duplicates by create_account until it is"
+        )
+    for name, report in drift["collections"].items():
+        if not report["in_sync"]:
+            logger.warning(f"Index drift on {name}: missing={report['missing']} mismatched={report['mismatched']}")
+    return drift
+
+
+# ==================== DASHBOARD SUMMARY ====================
+# Materialized totals behind /dashboard, /analytics/balance-sheet and /analytics/ratios.
+# Write routes keep it current with $inc; rebuild_dashboard_summary() recomputes it from scratch.
+SUMMARY_ID = "dashboard"
+
+HOLDING_COLLECTIONS = ["stocks", "deposits", "gold", "mutual_funds"]
+
+# Market value of a holding, in Python and as an aggregation expression
+HOLDING_VALUES = {
+    "stocks": lambda s: s['lots'] * s['current_price'] * 100,
+    "deposits": lambda d: d['amount'],
+    "gold": lambda g: g['weight_grams'] * g['current_price_per_gram'],
+    "mutual_funds": lambda mf: mf['units'] * mf['current_nav'],
+}
+HOLDING_VALUE_EXPRS = {
+    "stocks": {"$multiply": ["$lots", "$current_price", 100]},
+    "deposits": "$amount",
+    "gold": {"$multiply": ["$weight_grams", "$current_price_per_gram"]},
+    "mutual_funds": {"$multiply": ["$units", "$current_nav"]},
+}
+
+async def inc_summary(changes: dict):
+    """Atomically apply $inc deltas to the dashboard summary"""
+    changes = {k: v for k, v in changes.items() if v}
+    if not changes:
+        return
+    # No upsert: a missing summary is rebuilt from scratch on the next read
+    await db.dashboard_summary.update_one(
+        {"id": SUMMARY_ID},
+        {"$inc": changes, "$set": {"updated_at": datetime.now(timezone.utc)}}
+    )
+
+def combine_deltas(*deltas):
+    """Merge several summary $inc dicts into one"""
+    combined = {}
+    for delta in deltas:
+        for key, value in delta.items():
+            combined[key] = combined.get(key, 0) + value
+    return combined
+
+def transaction_delta(tx: dict, sign: int = 1):
+    """Summary $inc for adding (sign=1) or removing (sign=-1) a transaction"""
+    tx_type = tx['type'].value if isinstance(tx['type'], Enum) else tx['type']
+    delta = {"counts.transactions": sign}
+    if tx_type == TransactionType.INCOME.value:
+        delta["total_income"] = sign * tx['amount']
+    elif tx_type == TransactionType.EXPENSE.value:
+        delta["total_expense"] = sign * tx['amount']
+    return delta
+
+def holding_delta(collection: str, before: Optional[dict] = None, after: Optional[dict] = None):
+    """Summary $inc for a holding or debt changing from `before` to `after` (None = absent)"""
+    if collection == "debts":
+        value_field, count_field = "liabilities", "counts.active_debts"
+        
+        def contribution(doc):
+            if doc is None or not doc.get('is_active', True):
+                return 0, 0
+            return doc['current_balance'], 1
+    else:
+        value_field, count_field = f"investments.{collection}", f"counts.{collection}"
+        
+        def contribution(doc):
+            if doc is None:
+                return 0, 0
+            return HOLDING_VALUES[collection](doc), 1
+    
+    value_before, count_before = contribution(before)
+    value_after, count_after = contribution(after)
+    return {value_field: value_after - value_before, count_field: count_after - count_before}
+
+async def apply_balance_change(account_name: str, amount: float):
+    """Move an account balance and the summary's liquid assets together"""
+    if not amount:
+        return
+    result = await db.accounts.update_one(
+        {"name": account_name}, {"$inc": {"balance": amount}}, collation=ACCOUNT_NAME_COLLATION
+    )
+    if result.matched_count:
+        await inc_summary({"liquid_assets": amount})
+
+async def sum_collection(collection: str, value_expr, query: Optional[dict] = None):
+    """Return (sum of value_expr, document count) computed server-side"""
+    pipeline = [
+        {"$match": query or {}},
+        {"$group": {"_id": None, "total": {"$sum": value_expr}, "count": {"$sum": 1}}}
+    ]
+    result = await db[collection].aggregate(pipeline).to_list(1)
+    return (result[0]['total'], result[0]['count']) if result else (0, 0)
+
+async def get_transaction_totals():
+    """Lifetime income, expense and transaction count"""
+    pipeline = [
+        {"$group": {
+            "_id": None,
+            "income": {"$sum": {"$cond": [{"$eq": ["$type", "income"]}, "$amount", 0]}},
+            "expense": {"$sum": {"$cond": [{"$eq": ["$type", "expense"]}, "$amount", 0]}},
+            "count": {"$sum": 1}
+        }}
+    ]
+    result = await db.transactions.aggregate(pipeline).to_list(1)
+    return result[0] if result else {"income": 0, "expense": 0, "count": 0}
+
+async def rebuild_dashboard_summary():
+    """Recompute the dashboard summary from every account, holding, debt and transaction"""
+    (liquid_assets, _), (liabilities, active_debts), totals, *holdings = await asyncio.gather(
+        sum_collection("accounts", "$balance"),
+        sum_collection("debts", "$current_balance", {"is_active": True}),
+        get_transaction_totals(),
+        *[sum_collection(c, HOLDING_VALUE_EXPRS[c]) for c in HOLDING_COLLECTIONS]
+    )
+    
+    summary = {
+        "id": SUMMARY_ID,
+        "liquid_assets": liquid_assets,
+        "investments": {c: total for c, (total, _) in zip(HOLDING_COLLECTIONS, holdings)},
+        "liabilities": liabilities,
+        "total_income": totals['income'],
+        "total_expense": totals['expense'],
+        "counts": {
+            "transactions": totals['count'],
+            "active_debts": active_debts,
+            **{c: count for c, (_, count) in zip(HOLDING_COLLECTIONS, holdings)}
+        },
+        "rebuilt_at": datetime.now(timezone.utc),
+        "updated_at": datetime.now(timezone.utc)
+    }
+    await db.dashboard_summary.replace_one({"id": SUMMARY_ID}, summary, upsert=True)
+    return summary
+
+async def get_dashboard_summary():
+    """Read the dashboard summary, rebuilding it if it does not exist yet"""
+    summary = await db.dashboard_summary.find_one({"id": SUMMARY_ID}, {"_id": 0})
+    if summary is None:
+        summary = await rebuild_dashboard_summary()
+    return summary
+
+def summary_totals(summary: dict, deposit_interest: float = 0):
+    """Accounting equation figures derived from the dashboard summary (deposits plus accrued interest)"""
+    investments = {**summary['investments']}
+    investments['deposits'] += deposit_interest
+    total_investments = sum(investments[c] for c in HOLDING_COLLECTIONS)
+    total_assets = summary['liquid_assets'] + total_investments
+    return {
+        "liquid_assets": summary['liquid_assets'],
+        "investments_breakdown": {c: investments[c] for c in HOLDING_COLLECTIONS},
+        "total_investments": total_investments,
+        "total_assets": total_assets,
+        "total_liabilities": summary['liabilities'],
+        "net_worth": total_assets - summary['liabilities'],
+        "total_income": summary['total_income'],
+        "total_expense": summary['total_expense']
+    }
+
+
+# ==================== DATETIME MIGRATION ====================
+# Collections whose ISO-string date fields are rewritten as BSON dates
+DATETIME_COLLECTIONS = [
+    "accounts", "transactions", "stocks", "deposits", "gold", "mutual_funds", "debts",
+    "bill_payments", "financial_goals", "goal_contributions", "budgets", "recurring_bills", "bills",
+    "investment_stocks", "investment_deposits", "investment_gold", "investment_mutual_funds"
+]
+DATETIME_MIGRATION_ID = "datetime_fields"
+DATETIME_MIGRATION_BATCH_SIZE = 500
+
+# In-process view of the migration; reads emit string fallbacks until it is done
+DATETIME_MIGRATION = {"done": False, "running": False}
+
+async def load_datetime_migration_state():
+    """Refresh DATETIME_MIGRATION from the migrations collection.
+    
+    It is only done once every collection now in DATETIME_COLLECTIONS is, so collections added
+    to the list after a completed run are migrated on the next start.
+    """
+    state = await db.migrations.find_one({"id": DATETIME_MIGRATION_ID}, {"_id": 0})
+    progress = (state or {}).get("progress", {})
+    DATETIME_MIGRATION["done"] = bool(state and state.get("done")) and all(
+        progress.get(name, {}).get("done") for name in DATETIME_COLLECTIONS
+    )
+    return state
+
+async def migrate_datetime_fields():
+    """Rewrite ISO-string date fields as BSON dates, in resumable _id-ordered batches"""
+    if DATETIME_MIGRATION["running"]:
+        return
+    DATETIME_MIGRATION["running"] = True
+    try:
+        state = await load_datetime_migration_state() or {}
+        if DATETIME_MIGRATION["done"]:
+            return
+        progress = state.get("progress", {})
+        await db.migrations.update_one(
+            {"id": DATETIME_MIGRATION_ID},
+            {"$setOnInsert": {"started_at": datetime.now(timezone.utc), "progress": {}, "done": False}},
+            upsert=True
+        )
+        
+        for name in DATETIME_COLLECTIONS:
+            if progress.get(name, {}).get("done"):
+                continue
+            last_id = progress.get(name, {}).get("last_id")
+            converted = progress.get(name, {}).get("converted", 0)
+            has_string = {"$or": [{field: {"$type": "string"}} for field in DATETIME_FIELDS]}
+            
+            while True:
+                query = {"$and": [has_string, {"_id": {"$gt": last_id}}]} if last_id else has_string
+                batch = await db[name].find(query, {field: 1 for field in DATETIME_FIELDS}).sort("_id", 1).limit(
+                    DATETIME_MIGRATION_BATCH_SIZE
+                ).to_list(DATETIME_MIGRATION_BATCH_SIZE)
+                if not batch:
+                    break
+                
+                updates = []
+                for doc in batch:
+                    changes = {}
+                    for field in DATETIME_FIELDS:
+                        if isinstance(doc.get(field), str):
+                            try:
+                                changes[field] = parse_datetime(doc[field])
+                            except ValueError:
+                                logger.warning(f"Unparseable {name}.{field} on {doc['_id']}: {doc[field]!r}")
+                    if changes:
+                        updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": changes}))
+                if updates:
+                    await db[name].bulk_write(updates, ordered=False)
+                
+                converted += len(updates)
+                last_id = batch[-1]["_id"]
+                await db.migrations.update_one(
+                    {"id": DATETIME_MIGRATION_ID},
+                    {"$set": {f"progress.{name}": {"last_id": last_id, "converted": converted, "done": False}}}
+                )
+            
+            await db.migrations.update_one(
+                {"id": DATETIME_MIGRATION_ID},
+                {"$set": {f"progress.{name}": {"last_id": last_id, "converted": converted, "done": True}}}
+            )
+            logger.info(f"Datetime migration: {name} done ({converted} documents converted)")
+        
+        await db.migrations.update_one(
+            {"id": DATETIME_MIGRATION_ID},
+            {"$set": {"done": True, "completed_at": datetime.now(timezone.utc)}}
+        )
+        DATETIME_MIGRATION["done"] = True
+    finally:
+        DATETIME_MIGRATION["running"] = False
+
+
+# ==================== RECURRING BILLS MIGRATION ====================
+# Legacy `bills` documents are rewritten once into `recurring_bills`, and recurring_bills documents
+# missing fields are filled in. Until that is done GET /recurring-bills normalizes and merges on read.
+RECURRING_BILLS_MIGRATION_ID = "recurring_bills_unified"
+RECURRING_BILLS_MIGRATION_BATCH_SIZE = 500
+
+# In-process view of the migration, like DATETIME_MIGRATION
+RECURRING_BILLS_MIGRATION = {"done": False, "running": False}
+
+# Fields of a normalized recurring bill, in response order
+RECURRING_BILL_FIELDS = [
+    "id", "name", "amount", "type", "category", "account", "frequency", "day_of_month",
+    "due_date", "is_active", "notes", "created_at"
+]
+
+def stable_bill_id(doc: dict) -> str:
+    """The document's id, or one derived from its _id so it is the same on every read"""
+    if doc.get('id'):
+        return doc['id']
+    return str(uuid.uuid5(uuid.NAMESPACE_OID, str(doc['_id'])))
+
+def normalize_recurring_bill(item: dict) -> dict:
+    """A recurring_bills document with every field present"""
+    return {
+        "id": stable_bill_id(item),
+        "name": item.get('name', 'Unnamed'),
+        "amount": float(item.get('amount', 0)),
+        "type": item.get('type', 'expense'),
+        "category": item.get('category', 'Bills'),
+        "account": item.get('account'),
+        "frequency": item.get('frequency', 'monthly'),
+        "day_of_month": int(item.get('day_of_month', 1)),
+        "due_date": item.get('due_date'),
+        "is_active": item.get('is_active', True) if item.get('is_active') is not None else True,
+        "notes": item.get('notes'),
+        "created_at": item.get('created_at')
+    }
+
+def convert_legacy_bill(bill: dict) -> dict:
+    """A legacy `bills` document in the recurring_bills schema"""
+    try:
+        day_of_month = int(bill.get('due_date', '1')) if bill.get('due_date') else 1
+    except (ValueError, TypeError):
+        day_of_month = 1
+    created_at = bill.get('created_at')
+    if isinstance(created_at, str):
+        try:
+            created_at = parse_datetime(created_at)
+        except ValueError:
+            pass
+    
+    return {
+        "id": stable_bill_id(bill),
+        "name": bill.get('name', 'Unnamed'),
+        "amount": float(bill.get('amount', 0)),
+        "type": "expense",  # Legacy bills are all expenses
+        "category": bill.get('category', 'Bills'),
+        "account": bill.get('account'),
+        "frequency": bill.get('period', 'monthly').lower() if bill.get('period') else 'monthly',
+        "day_of_month": day_of_month,
+        "due_date": None,
+        "is_active": bill.get('is_active', True) if bill.get('is_active') is not None else True,
+        "notes": bill.get('notes'),
+        "created_at": created_at
+    }
+
+def recurring_bill_fix(item: dict) -> Optional[UpdateOne]:
+    """$set of the fields a recurring_bills document is missing or holds in legacy form, or None.
+    
+    The filter requires those fields to still hold what was read, so a concurrent edit wins.
+    """
+    normalized = normalize_recurring_bill(item)
+    fixes = {field: value for field, value in normalized.items() if field not in item or item[field] != value}
+    if not fixes:
+        return None
+    unchanged = {field: item[field] if field in item else {"$exists": False} for field in fixes}
+    return UpdateOne({"_id": item["_id"], **unchanged}, {"$set": fixes})
+
+def legacy_bill_upsert(bill: dict) -> UpdateOne:
+    """Insert a converted legacy bill unless a recurring item already has its id"""
+    return UpdateOne({"id": bill["id"]}, {"$setOnInsert": {k: v for k, v in bill.items() if k != "id"}}, upsert=True)
+
+async def load_recurring_bills_migration_state():
+    """Refresh RECURRING_BILLS_MIGRATION from the migrations collection"""
+    state = await db.migrations.find_one({"id": RECURRING_BILLS_MIGRATION_ID}, {"_id": 0})
+    RECURRING_BILLS_MIGRATION["done"] = bool(state and state.get("done"))
+    return state
+
+async def migrate_recurring_bills():
+    """Normalize recurring_bills in place, then upsert every legacy bill, in resumable _id-ordered batches"""
+    if RECURRING_BILLS_MIGRATION["running"]:
+        return
+    RECURRING_BILLS_MIGRATION["running"] = True
+    try:
+        state = await load_recurring_bills_migration_state() or {}
+        if state.get("done"):
+            return
+        progress = state.get("progress", {})
+        await db.migrations.update_one(
+            {"id": RECURRING_BILLS_MIGRATION_ID},
+            {"$setOnInsert": {"started_at": datetime.now(timezone.utc), "progress": {}, "done": False}},
+            upsert=True
+        )
+        
+        # Existing items only have their missing or legacy-form fields fixed; legacy bills never
+        # overwrite an item that already has their id
+        phases = [
+            ("recurring_bills", recurring_bill_fix),
+            ("bills", lambda doc: legacy_bill_upsert(convert_legacy_bill(doc))),
+        ]
+        for name, to_update in phases:
+            if progress.get(name, {}).get("done"):
+                continue
+            last_id = progress.get(name, {}).get("last_id")
+            migrated = progress.get(name, {}).get("migrated", 0)
+            
+            while True:
+                query = {"_id": {"$gt": last_id}} if last_id else {}
+                batch = await db[name].find(query).sort("_id", 1).limit(
+                    RECURRING_BILLS_MIGRATION_BATCH_SIZE
+                ).to_list(RECURRING_BILLS_MIGRATION_BATCH_SIZE)
+                if not batch:
+                    break
+                
+                updates = [update for update in map(to_update, batch) if update is not None]
+                if updates:
+                    await db.recurring_bills.bulk_write(updates, ordered=False)
+                migrated += len(batch)
+                last_id = batch[-1]["_id"]
+                await db.migrations.update_one(
+                    {"id": RECURRING_BILLS_MIGRATION_ID},
+                    {"$set": {f"progress.{name}": {"last_id": last_id, "migrated": migrated, "done": False}}}
+                )
+            
+            await db.migrations.update_one(
+                {"id": RECURRING_BILLS_MIGRATION_ID},
+                {"$set": {f"progress.{name}": {"last_id": last_id, "migrated": migrated, "done": True}}}
+            )
+            logger.info(f"Recurring bills migration: {name} done ({migrated} documents)")
+        
+        await db.migrations.update_one(
+            {"id": RECURRING_BILLS_MIGRATION_ID},
+            {"$set": {"done": True, "completed_at": datetime.now(timezone.utc)}}
+        )
+        RECURRING_BILLS_MIGRATION["done"] = True
+    finally:
+        RECURRING_BILLS_MIGRATION["running"] = False
+
+
+# ==================== RECURRING SCHEDULER ====================
+# A background task generates the transactions of every active recurring item whose next_due has
+# passed, and rolls over matured deposits. A lease in `scheduler_locks` makes sure only one uvicorn
+# worker runs it at a time.
+#
+# Every occurrence, generated or paid by hand, is first claimed by inserting a pending
+# recurring_payments row; the unique (recurring_id, month_year) index lets only one claim win. The
+# winner then writes the transaction and balance change, and only then marks the row paid. A claim
+# left pending by a crash is finished by the next scheduler run.
+RECURRING_SCHEDULER_INTERVAL_SECONDS = 60
+RECURRING_SCHEDULER_BATCH_SIZE = 100
+RECURRING_SCHEDULER_LOCK = "recurring_scheduler"
+SCHEDULER_LEASE_SECONDS = 180
+SCHEDULER_WORKER_ID = str(uuid.uuid4())
+
+# Pending claims older than this belong to a request that died before settling them
+RECURRING_CLAIM_TIMEOUT_SECONDS = 300
+
+# Occurrences generated per item per batch; an item still behind is picked up by the next batch
+RECURRING_MAX_CATCH_UP = 31
+
+RECURRING_STEPS = {
+    "daily": relativedelta(days=1),
+    "weekly": relativedelta(weeks=1),
+    "monthly": relativedelta(months=1),
+    "yearly": relativedelta(years=1),
+}
+
+# Items the scheduler may pick up: a known frequency (any case; unset means monthly) and an account
+SCHEDULABLE_RECURRING = {
+    "account": {"$nin": [None, ""]},
+    "$or": [{"frequency": None}, {"frequency": {"$regex": f"^({'|'.join(RECURRING_STEPS)})$", "$options": "i"}}],
+}
+
+def recurring_frequency(frequency: Optional[str]) -> str:
+    """The lower-cased frequency, monthly if unset; ValueError for one RECURRING_STEPS doesn't know"""
+    frequency = (frequency or "monthly").lower()
+    if frequency not in RECURRING_STEPS:
+        raise ValueError(f"Unknown recurring frequency: {frequency!r}")
+    return frequency
+
+# Frequencies are free-form words; ones outside RECURRING_STEPS (e.g. the UI's "adhoc") are never generated
+FREQUENCY_PATTERN = re.compile(r"[A-Za-z][A-Za-z_-]*")
+
+def check_frequency(frequency):
+    """400 unless the frequency is a single word"""
+    if not isinstance(frequency, str) or not FREQUENCY_PATTERN.fullmatch(frequency):
+        raise HTTPException(status_code=400, detail="frequency must be a word such as monthly, weekly or adhoc")
+
+def scheduled_due(frequency: Optional[str], day_of_month: int, now: datetime) -> Optional[datetime]:
+    """first_due() for frequencies the scheduler generates, None for the rest"""
+    try:
+        return first_due(frequency, day_of_month, now)
+    except ValueError:
+        return None
+
+def recurring_step(frequency: Optional[str], day_of_month: int = 1) -> relativedelta:
+    """Interval between occurrences; monthly and yearly items stay on day_of_month (clamped to the month)"""
+    frequency = recurring_frequency(frequency)
+    step = RECURRING_STEPS[frequency]
+    if frequency in ("daily", "weekly"):
+        return step
+    return step + relativedelta(day=max(1, min(31, int(day_of_month or 1))))
+
+def first_due(frequency: Optional[str], day_of_month: int, now: datetime) -> datetime:
+    """First occurrence (at midnight UTC) strictly after `now` for a new or rescheduled item"""
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    step = recurring_step(frequency, day_of_month)
+    if recurring_frequency(frequency) in ("daily", "weekly"):
+        return today + step
+    due = today + relativedelta(day=max(1, min(31, int(day_of_month or 1))))
+    return due if due > now else due + step
+
+def period_key(frequency: Optional[str], due: datetime) -> str:
+    """recurring_payments.month_year for an occurrence: the month, or the day for daily/weekly items"""
+    if recurring_frequency(frequency) in ("daily", "weekly"):
+        return due.strftime('%Y-%m-%d')
+    return due.strftime('%Y-%m')
+
+async def recurring_transaction(item: dict, notes: str, **fields) -> Transaction:
+    """A recurring item's transaction, classified by the categorization rules like any new transaction"""
+    tx_dict = {
+        "description": item['name'],
+        "amount": item['amount'],
+        "type": TransactionType(item['type']),
+        "category": item['category'],
+        "account": item['account'],
+        "notes": notes,
+        **fields
+    }
+    (await get_rule_set()).apply(tx_dict)
+    return Transaction(**tx_dict)
+
+def recurring_claim(item: dict, tx: Transaction, month_year: str, now: datetime, **fields) -> dict:
+    """A pending recurring_payments row claiming an occurrence, carrying the transaction it will write"""
+    return {
+        "id": str(uuid.uuid4()),
+        "recurring_id": item['id'],
+        "transaction_id": tx.id,
+        "amount": tx.amount,
+        "month_year": month_year,
+        "status": "pending",
+        "claimed_at": now,
+        "transaction": to_document(tx),
+        **fields
+    }
+
+async def mark_recurring_paid(claim_ids: list):
+    """Turn settled claims into payment records"""
+    await db.recurring_payments.update_many(
+        {"id": {"$in": claim_ids}},
+        {"$set": {"status": "paid", "paid_at": datetime.now(timezone.utc)}, "$unset": {"transaction": ""}}
+    )
+
+async def settle_recurring_payments(claims: list):
+    """Write the claimed occurrences' transactions like any other insert, then mark the claims paid"""
+    if not claims:
+        return
+    docs = [claim['transaction'] for claim in claims]
+    await db.transactions.insert_many(docs)
+    await record_new_transactions(docs)
+    await mark_recurring_paid([claim['id'] for claim in claims])
+
+async def settle_stale_claims(now: Optional[datetime] = None):
+    """Finish claims whose request died before marking them paid, writing the transaction if it is missing"""
+    now = now or datetime.now(timezone.utc)
+    claims = await db.recurring_payments.find(
+        {"status": "pending", "claimed_at": {"$lte": now - timedelta(seconds=RECURRING_CLAIM_TIMEOUT_SECONDS)}},
+        {"_id": 0}
+    ).to_list(RECURRING_SCHEDULER_BATCH_SIZE)
+    if not claims:
+        return 0
+    written = {doc['id'] async for doc in db.transactions.find(
+        {"id": {"$in": [claim['transaction_id'] for claim in claims]}}, {"_id": 0, "id": 1}
+    )}
+    await mark_recurring_paid([claim['id'] for claim in claims if claim['transaction_id'] in written])
+    await settle_recurring_payments([claim for claim in claims if claim['transaction_id'] not in written])
+    logger.info(f"Recurring scheduler settled {len(claims)} stale claims")
+    return len(claims)
+
+async def acquire_scheduler_lease(name: str = RECURRING_SCHEDULER_LOCK) -> bool:
+    """Take or renew a lease; False while another worker holds an unexpired one"""
+    now = datetime.now(timezone.utc)
+    try:
+        lease = await db.scheduler_locks.find_one_and_update(
+            {"id": name, "$or": [{"expires_at": {"$lte": now}}, {"owner": SCHEDULER_WORKER_ID}]},
+            {"$set": {"owner": SCHEDULER_WORKER_ID, "expires_at": now + timedelta(seconds=SCHEDULER_LEASE_SECONDS)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # The lock document exists and is held by someone else, so the upsert collided on `id`
+        return False
+    return lease is not None
+
+async def release_scheduler_lease(name: str = RECURRING_SCHEDULER_LOCK):
+    """Let another worker take over immediately instead of waiting for the lease to expire"""
+    await db.scheduler_locks.update_one(
+        {"id": name, "owner": SCHEDULER_WORKER_ID},
+        {"$set": {"expires_at": datetime.now(timezone.utc)}}
+    )
+
+async def backfill_next_due():
+    """Schedule unscheduled active items from now on, without generating their past.
+    
+    Runs before every scheduler pass, so items the migration adds or that later gain an account
+    are picked up; items with an unknown frequency or no account stay unscheduled.
+    """
+    now = datetime.now(timezone.utc)
+    cursor = db.recurring_bills.find(
+        {"is_active": True, "$and": [
+            {"$or": [{"next_due": None}, {"next_due": {"$type": "string"}}]}, SCHEDULABLE_RECURRING
+        ]},
+        {"_id": 0, "id": 1, "frequency": 1, "day_of_month": 1}
+    )
+    updates = [
+        UpdateOne({"id": item['id']}, {"$set": {"next_due": first_due(item.get('frequency'), item.get('day_of_month'), now)}})
+        async for item in cursor if item.get('id')
+    ]
+    for start in range(0, len(updates), RECURRING_SCHEDULER_BATCH_SIZE):
+        await db.recurring_bills.bulk_write(updates[start:start + RECURRING_SCHEDULER_BATCH_SIZE], ordered=False)
+    return len(updates)
+
+async def generate_due_recurring(now: Optional[datetime] = None):
+    """Generate every due occurrence in batches of items, advancing each item's next_due.
+    
+    Occurrences are claimed first: the unique (recurring_id, month_year) index is what stops one
+    that was already paid, by hand or by a previous run, from being generated twice.
+    """
+    now = now or datetime.now(timezone.utc)
+    generated = 0
+    while True:
+        items = await db.recurring_bills.find(
+            {"is_active": True, "next_due": {"$lte": now}}, {"_id": 0}
+        ).sort("next_due", ASCENDING).limit(RECURRING_SCHEDULER_BATCH_SIZE).to_list(RECURRING_SCHEDULER_BATCH_SIZE)
+        if not items:
+            break
+        
+        claims = []
+        schedule = []
+        for item in items:
+            try:
+                step = recurring_step(item.get('frequency'), item.get('day_of_month'))
+            except ValueError as e:
+                # Unschedule it; backfill_next_due leaves it alone until the frequency is fixed
+                logger.warning(f"Unscheduling recurring item {item.get('id')}: {e}")
+                schedule.append(UpdateOne({"id": item['id']}, {"$set": {"next_due": None}}))
+                continue
+            due = to_utc(item['next_due'])
+            try:
+                template = await recurring_transaction(item, f"Auto-generated recurring: {item['name']}", date=due)
+            except (KeyError, ValueError) as e:
+                # It can never become a transaction (e.g. an unknown category): reschedule, don't retry every run
+                logger.warning(f"Skipping recurring item {item.get('id')}: {type(e).__name__} {e}".splitlines()[0])
+                schedule.append(UpdateOne({"id": item['id']}, {"$set": {
+                    "next_due": first_due(item.get('frequency'), item.get('day_of_month'), now)
+                }}))
+                continue
+            
+            occurrences = 0
+            while due <= now and occurrences < RECURRING_MAX_CATCH_UP:
+                tx = template.model_copy(update={"id": str(uuid.uuid4()), "date": due})
+                claims.append(recurring_claim(
+                    item, tx, period_key(item.get('frequency'), due), now, due_date=due, auto_generated=True
+                ))
+                due += step
+                occurrences += 1
+            schedule.append(UpdateOne({"id": item['id']}, {"$set": {"next_due": due, "last_generated": now}}))
+        
+        accepted = claims
+        if claims:
+            try:
+                await db.recurring_payments.insert_many(claims, ordered=False)
+            except BulkWriteError as e:
+                already_paid = {error["index"] for error in e.details.get("writeErrors", [])}
+                accepted = [claim for index, claim in enumerate(claims) if index not in already_paid]
+        
+        await settle_recurring_payments(accepted)
+        await db.recurring_bills.bulk_write(schedule, ordered=False)
+        generated += len(accepted)
+        
+        # Stop if the lease was lost mid-run; whoever holds it now carries on from next_due
+        if not await acquire_scheduler_lease():
+            break
+    
+    if generated:
+        logger.info(f"Recurring scheduler generated {generated} transactions")
+    return generated
+
+async def run_recurring_scheduler():
+    """Generate due recurring transactions and roll over deposits every RECURRING_SCHEDULER_INTERVAL_SECONDS while holding the lease"""
+    while True:
+        try:
+            if await acquire_scheduler_lease():
+                await settle_stale_claims()
+                await backfill_next_due()
+                await generate_due_recurring()
+                await roll_over_deposits()
+        except Exception as e:
+            logger.error(f"Recurring scheduler run failed: {e}")
+        await asyncio.sleep(RECURRING_SCHEDULER_INTERVAL_SECONDS)
+
+
+# ==================== DEPOSIT ENGINE ====================
+# Interest accrues daily on the current term (actual/365, simple). Banks withhold the 20% final tax
+# on deposit interest unless the customer's deposits at that bank total Rp7.5 million or less.
+# Matured auto-renewal (ARO) deposits roll principal plus net interest into a new term.
+DEPOSIT_TAX_RATE = 0.20
+DEPOSIT_TAX_FREE_LIMIT = 7_500_000
+DEPOSIT_DAY_COUNT = 365
+DEPOSIT_BOOK_REFRESH_SECONDS = 60
+DEPOSIT_ROLLOVER_BATCH_SIZE = 500
+
+def bank_key(bank_name: str) -> str:
+    """Deposits are grouped by bank case- and whitespace-insensitively for the tax threshold"""
+    return " ".join(bank_name.lower().split())
+
+class DepositBook:
+    """Every deposit's current term as arrays, so accrued interest is one vectorized pass"""
+    
+    def __init__(self):
+        self.load([])
+        self.loaded_at = float("-inf")
+    
+    def load(self, docs):
+        """Replace the book with deposits documents"""
+        self.ids = [doc["id"] for doc in docs]
+        self.banks = [doc["bank_name"] for doc in docs]
+        self.principal = np.array([doc["amount"] for doc in docs], dtype=float)
+        self.rate = np.array([doc["interest_rate"] for doc in docs], dtype=float) / 100
+        self.start = np.array([parse_datetime(doc["start_date"]).timestamp() for doc in docs], dtype=float)
+        self.maturity = np.array([parse_datetime(doc["maturity_date"]).timestamp() for doc in docs], dtype=float)
+        _, bank = np.unique([bank_key(name) for name in self.banks], return_inverse=True)
+        bank_totals = np.bincount(bank, weights=self.principal) if docs else np.zeros(0)
+        self.tax_rate = np.where(bank_totals[bank] > DEPOSIT_TAX_FREE_LIMIT, DEPOSIT_TAX_RATE, 0.0)
+        self.loaded_at = time.monotonic()
+    
+    def invalidate(self):
+        """Reload on next use, after this worker changed a deposit"""
+        self.loaded_at = float("-inf")
+    
+    def accrue(self, now: datetime):
+        """(whole days accrued, gross interest, tax withheld) per deposit at `now`; matured terms stop accruing"""
+        seconds = np.clip(now.timestamp() - self.start, 0, np.maximum(self.maturity - self.start, 0))
+        days = np.floor(seconds / 86400)
+        gross = self.principal * self.rate * days / DEPOSIT_DAY_COUNT
+        return days, gross, gross * self.tax_rate
+
+DEPOSIT_BOOK = DepositBook()
+
+async def load_deposit_book():
+    """Reload DEPOSIT_BOOK from MongoDB"""
+    projection = {"_id": 0, "id": 1, "bank_name": 1, "amount": 1, "interest_rate": 1, "start_date": 1, "maturity_date": 1}
+    DEPOSIT_BOOK.load(await db.deposits.find(projection=projection).to_list(None))
+
+async def deposit_accrued_interest(now: Optional[datetime] = None) -> float:
+    """Net interest accrued on all deposits; the book is reloaded at most every DEPOSIT_BOOK_REFRESH_SECONDS"""
+    if time.monotonic() - DEPOSIT_BOOK.loaded_at > DEPOSIT_BOOK_REFRESH_SECONDS:
+        await load_deposit_book()
+    _, gross, tax = DEPOSIT_BOOK.accrue(now or datetime.now(timezone.utc))
+    return float((gross - tax).sum())
+
+async def roll_over_deposits(now: Optional[datetime] = None):
+    """Renew every matured auto-renewal deposit, term by term until its maturity is in the future"""
+    now = now or datetime.now(timezone.utc)
+    await load_deposit_book()
+    tax_rates = dict(zip(DEPOSIT_BOOK.ids, DEPOSIT_BOOK.tax_rate.tolist()))
+    projection = {"_id": 0, "id": 1, "amount": 1, "interest_rate": 1, "tenor_months": 1, "start_date": 1, "maturity_date": 1}
+    cursor = db.deposits.find(
+        {"is_auto_renewal": True, "maturity_date": {"$lte": now}}, projection
+    ).batch_size(DEPOSIT_ROLLOVER_BATCH_SIZE)
+    
+    rolled = 0
+    credited = 0.0
+    pending = []
+    
+    async def flush():
+        # Filtering on the old maturity_date makes a repeated run a no-op
+        result = await db.deposits.bulk_write([update for update, _ in pending], ordered=False)
+        if result.modified_count == len(pending):
+            await inc_summary({"investments.deposits": sum(interest for _, interest in pending)})
+        else:
+            await rebuild_dashboard_summary()
+        pending.clear()
+        return result.modified_count
+    
+    async for doc in cursor:
+        start, maturity = parse_datetime(doc["start_date"]), parse_datetime(doc["maturity_date"])
+        tenor = relativedelta(months=max(1, doc.get("tenor_months") or 1))
+        tax_rate = tax_rates.get(doc["id"], DEPOSIT_TAX_RATE)
+        amount, interest, renewals = doc["amount"], 0.0, 0
+        while maturity <= now:
+            net = amount * doc["interest_rate"] / 100 * (maturity - start).days / DEPOSIT_DAY_COUNT * (1 - tax_rate)
+            amount += net
+            interest += net
+            renewals += 1
+            start, maturity = maturity, maturity + tenor
+        pending.append((UpdateOne(
+            {"id": doc["id"], "maturity_date": doc["maturity_date"]},
+            {
+                "$set": {"amount": amount, "start_date": start, "maturity_date": maturity, "updated_at": now},
+                "$inc": {"renewals": renewals, "interest_earned": interest}
+            }
+        ), interest))
+        credited += interest
+        if len(pending) >= DEPOSIT_ROLLOVER_BATCH_SIZE:
+            rolled += await flush()
+    if pending:
+        rolled += await flush()
+    
+    if rolled:
+        DEPOSIT_BOOK.invalidate()
+        logger.info(f"Deposit rollover renewed {rolled} deposits, crediting {credited:,.2f} interest")
+    return {"rolled_over": rolled, "interest_credited": round(credited, 2)}
+
+
+# ==================== CATEGORY MODEL ====================
+# Multinomial Naive Bayes over hashed description words, learned from the user's own ledger.
+# `category_model` holds one document of word counts per category, kept current with $inc.
+CATEGORY_MODEL_FEATURES = 2 ** 14
+CATEGORY_MODEL_MIN_DOCUMENTS = 10
+CATEGORY_MODEL_REFRESH_SECONDS = 300
+INCOME_CATEGORIES = {c.value for c in [
+    TransactionCategory.SALARY, TransactionCategory.BUSINESS, TransactionCategory.INVESTMENT,
+    TransactionCategory.FREELANCE, TransactionCategory.DIVIDEND, TransactionCategory.INTEREST,
+    TransactionCategory.OTHER_INCOME
+]}
+EXPENSE_CATEGORIES = {c.value for c in TransactionCategory} - INCOME_CATEGORIES
+
+def category_features(normalized: str):
+    """Feature buckets of a normalized description (crc32 is stable across processes, unlike hash())"""
+    return [zlib.crc32(word.encode()) & (CATEGORY_MODEL_FEATURES - 1) for word in normalized.split()]
+
+class CategoryModel:
+    """Category x feature count matrix with lazily recomputed log probabilities"""
+    
+    def __init__(self):
+        self.load([])
+    
+    def load(self, docs):
+        """Replace all counts with category_model documents"""
+        self.version = getattr(self, "version", 0) + 1
+        self.categories = [doc["id"] for doc in docs]
+        self.index = {category: row for row, category in enumerate(self.categories)}
+        self.documents = np.array([doc.get("documents", 0) for doc in docs], dtype=float)
+        self.counts = np.zeros((len(docs), CATEGORY_MODEL_FEATURES))
+        for row, doc in enumerate(docs):
+            for bucket, count in doc.get("counts", {}).items():
+                self.counts[row, int(bucket)] = count
+        self.log_prior = None
+        self.log_likelihood = None
+        self.dirty = set()
+        self.loaded_at = time.monotonic()
+    
+    def learn(self, features, category: str, weight: int = 1):
+        """Add (or with weight=-1, forget) one labeled description"""
+        if category not in self.index:
+            self.index[category] = len(self.categories)
+            self.categories.append(category)
+            self.documents = np.append(self.documents, 0)
+            self.counts = np.vstack([self.counts, np.zeros((1, CATEGORY_MODEL_FEATURES))])
+            self.log_likelihood = None
+        row = self.index[category]
+        self.documents[row] += weight
+        np.add.at(self.counts[row], features, weight)
+        self.dirty.add(row)
+        self.version += 1
+    
+    def compile(self):
+        """Refresh log probabilities (Laplace-smoothed), only for rows changed since the last call"""
+        rows = list(range(len(self.categories))) if self.log_likelihood is None else sorted(self.dirty)
+        if self.log_likelihood is None:
+            self.log_likelihood = np.zeros_like(self.counts)
+        smoothed = self.counts[rows].clip(min=0) + 1
+        self.log_likelihood[rows] = np.log(smoothed) - np.log(smoothed.sum(axis=1, keepdims=True))
+        documents = self.documents.clip(min=0)
+        self.log_prior = np.log(documents + 1) - np.log(documents.sum() + len(documents))
+        self.dirty = set()
+    
+    def predict(self, features, allowed=None):
+        """{category: probability} sorted by probability, or None when the model has nothing to go on"""
+        return self.predict_many([features], allowed)[0]
+    
+    def predict_many(self, feature_lists, allowed=None):
+        """predict() for many descriptions, scored in one pass over the concatenated features"""
+        results = [None] * len(feature_lists)
+        known = [i for i, features in enumerate(feature_lists) if features]
+        if not known or self.documents.clip(min=0).sum() < CATEGORY_MODEL_MIN_DOCUMENTS:
+            return results
+        usable = self.documents > 0
+        if allowed is not None:
+            usable &= np.array([category in allowed for category in self.categories], dtype=bool)
+        if not usable.any():
+            return results
+        if self.log_likelihood is None or self.dirty:
+            self.compile()
+        
+        flat = np.concatenate([feature_lists[i] for i in known])
+        offsets = np.cumsum([0] + [len(feature_lists[i]) for i in known[:-1]])
+        seen = np.add.reduceat(self.counts[:, flat].any(axis=0), offsets) > 0
+        scores = self.log_prior[:, None] + np.add.reduceat(self.log_likelihood[:, flat], offsets, axis=1)
+        scores = np.where(usable[:, None], scores, -np.inf)
+        probabilities = np.exp(scores - scores.max(axis=0))
+        probabilities /= probabilities.sum(axis=0)
+        order = np.argsort(-probabilities, axis=0)
+        for column, i in enumerate(known):
+            if seen[column]:
+                results[i] = {
+                    self.categories[row]: float(probabilities[row, column]) for row in order[:, column] if usable[row]
+                }
+        return results
+
+CATEGORY_MODEL = CategoryModel()
+
+async def load_category_model():
+    """Reload CATEGORY_MODEL from MongoDB"""
+    CATEGORY_MODEL.load(await db.category_model.find({}, {"_id": 0}).to_list(None))
+
+async def refresh_category_model():
+    """Pick up counts written by other workers every CATEGORY_MODEL_REFRESH_SECONDS"""
+    if time.monotonic() - CATEGORY_MODEL.loaded_at > CATEGORY_MODEL_REFRESH_SECONDS:
+        await load_category_model()
+
+async def learn_categories(examples, weight: int = 1):
+    """Teach CATEGORY_MODEL (description, category) pairs and persist the counts, one $inc per category"""
+    increments = {}
+    for description, category in examples:
+        category = getattr(category, "value", category)
+        features = category_features(normalize_description(description))
+        if not features:
+            continue
+        CATEGORY_MODEL.learn(features, category, weight)
+        inc = increments.setdefault(category, {"documents": 0})
+        inc["documents"] += weight
+        for feature in features:
+            inc[f"counts.{feature}"] = inc.get(f"counts.{feature}", 0) + weight
+    if increments:
+        await db.category_model.bulk_write(
+            [UpdateOne({"id": category}, {"$inc": inc}, upsert=True) for category, inc in increments.items()],
+            ordered=False
+        )
+
+async def train_category_model():
+    """Retrain the category model from every transaction in the ledger"""
+    model = CategoryModel()
+    cursor = db.transactions.find({}, {"_id": 0, "description": 1, "category": 1}).batch_size(EXPORT_BATCH_SIZE)
+    async for tx in cursor:
+        features = category_features(normalize_description(tx.get("description") or ""))
+        if features and tx.get("category"):
+            model.learn(features, getattr(tx["category"], "value", tx["category"]))
+    
+    docs = [{
+        "id": category,
+        "documents": int(model.documents[row]),
+        "counts": {str(bucket): int(model.counts[row, bucket]) for bucket in np.flatnonzero(model.counts[row])}
+    } for row, category in enumerate(model.categories)]
+    await db.category_model.delete_many({})
+    if docs:
+        await db.category_model.insert_many(docs)
+    await load_category_model()
+    return {"categories": len(docs), "documents": int(model.documents.sum())}
+
+
+# ==================== CATEGORIZATION RULES ====================
+# User rules are compiled into one RuleSet: keyword patterns share a KeywordMatcher, regexes are
+# compiled once, and only rules whose pattern matched have their other conditions checked.
+RULE_PATTERN_TYPES = ["keyword", "regex"]
+RULE_APPLY_BATCH_SIZE = 1000
+CATEGORIZATION_RULES_REFRESH_SECONDS = 60
+
+def rule_conditions_hold(rule: CategorizationRule, tx: dict) -> bool:
+    """Check every condition of a rule except its description pattern"""
+    amount = tx.get('amount')
+    if rule.min_amount is not None and (amount is None or amount < rule.min_amount):
+        return False
+    if rule.max_amount is not None and (amount is None or amount > rule.max_amount):
+        return False
+    if rule.account and (tx.get('account') or "").casefold() != rule.account.casefold():
+        return False
+    if rule.type and getattr(tx.get('type'), "value", tx.get('type')) != rule.type.value:
+        return False
+    if rule.tags and not set(rule.tags) <= set(tx.get('tags') or []):
+        return False
+    return True
+
+def rule_changes(rule: CategorizationRule, tx: dict) -> dict:
+    """Fields a rule would change on a transaction (empty when it is already classified that way)"""
+    changes = {}
+    if getattr(tx.get('category'), "value", tx.get('category')) != rule.category.value:
+        changes['category'] = rule.category.value
+    if rule.sub_category and getattr(tx.get('sub_category'), "value", tx.get('sub_category')) != rule.sub_category.value:
+        changes['sub_category'] = rule.sub_category.value
+    tags = tx.get('tags') or []
+    missing = [tag for tag in rule.add_tags if tag not in tags]
+    if missing:
+        changes['tags'] = tags + missing
+    return changes
+
+class RuleSet:
+    """Categorization rules compiled for matching many transactions"""
+    
+    def __init__(self, rules: list):
+        self.rules = sorted(rules, key=lambda rule: (rule.priority, rule.created_at))
+        self.unconditional = []
+        self.regexes = {}
+        keywords = {}
+        for position, rule in enumerate(self.rules):
+            if not rule.description_pattern:
+                self.unconditional.append(position)
+            elif rule.pattern_type == "regex":
+                self.regexes[position] = re.compile(rule.description_pattern, re.IGNORECASE)
+            elif normalize_description(rule.description_pattern):
+                keywords[position] = [rule.description_pattern]
+        self.keywords = KeywordMatcher(keywords)
+        self.loaded_at = time.monotonic()
+    
+    def match(self, tx: dict) -> Optional[CategorizationRule]:
+        """The highest-priority rule that matches a transaction, or None"""
+        if not self.rules:
+            return None
+        description = tx.get('description') or ""
+        candidates = set(self.unconditional)
+        candidates.update(position for _, position in self.keywords.matches(normalize_description(description)))
+        candidates.update(position for position, regex in self.regexes.items() if regex.search(description))
+        for position in sorted(candidates):
+            if rule_conditions_hold(self.rules[position], tx):
+                return self.rules[position]
+        return None
+    
+    def apply(self, tx: dict) -> Optional[CategorizationRule]:
+        """Classify a transaction dict in place with the matching rule, if any"""
+        rule = self.match(tx)
+        if rule is not None:
+            tx.update(rule_changes(rule, tx))
+        return rule
+
+RULE_SET = RuleSet([])
+
+def validate_rule(rule: CategorizationRule):
+    """Reject rules that could never be compiled or would match every transaction"""
+    if rule.pattern_type not in RULE_PATTERN_TYPES:
+        raise HTTPException(status_code=400, detail=f"pattern_type must be one of: {', '.join(RULE_PATTERN_TYPES)}")
+    if rule.description_pattern:
+        if rule.pattern_type == "regex":
+            try:
+                re.compile(rule.description_pattern)
+            except re.error as e:
+                raise HTTPException(status_code=400, detail=f"Invalid regex: {e}")
+        elif not normalize_description(rule.description_pattern):
+            raise HTTPException(status_code=400, detail="description_pattern must contain at least one word")
+    if not (rule.description_pattern or rule.min_amount is not None or rule.max_amount is not None
+            or rule.account or rule.type or rule.tags):
+        raise HTTPException(status_code=400, detail="A rule needs at least one condition")
+
+async def load_categorization_rules():
+    """Recompile RULE_SET from the active rules in MongoDB"""
+    global RULE_SET
+    docs = await db.categorization_rules.find({"is_active": True}, {"_id": 0}).to_list(None)
+    RULE_SET = RuleSet([CategorizationRule(**doc) for doc in docs])
+
+async def get_rule_set() -> RuleSet:
+    """RULE_SET, reloaded when another worker may have changed the rules"""
+    if time.monotonic() - RULE_SET.loaded_at > CATEGORIZATION_RULES_REFRESH_SECONDS:
+        await load_categorization_rules()
+    return RULE_SET
+
+def rule_candidate_query(rule: CategorizationRule) -> dict:
+    """Pre-filter for the transactions a rule may match; RuleSet.match decides exactly.
+    
+    It must never drop a row the rule matches. $text tokens are not WORD_PATTERN words (Mongo keeps
+    "kopi_susu" whole, so $text "kopi" misses it) and Mongo's PCRE is not Python's re, so the
+    description is only narrowed by a plain ASCII substring; regex rules and non-ASCII words scan
+    every row the other conditions allow.
+    """
+    query = {}
+    if rule.description_pattern and rule.pattern_type != "regex":
+        # Every match contains the pattern's longest word as a substring, whatever surrounds it
+        word = max(normalize_description(rule.description_pattern).split(), key=len)
+        if word.isascii():
+            query["description"] = {"$regex": re.escape(word), "$options": "i"}
+    if rule.type:
+        query["type"] = rule.type.value
+    if rule.min_amount is not None or rule.max_amount is not None:
+        query["amount"] = {}
+        if rule.min_amount is not None:
+            query["amount"]["$gte"] = rule.min_amount
+        if rule.max_amount is not None:
+            query["amount"]["$lte"] = rule.max_amount
+    if rule.tags:
+        query["tags"] = {"$all": rule.tags}
+    return query
+
+async def apply_rule_retroactively(rule: CategorizationRule):
+    """Reclassify existing transactions matching a rule, one update_many per batch of rows that change.
+    
+    Only classification fields change, so account balances and the dashboard summary are untouched.
+    """
+    matcher = RuleSet([rule])
+    projection = {"_id": 0, "id": 1, "description": 1, "amount": 1, "account": 1, "type": 1,
+                  "tags": 1, "category": 1, "sub_category": 1}
+    cursor = db.transactions.find(rule_candidate_query(rule), projection).batch_size(RULE_APPLY_BATCH_SIZE)
+    matched = 0
+    updated = 0
+    pending = []
+    
+    update = {"$set": {"category": rule.category.value}}
+    if rule.sub_category:
+        update["$set"]["sub_category"] = rule.sub_category.value
+    if rule.add_tags:
+        update["$addToSet"] = {"tags": {"$each": rule.add_tags}}
+    
+    async def flush():
+        update["$set"]["updated_at"] = datetime.now(timezone.utc)
+        result = await db.transactions.update_many({"id": {"$in": [tx['id'] for tx, _ in pending]}}, update)
+        recategorized = [tx for tx, changes in pending if 'category' in changes]
+        await learn_categories([(tx['description'], tx['category']) for tx in recategorized], -1)
+        await learn_categories([(tx['description'], rule.category.value) for tx in recategorized])
+        pending.clear()
+        return result.modified_count
+    
+    async for tx in cursor:
+        if matcher.match(tx) is None:
+            continue
+        matched += 1
+        changes = rule_changes(rule, tx)
+        if changes:
+            pending.append((tx, changes))
+        if len(pending) >= RULE_APPLY_BATCH_SIZE:
+            updated += await flush()
+    if pending:
+        updated += await flush()
+    
+    return {"rule_id": rule.id, "matched": matched, "updated": updated}
+
+
+# ==================== DEBT PROJECTION ====================
+# All strategies are simulated at once on (strategy x debt) arrays. Each month accrues interest,
+# pays every minimum, then sends the rest of the strategy's monthly budget down its priority order.
+DEBT_STRATEGIES = ("avalanche", "snowball", "custom", "minimum")
+DEBT_PAID_OFF = 0.5  # Balances under half a Rupiah count as paid off
+
+def debt_priority(strategy: str, balances, rates, custom_order=()):
+    """Debt indices in the order a strategy sends extra payments to them"""
+    avalanche = np.lexsort((balances, -rates))  # Highest rate first, smaller balance breaks ties
+    if strategy == "snowball":
+        return np.lexsort((-rates, balances))
+    if strategy == "custom":
+        first = list(custom_order)
+        return np.array(first + [i for i in avalanche if i not in first])
+    return avalanche
+
+def simulate_debts(balances, annual_rates, minimums, orders, budgets, months: int):
+    """Month-by-month amortization of the same debts under several strategies.
+    
+    orders holds one row of priority indices per strategy; budgets is each strategy's total monthly
+    payment, NaN to pay only the minimums. Returns (month x strategy x debt) arrays of end-of-month
+    balance, interest and payment, cut at the month the last strategy clears every debt.
+    """
+    strategies, count = orders.shape
+    balance = np.tile(np.asarray(balances, dtype=float), (strategies, 1))
+    rate = np.asarray(annual_rates, dtype=float) / 100 / 12
+    minimum = np.asarray(minimums, dtype=float)
+    budget = np.asarray(budgets, dtype=float)
+    rolls_over = ~np.isnan(budget)
+    budget = np.nan_to_num(budget)
+    schedule = {key: np.zeros((months, strategies, count)) for key in ("balance", "interest", "payment")}
+    rows = np.arange(strategies)[:, None]
+    
+    for month in range(months):
+        interest = balance * rate
+        balance += interest
+        payment = np.minimum(minimum, balance)
+        # Whatever the minimums leave of the budget pays down debts in priority order
+        leftover = np.maximum((budget - payment.sum(axis=1)) * rolls_over, 0)
+        ordered = (balance - payment)[rows, orders]
+        ahead = np.cumsum(ordered, axis=1) - ordered
+        payment[rows, orders] += np.minimum(np.maximum(leftover[:, None] - ahead, 0), ordered)
+        balance -= payment
+        balance[balance < DEBT_PAID_OFF] = 0
+        
+        schedule["balance"][month] = balance
+        schedule["interest"][month] = interest
+        schedule["payment"][month] = payment
+        if not balance.any():
+            return {key: values[:month + 1] for key, values in schedule.items()}
+    return schedule
+
+def summarize_debt_simulation(debts, strategies, schedule, start: datetime):
+    """Per-strategy totals, payoff months and month-by-month balances"""
+    balance, interest, payment = schedule["balance"], schedule["interest"], schedule["payment"]
+    labels = [(start + relativedelta(months=month + 1)).strftime("%Y-%m") for month in range(len(balance))]
+    cleared = balance == 0  # A cleared debt never accrues again
+    payoff = np.where(cleared.any(axis=0), cleared.argmax(axis=0), -1)
+    
+    results = []
+    for s, strategy in enumerate(strategies):
+        paid_off = bool((payoff[s] >= 0).all())
+        months = int(payoff[s].max()) + 1 if paid_off else len(balance)
+        results.append({
+            "strategy": strategy,
+            "months_to_payoff": months if paid_off else None,
+            "payoff_month": labels[months - 1] if paid_off else None,
+            "total_interest": round(float(interest[:, s].sum()), 2),
+            "total_paid": round(float(payment[:, s].sum()), 2),
+            "debts": [{
+                "id": debt["id"],
+                "creditor": debt["creditor"],
+                "payoff_month": labels[payoff[s, i]] if payoff[s, i] >= 0 else None,
+                "interest_paid": round(float(interest[:, s, i].sum()), 2),
+                "balances": balance[:months, s, i].round(2).tolist()
+            } for i, debt in enumerate(debts)],
+            "schedule": [
+                {"month": label, "balance": total, "interest": charged, "payment": paid}
+                for label, total, charged, paid in zip(
+                    labels[:months],
+                    balance[:months, s].sum(axis=1).round(2).tolist(),
+                    interest[:months, s].sum(axis=1).round(2).tolist(),
+                    payment[:months, s].sum(axis=1).round(2).tolist()
+                )
+            ]
+        })
+    return results
+
+
+# ==================== MARKET PRICES ====================
+# `market_prices` keeps the latest quote per product. A quote sheet revalues every matching holding
+# with one bulk_write per collection; a quote older than a holding's price_as_of never overwrites it.
+PRICED_HOLDINGS = {
+    # asset_class: (symbol field, price field)
+    "stocks": ("ticker", "current_price"),
+    "gold": ("type", "current_price_per_gram"),
+    "mutual_funds": ("product_name", "current_nav"),
+}
+
+def price_symbol(symbol) -> str:
+    """Symbols match case- and whitespace-insensitively ("bbca" is BBCA, "antam" is the Antam gold type)"""
+    return " ".join(str(getattr(symbol, "value", symbol)).upper().split())
+
+def price_asset_class(asset_class: str) -> Optional[str]:
+    """PRICED_HOLDINGS key for an asset class as written on a quote sheet ("Mutual-Funds" works)"""
+    key = asset_class.strip().lower().replace("-", "_").replace(" ", "_")
+    return key if key in PRICED_HOLDINGS else None
+
+async def apply_market_quotes(quotes: List[MarketQuote]):
+    """Record every quote in the price history, store the newest per product and revalue the holdings it prices"""
+    points = {
+        (quote.asset_class, price_symbol(quote.symbol), quote.quoted_at): price_point(
+            quote.asset_class, quote.symbol, quote.price, quote.quoted_at, "bulk"
+        ) for quote in quotes
+    }
+    await record_prices(list(points.values()))
+    
+    latest = {}
+    for quote in quotes:
+        key = (quote.asset_class, price_symbol(quote.symbol))
+        if key not in latest or quote.quoted_at >= latest[key].quoted_at:
+            latest[key] = quote
+    if not latest:
+        return {"prices_updated": 0, "stale_quotes": 0, "revalued": {}, "history_points": 0}
+    now = datetime.now(timezone.utc)
+    
+    # The upsert of a quote older than the stored one collides on `id`: it is stale, and its
+    # holdings are left at the newer stored price. Write error indexes follow latest's order.
+    keys = list(latest)
+    stale = 0
+    try:
+        result = await db.market_prices.bulk_write([
+            UpdateOne(
+                {"id": f"{asset_class}:{symbol}", "quoted_at": {"$not": {"$gt": quote.quoted_at}}},
+                {"$set": {"asset_class": asset_class, "symbol": symbol, "price": quote.price,
+                          "quoted_at": quote.quoted_at, "updated_at": now}},
+                upsert=True
+            ) for (asset_class, symbol), quote in latest.items()
+        ], ordered=False)
+        prices_updated = result.matched_count + result.upserted_count
+    except BulkWriteError as e:
+        write_errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != 11000 for error in write_errors):
+            raise
+        for error in write_errors:
+            del latest[keys[error["index"]]]
+        stale = len(write_errors)
+        prices_updated = e.details.get("nMatched", 0) + e.details.get("nUpserted", 0)
+    
+    revalued = {}
+    deltas = []
+    drifted = False
+    for collection, (symbol_field, price_field) in PRICED_HOLDINGS.items():
+        prices = {symbol: quote for (asset_class, symbol), quote in latest.items() if asset_class == collection}
+        if not prices:
+            continue
+        # Positions number in the dozens; matching in Python keeps symbols case-insensitive
+        updates = []
+        changes = []
+        async for holding in db[collection].find({}, {"_id": 0}):
+            quote = prices.get(price_symbol(holding.get(symbol_field, "")))
+            if quote is None or holding.get(price_field) is None:
+                continue
+            if holding.get("price_as_of") is not None and parse_datetime(holding["price_as_of"]) > quote.quoted_at:
+                continue
+            # Filtering on the price read makes a concurrent change fall back to a summary rebuild
+            updates.append(UpdateOne(
+                {"id": holding["id"], price_field: holding[price_field]},
+                {"$set": {price_field: quote.price, "price_as_of": quote.quoted_at, "updated_at": now}}
+            ))
+            changes.append(holding_delta(collection, holding, {**holding, price_field: quote.price}))
+        if not updates:
+            continue
+        result = await db[collection].bulk_write(updates, ordered=False)
+        revalued[collection] = result.matched_count
+        if result.matched_count == len(updates):
+            deltas.extend(changes)
+        else:
+            drifted = True
+    
+    if drifted:
+        await rebuild_dashboard_summary()
+    else:
+        await inc_summary(combine_deltas(*deltas))
+    return {"prices_updated": prices_updated, "stale_quotes": stale, "revalued": revalued, "history_points": len(points)}
+
+
+# ==================== PRICE HISTORY ====================
+# Every quote, from a quote sheet or typed into a holding, is a point in `price_history`: a time-series
+# collection whose metaField groups points per product. Charts are downsampled server-side into
+# OHLC candles with $dateTrunc, so a five-year chart is a few hundred weekly candles.
+PRICE_HISTORY_BATCH_SIZE = 1000
+PRICE_HISTORY_MAX_POINTS = 500
+PRICE_HISTORY_RAW_LIMIT = 5000
+PRICE_HISTORY_DEFAULT_DAYS = 365
+
+# Candle widths in days, finest first
+PRICE_HISTORY_INTERVALS = {"day": 1, "week": 7, "month": 30}
+
+def price_point(asset_class: str, symbol, price: float, quoted_at: datetime, source: str):
+    """price_history document; `meta` is the time-series metaField"""
+    return {
+        "quoted_at": quoted_at,
+        "meta": {"asset_class": asset_class, "symbol": price_symbol(symbol)},
+        "price": price,
+        "source": source
+    }
+
+async def record_prices(points: list):
+    """Append points to price_history, PRICE_HISTORY_BATCH_SIZE per insert_many"""
+    for start in range(0, len(points), PRICE_HISTORY_BATCH_SIZE):
+        await db.price_history.insert_many(points[start:start + PRICE_HISTORY_BATCH_SIZE], ordered=False)
+
+async def record_holding_price(collection: str, holding: dict):
+    """History point for a price set by hand on a stock, gold or mutual fund holding"""
+    symbol_field, price_field = PRICED_HOLDINGS[collection]
+    if holding.get(price_field) is None or not holding.get(symbol_field):
+        return
+    quoted_at = holding.get("price_as_of") or holding.get("updated_at") or datetime.now(timezone.utc)
+    await record_prices([price_point(collection, holding[symbol_field], holding[price_field], quoted_at, "manual")])
+
+async def update_priced_holding(collection: str, holding_id: str, data: dict) -> Optional[dict]:
+    """Apply an edit to a stock, gold or mutual fund holding; None if it doesn't exist.
+    
+    price_as_of is stamped, and a history point recorded, only when the edit changes the price:
+    resending the current price (as the edit forms do) leaves both alone.
+    """
+    price_field = PRICED_HOLDINGS[collection][1]
+    coerce_datetimes(data)
+    data.pop('price_as_of', None)
+    data['updated_at'] = datetime.now(timezone.utc)
+    existing = None
+    if data.get(price_field) is not None:
+        existing = await db[collection].find_one_and_update(
+            {"id": holding_id, price_field: {"$ne": data[price_field]}},
+            {"$set": {**data, "price_as_of": data['updated_at']}},
+            {"_id": 0},
+            return_document=ReturnDocument.BEFORE
+        )
+        if existing:
+            data['price_as_of'] = data['updated_at']
+    if not existing:
+        existing = await db[collection].find_one_and_update(
+            {"id": holding_id},
+            {"$set": data},
+            {"_id": 0},
+            return_document=ReturnDocument.BEFORE
+        )
+        if not existing:
+            return None
+    
+    updated = {**existing, **data}
+    updated.pop("_id", None)
+    await inc_summary(holding_delta(collection, existing, updated))
+    if 'price_as_of' in data:
+        await record_holding_price(collection, updated)
+    return updated
+
+def history_interval(start: datetime, end: datetime) -> str:
+    """Finest candle width that keeps start..end within PRICE_HISTORY_MAX_POINTS"""
+    days = max((end - start).total_seconds() / 86400, 1)
+    for interval, width in PRICE_HISTORY_INTERVALS.items():
+        if days / width <= PRICE_HISTORY_MAX_POINTS:
+            return interval
+    return "month"
+
+def ohlc_pipeline(match: dict, interval: str):
+    """Group price points into open/high/low/close candles of one calendar `interval` (UTC)"""
+    trunc = {"date": "$quoted_at", "unit": interval}
+    if interval == "week":
+        trunc["startOfWeek"] = "monday"
+    return [
+        {"$match": match},
+        {"$sort": {"quoted_at": 1}},
+        {"$group": {
+            "_id": {"$dateTrunc": trunc},
+            "open": {"$first": "$price"},
+            "high": {"$max": "$price"},
+            "low": {"$min": "$price"},
+            "close": {"$last": "$price"},
+            "count": {"$sum": 1}
+        }},
+        {"$sort": {"_id": 1}}
+    ]
 
 
 # ==================== ROUTES ====================
@@ -461,34 +2619,41 @@ async def root():
 # ==================== ACCOUNT ROUTES ====================
 @api_router.get("/accounts", response_model=List[Account])
 async def get_accounts():
-    accounts = await db.accounts.find({}, {"_id": 0}).to_list(1000)
-    accounts = [deserialize_datetime(acc) for acc in accounts]
-    return accounts
+    accounts = await db.accounts.find({}, MODEL_CODECS[Account].projection).to_list(1000)
+    return fast_list_response(Account, accounts)
 
 @api_router.post("/accounts", response_model=Account)
 async def create_account(account: AccountCreate):
-    # Check for duplicate account name
-    existing = await db.accounts.find_one({"name": {"$regex": f"^{account.name}$", "$options": "i"}}, {"_id": 0})
-    if existing:
-        raise HTTPException(status_code=400, detail=f"Account '{account.name}' already exists")
-    
     acc_obj = Account(**account.model_dump())
-    doc = serialize_datetime(acc_obj.model_dump())
-    await db.accounts.insert_one(doc)
+    doc = to_document(acc_obj)
+    # The name_ci_unique index rejects duplicate names atomically, whatever their case; until it
+    # is built, fall back to checking first, which a concurrent create can race
+    if not ACCOUNT_NAME_INDEX["enforced"] and await db.accounts.find_one(
+        {"name": account.name}, {"_id": 1}, collation=ACCOUNT_NAME_COLLATION
+    ):
+        raise HTTPException(status_code=400, detail=f"Account '{account.name}' already exists")
+    try:
+        await db.accounts.insert_one(doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail=f"Account '{account.name}' already exists")
+    await inc_summary({"liquid_assets": acc_obj.balance})
     return acc_obj
 
 @api_router.delete("/accounts/{account_id}")
 async def delete_account(account_id: str):
-    result = await db.accounts.delete_one({"id": account_id})
-    if result.deleted_count == 0:
+    deleted = await db.accounts.find_one_and_delete({"id": account_id}, {"_id": 0, "balance": 1})
+    if not deleted:
         raise HTTPException(status_code=404, detail="Account not found")
+    await inc_summary({"liquid_assets": -deleted['balance']})
     return {"message": "Account deleted successfully"}
 
 
 # ==================== TRANSACTION ROUTES ====================
 @api_router.get("/transactions", response_model=List[Transaction])
 async def get_transactions(
+    response: Response,
     search: Optional[str] = Query(None),
+    search_mode: Optional[str] = Query("literal"),
     type: Optional[str] = Query(None),
     category: Optional[str] = Query(None),
     account: Optional[str] = Query(None),
@@ -499,142 +2664,347 @@ async def get_transactions(
     max_amount: Optional[float] = Query(None),
     sort_by: Optional[str] = Query("date"),
     sort_order: Optional[str] = Query("desc"),
-    limit: Optional[int] = Query(1000)
+    limit: Optional[int] = Query(1000, ge=1, le=1000),
+    cursor: Optional[str] = Query(None)
 ):
-    """Get all transactions with filtering and sorting"""
-    query = {}
-    
-    if search:
-        query["$or"] = [
-            {"description": {"$regex": search, "$options": "i"}},
-            {"notes": {"$regex": search, "$options": "i"}}
-        ]
-    
-    if type:
-        query["type"] = type
-    
-    if category:
-        query["category"] = category
-    
-    if account:
-        query["account"] = account
-    
-    if status:
-        query["status"] = status
-    
-    if date_from or date_to:
-        query["date"] = {}
-        if date_from:
-            query["date"]["$gte"] = date_from
-        if date_to:
-            query["date"]["$lte"] = date_to
+    """Get transactions with filtering and sorting, one keyset page at a time.
+    
+    The next page's cursor is returned in the X-Next-Cursor header (absent on the last page).
+    sort_by=relevance ranks a search_mode=text search by score and returns only the top `limit` rows.
+    """
+    if search_mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"search_mode must be one of: {', '.join(SEARCH_MODES)}")
+    if sort_by == "relevance":
+        if not search or search_mode != "text":
+            raise HTTPException(status_code=400, detail="sort_by=relevance requires a search with search_mode=text")
+        if cursor:
+            raise HTTPException(status_code=400, detail="Relevance-ranked results cannot be paginated")
+    elif sort_by not in TRANSACTION_SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"sort_by must be one of: {', '.join(TRANSACTION_SORT_FIELDS)}, relevance")
+    if sort_order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="sort_order must be 'asc' or 'desc'")
+    
+    query = build_transaction_query(
+        search=search, search_mode=search_mode, type=type, category=category, account=account, status=status,
+        date_from=date_from, date_to=date_to, min_amount=min_amount, max_amount=max_amount
+    )
     
-    if min_amount is not None or max_amount is not None:
-        query["amount"] = {}
-        if min_amount is not None:
-            query["amount"]["$gte"] = min_amount
-        if max_amount is not None:
-            query["amount"]["$lte"] = max_amount
+    if sort_by == "relevance":
+        score = {"$meta": "textScore"}
+        transactions = await db.transactions.find(
+            query, {**MODEL_CODECS[Transaction].projection, "score": score}
+        ).sort([("score", score), ("id", ASCENDING)]).limit(limit).to_list(limit)
+        for tx in transactions:
+            tx.pop("score", None)
+        return fast_list_response(Transaction, transactions)
     
     sort_direction = -1 if sort_order == "desc" else 1
     
-    transactions = await db.transactions.find(query, {"_id": 0}).sort(sort_by, sort_direction).limit(limit).to_list(limit)
-    transactions = [deserialize_datetime(tx) for tx in transactions]
-    return transactions
+    if cursor:
+        try:
+            cursor_sort_by, cursor_direction, last_value, last_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if cursor_sort_by != sort_by or cursor_direction != sort_direction:
+            raise HTTPException(status_code=400, detail="Cursor does not match sort_by/sort_order")
+        
+        keyset = keyset_condition(sort_by, sort_direction, last_value, last_id)
+        # Mid-migration, BSON dates sort after strings: make sure the other type's rows still follow
+        if sort_by in DATETIME_FIELDS and not DATETIME_MIGRATION["done"]:
+            if sort_direction == -1 and isinstance(last_value, datetime):
+                keyset["$or"].append({sort_by: {"$type": "string"}})
+            elif sort_direction == 1 and isinstance(last_value, str):
+                keyset["$or"].append({sort_by: {"$type": "date"}})
+        query = {"$and": [query, keyset]} if query else keyset
+    
+    # Fetch one extra row to know whether another page exists
+    transactions = await db.transactions.find(query, MODEL_CODECS[Transaction].projection).sort(
+        [(sort_by, sort_direction), ("id", sort_direction)]
+    ).limit(limit + 1).to_list(limit + 1)
+    
+    headers = {}
+    if len(transactions) > limit:
+        transactions = transactions[:limit]
+        last = transactions[-1]
+        headers["X-Next-Cursor"] = encode_cursor(sort_by, sort_direction, last.get(sort_by), last['id'])
+        response.headers.update(headers)
+    
+    return fast_list_response(Transaction, transactions, headers)
 
 @api_router.post("/transactions", response_model=Transaction)
 async def create_transaction(transaction: TransactionCreate):
     tx_dict = transaction.model_dump()
     if tx_dict.get('date') is None:
         tx_dict['date'] = datetime.now(timezone.utc)
+    (await get_rule_set()).apply(tx_dict)
     
     tx_obj = Transaction(**tx_dict)
-    doc = serialize_datetime(tx_obj.model_dump())
+    doc = to_document(tx_obj)
     await db.transactions.insert_one(doc)
+    await inc_summary(transaction_delta(doc))
+    await learn_categories([(tx_obj.description, tx_obj.category)])
     
     # Update account balance
     amount = tx_obj.amount
     if tx_obj.type == TransactionType.EXPENSE:
         amount = -amount
     
-    await db.accounts.update_one(
-        {"name": tx_obj.account},
-        {"$inc": {"balance": amount}}
-    )
+    await apply_balance_change(tx_obj.account, amount)
     
     # Auto-create debt entry for Credit Card or Pay Later transactions
-    if tx_obj.type == TransactionType.EXPENSE and tx_obj.payment_method in [PaymentMethod.CREDIT, PaymentMethod.PAYLATER]:
-        # Check if debt already exists for this creditor
-        existing_debt = await db.debts.find_one({"creditor": tx_obj.account, "is_active": True}, {"_id": 0})
-        
-        if existing_debt:
-            # Update existing debt balance
-            new_balance = existing_debt['current_balance'] + tx_obj.amount
-            await db.debts.update_one(
-                {"id": existing_debt['id']},
-                {"$set": {"current_balance": new_balance, "updated_at": datetime.now(timezone.utc).isoformat()}}
-            )
-        else:
-            # Create new debt entry
-            debt_type = DebtType.CREDIT_CARD if tx_obj.payment_method == PaymentMethod.CREDIT else DebtType.INSTALLMENT
-            new_debt = Debt(
-                debt_type=debt_type,
-                creditor=tx_obj.account,
-                principal_amount=tx_obj.amount,
-                current_balance=tx_obj.amount,
-                interest_rate=2.5 if tx_obj.payment_method == PaymentMethod.CREDIT else 1.5,
-                monthly_payment=tx_obj.amount * 0.1,
-                remaining_installments=10,
-                due_date="05",
-                start_date=datetime.now(timezone.utc),
-                notes=f"Auto-created from {tx_obj.payment_method.value} transaction: {tx_obj.description}"
-            )
-            debt_doc = serialize_datetime(new_debt.model_dump())
-            await db.debts.insert_one(debt_doc)
+    if tx_obj.type == TransactionType.EXPENSE and tx_obj.payment_method in DEBT_PAYMENT_METHODS:
+        await apply_debt_charge(tx_obj.account, tx_obj.amount, tx_obj.payment_method, tx_obj.description)
     
     return tx_obj
 
+# Payment methods whose expenses are owed to the account's creditor
+DEBT_PAYMENT_METHODS = [PaymentMethod.CREDIT, PaymentMethod.PAYLATER]
+DEBT_CHARGE_ATTEMPTS = 3
+# Fields of an auto-created debt that tie it to its charge account
+CHARGE_DEBT_FIELDS = ("creditor",)
+
+async def apply_debt_charge(creditor: str, amount: float, payment_method: PaymentMethod, description: str):
+    """Add a Credit Card / Pay Later charge to the creditor's active debt, creating one if needed"""
+    for _ in range(DEBT_CHARGE_ATTEMPTS):
+        if await add_debt_charge({"creditor": creditor, "is_active": True}, amount):
+            return
+        if await open_charge_debt(creditor, amount, payment_method, description):
+            return
+        # The account already has an open auto-created debt (opened concurrently, or under another creditor name)
+        if await add_debt_charge({"charge_account": creditor, "is_active": True}, amount):
+            return
+    raise HTTPException(status_code=409, detail=f"Could not add the charge to the active debt for {creditor}; retry")
+
+async def add_debt_charge(query: dict, amount: float) -> bool:
+    """$inc the first active debt matching query by a charge; False if none matched"""
+    debt = await db.debts.find_one_and_update(
+        query,
+        {"$inc": {"current_balance": amount}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+        {"_id": 0, "id": 1}
+    )
+    if not debt:
+        return False
+    await inc_summary({"liabilities": amount})
+    return True
+
+async def open_charge_debt(creditor: str, amount: float, payment_method: PaymentMethod, description: str) -> bool:
+    """Open the creditor's auto-created debt with a first charge; False if another request already has"""
+    debt_type = DebtType.CREDIT_CARD if payment_method == PaymentMethod.CREDIT else DebtType.INSTALLMENT
+    new_debt = Debt(
+        debt_type=debt_type,
+        creditor=creditor,
+        principal_amount=amount,
+        current_balance=amount,
+        interest_rate=2.5 if payment_method == PaymentMethod.CREDIT else 1.5,
+        monthly_payment=amount * 0.1,
+        remaining_installments=10,
+        due_date="05",
+        start_date=datetime.now(timezone.utc),
+        notes=f"Auto-created from {payment_method.value} transaction: {description}"
+    )
+    debt_doc = to_document(new_debt)
+    debt_doc["charge_account"] = creditor
+    try:
+        await db.debts.insert_one(debt_doc)
+    except DuplicateKeyError:
+        return False
+    await inc_summary(holding_delta("debts", after=debt_doc))
+    return True
+
+@api_router.post("/transactions/import")
+async def import_transactions(request: Request, auto_categorize: bool = Query(False)):
+    """Bulk import transactions from a JSON array or CSV (raw text/csv body or multipart `file`).
+    
+    Rows are validated in one pass; invalid rows are reported and skipped without aborting the batch.
+    With auto_categorize, rows without a category get the smart-categorize suggestion.
+    """
+    rows = await read_rows(request, "transactions")
+    
+    if auto_categorize:
+        await refresh_category_model()
+    
+    rule_set = await get_rule_set()
+    
+    if auto_categorize:
+        uncategorized = [row for row in rows if isinstance(row, dict) and not row.get("category")]
+        suggestions = suggest_categories([(str(row.get("description", "")), row.get("type")) for row in uncategorized])
+        for row, suggestion in zip(uncategorized, suggestions):
+            row["category"] = suggestion["suggested_category"]
+    
+    # Validate every row up front
+    errors = []
+    valid = []
+    for index, row in enumerate(rows):
+        try:
+            tx_create = TransactionCreate.model_validate(row)
+        except ValidationError as e:
+            errors.append({"row": index, "errors": [
+                {"field": ".".join(str(loc) for loc in err["loc"]), "message": err["msg"]} for err in e.errors()
+            ]})
+            continue
+        tx_dict = tx_create.model_dump()
+        if tx_dict.get('date') is None:
+            tx_dict['date'] = datetime.now(timezone.utc)
+        rule_set.apply(tx_dict)
+        valid.append((index, Transaction(**tx_dict)))
+    
+    # Insert in batches, keeping only rows the server accepted
+    inserted = []
+    for start in range(0, len(valid), IMPORT_BATCH_SIZE):
+        batch = valid[start:start + IMPORT_BATCH_SIZE]
+        docs = [to_document(tx) for _, tx in batch]
+        failed = set()
+        try:
+            await db.transactions.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            for write_error in e.details.get("writeErrors", []):
+                failed.add(write_error["index"])
+                errors.append({"row": batch[write_error["index"]][0], "errors": [
+                    {"field": None, "message": write_error.get("errmsg", "Write failed")}
+                ]})
+        inserted.extend((batch[i], docs[i]) for i in range(len(batch)) if i not in failed)
+    
+    failed_charges = await record_new_transactions([doc for _, doc in inserted])
+    
+    # Rows whose debt charge could not be applied are stored; report them without counting them as failed
+    for (index, tx), _ in inserted:
+        if tx.account in failed_charges and tx.type == TransactionType.EXPENSE and tx.payment_method in DEBT_PAYMENT_METHODS:
+            errors.append({"row": index, "errors": [
+                {"field": "payment_method", "message": f"Imported, but not added to the debt: {failed_charges[tx.account]}"}
+            ]})
+    
+    errors.sort(key=lambda e: e["row"])
+    return {
+        "imported": len(inserted),
+        "failed": len(rows) - len(inserted),
+        "errors": errors
+    }
+
+async def record_new_transactions(docs: list):
+    """Summary, category model, balance and debt updates for inserted transaction documents.
+    
+    Shared by bulk inserts (imports, recurring items); balance and debt changes are collapsed to
+    one update per account / creditor. Returns {creditor: error} for debt charges that could not be
+    applied; the transactions themselves stay stored.
+    """
+    if not docs:
+        return {}
+    balance_changes = {}
+    debt_charges = {}
+    for doc in docs:
+        amount = doc['amount'] if doc['type'] == TransactionType.INCOME else -doc['amount']
+        balance_changes[doc['account']] = balance_changes.get(doc['account'], 0) + amount
+        if doc['type'] == TransactionType.EXPENSE and doc.get('payment_method') in DEBT_PAYMENT_METHODS:
+            total, method, _ = debt_charges.get(doc['account'], (0, PaymentMethod(doc['payment_method']), None))
+            debt_charges[doc['account']] = (total + doc['amount'], method, doc['description'])
+    
+    failed_charges = {}
+    
+    async def charge(creditor: str, total: float, method: PaymentMethod, description: str):
+        try:
+            await apply_debt_charge(creditor, total, method, description)
+        except HTTPException as e:
+            logger.warning(f"Debt charge of {total} for {creditor} was not applied: {e.detail}")
+            failed_charges[creditor] = e.detail
+    
+    await asyncio.gather(
+        inc_summary(combine_deltas(*[transaction_delta(doc) for doc in docs])),
+        learn_categories([(doc['description'], doc['category']) for doc in docs]),
+        *[apply_balance_change(account, amount) for account, amount in balance_changes.items()],
+        *[charge(creditor, total, method, description)
+          for creditor, (total, method, description) in debt_charges.items()]
+    )
+    return failed_charges
+
+async def read_rows(request: Request, json_key: str):
+    """Rows of a JSON array (or {json_key: [...]}) or CSV (raw text/csv body or multipart `file`)"""
+    content_type = request.headers.get("content-type", "")
+    try:
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form()
+            upload = form.get("file")
+            if upload is None:
+                raise HTTPException(status_code=400, detail="Missing 'file' field")
+            return parse_import_csv((await upload.read()).decode("utf-8-sig"))
+        if content_type.startswith("text/csv"):
+            return parse_import_csv((await request.body()).decode("utf-8-sig"))
+        rows = await request.json()
+    except (UnicodeDecodeError, json.JSONDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Could not parse import file: {e}")
+    if isinstance(rows, dict):
+        rows = rows.get(json_key)
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=400, detail=f"Expected a JSON array of {json_key}")
+    return rows
+
+def parse_import_csv(text: str):
+    """Parse a statement CSV whose header names TransactionCreate fields"""
+    rows = []
+    for record in csv.DictReader(io.StringIO(text)):
+        row = {k.strip(): v.strip() for k, v in record.items() if k and v is not None and v.strip() != ""}
+        if "tags" in row:
+            row["tags"] = [tag.strip() for tag in row["tags"].split(";") if tag.strip()]
+        rows.append(row)
+    return rows
+
+# TransactionUpdate fields that move money; edits touching none of them are reclassifications
+BALANCE_FIELDS = {"amount", "type", "account"}
+
+def signed_amount(tx: dict) -> float:
+    """A transaction's effect on its account balance"""
+    tx_type = getattr(tx['type'], "value", tx['type'])
+    return -tx['amount'] if tx_type == TransactionType.EXPENSE.value else tx['amount']
+
 @api_router.put("/transactions/{transaction_id}", response_model=Transaction)
 async def update_transaction(transaction_id: str, transaction: TransactionUpdate):
-    existing = await db.transactions.find_one({"id": transaction_id}, {"_id": 0})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Transaction not found")
-    
-    existing = deserialize_datetime(existing)
-    
-    # Revert old balance change
-    old_amount = existing['amount']
-    if existing['type'] == TransactionType.EXPENSE.value:
-        old_amount = -old_amount
-    await db.accounts.update_one(
-        {"name": existing['account']},
-        {"$inc": {"balance": -old_amount}}
-    )
-    
-    # Update fields
     update_data = {k: v for k, v in transaction.model_dump().items() if v is not None}
     update_data['updated_at'] = datetime.now(timezone.utc)
     
-    for key, value in update_data.items():
-        existing[key] = value
-    
-    doc = serialize_datetime(existing)
-    await db.transactions.update_one({"id": transaction_id}, {"$set": doc})
-    
-    # Apply new balance change
-    new_amount = existing['amount']
-    if existing['type'] == TransactionType.EXPENSE.value:
-        new_amount = -new_amount
-    await db.accounts.update_one(
-        {"name": existing['account']},
-        {"$inc": {"balance": new_amount}}
-    )
+    if BALANCE_FIELDS.isdisjoint(update_data):
+        # Classification-only edit: a single round trip, balances and summary untouched
+        existing = await db.transactions.find_one_and_update(
+            {"id": transaction_id},
+            {"$set": MODEL_CODECS[Transaction].encode(dict(update_data))},
+            projection={"_id": 0},
+            return_document=ReturnDocument.BEFORE
+        )
+        if not existing:
+            raise HTTPException(status_code=404, detail="Transaction not found")
+        existing = MODEL_CODECS[Transaction].decode(existing)
+        old_example = (existing['description'], existing['category'])
+        existing.update(update_data)
+    else:
+        existing = await db.transactions.find_one({"id": transaction_id}, {"_id": 0})
+        if not existing:
+            raise HTTPException(status_code=404, detail="Transaction not found")
+        
+        existing = MODEL_CODECS[Transaction].decode(existing)
+        old_example = (existing['description'], existing['category'])
+        old_account, old_amount = existing['account'], signed_amount(existing)
+        summary_delta = transaction_delta(existing, -1)
+        
+        existing.update(update_data)
+        doc = MODEL_CODECS[Transaction].encode(existing)
+        await db.transactions.update_one({"id": transaction_id}, {"$set": doc})
+        
+        # Move the balance only if the account or signed amount actually changed
+        if (existing['account'], signed_amount(existing)) != (old_account, old_amount):
+            await apply_balance_change(old_account, -old_amount)
+            await apply_balance_change(existing['account'], signed_amount(existing))
+        summary_delta = combine_deltas(summary_delta, transaction_delta(existing))
+        if any(summary_delta.values()):
+            await inc_summary(summary_delta)
+    
+    new_example = (existing['description'], getattr(existing['category'], "value", existing['category']))
+    if new_example != old_example:
+        await learn_categories([old_example], -1)
+        await learn_categories([new_example])
     
     return Transaction(**existing)
 
 @api_router.delete("/transactions/{transaction_id}")
 async def delete_transaction(transaction_id: str):
-    tx = await db.transactions.find_one({"id": transaction_id}, {"_id": 0})
+    tx = await db.transactions.find_one_and_delete({"id": transaction_id}, {"_id": 0})
     if not tx:
         raise HTTPException(status_code=404, detail="Transaction not found")
     
@@ -642,39 +3012,124 @@ async def delete_transaction(transaction_id: str):
     amount = tx['amount']
     if tx['type'] == TransactionType.EXPENSE.value:
         amount = -amount
-    await db.accounts.update_one(
-        {"name": tx['account']},
-        {"$inc": {"balance": -amount}}
-    )
+    await apply_balance_change(tx['account'], -amount)
+    await inc_summary(transaction_delta(tx, -1))
+    await learn_categories([(tx['description'], tx['category'])], -1)
     
-    await db.transactions.delete_one({"id": transaction_id})
     return {"message": "Transaction deleted successfully"}
 
+@api_router.get("/transactions/export")
+async def export_transactions(
+    format: str = Query("csv"),
+    search: Optional[str] = Query(None),
+    search_mode: Optional[str] = Query("literal"),
+    type: Optional[str] = Query(None),
+    category: Optional[str] = Query(None),
+    account: Optional[str] = Query(None),
+    status: Optional[str] = Query(None),
+    date_from: Optional[str] = Query(None),
+    date_to: Optional[str] = Query(None),
+    min_amount: Optional[float] = Query(None),
+    max_amount: Optional[float] = Query(None),
+    sort_by: Optional[str] = Query("date"),
+    sort_order: Optional[str] = Query("asc")
+):
+    """Stream every matching transaction as CSV or NDJSON without buffering the ledger"""
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'csv' or 'ndjson'")
+    if search_mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"search_mode must be one of: {', '.join(SEARCH_MODES)}")
+    if sort_by not in TRANSACTION_SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"sort_by must be one of: {', '.join(TRANSACTION_SORT_FIELDS)}")
+    
+    query = build_transaction_query(
+        search=search, search_mode=search_mode, type=type, category=category, account=account, status=status,
+        date_from=date_from, date_to=date_to, min_amount=min_amount, max_amount=max_amount
+    )
+    sort_direction = -1 if sort_order == "desc" else 1
+    cursor = db.transactions.find(query, {"_id": 0}).sort(
+        [(sort_by, sort_direction), ("id", sort_direction)]
+    ).batch_size(EXPORT_BATCH_SIZE)
+    
+    filename = f"transactions-{datetime.now(timezone.utc).strftime('%Y%m%d')}.{format}"
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        stream_transactions(cursor, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+def export_value(value):
+    """Render BSON dates as ISO strings in exports"""
+    return value.isoformat() if isinstance(value, datetime) else value
+
+async def stream_transactions(cursor, format: str):
+    """Yield one encoded chunk per EXPORT_BATCH_SIZE rows read from a Motor cursor"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if format == "csv":
+        writer.writerow(EXPORT_COLUMNS)
+    
+    rows = 0
+    async for tx in cursor:
+        if format == "csv":
+            writer.writerow([
+                ";".join(tx.get(col) or []) if col == "tags" else export_value(tx.get(col))
+                for col in EXPORT_COLUMNS
+            ])
+        else:
+            buffer.write(json.dumps({col: export_value(tx.get(col)) for col in EXPORT_COLUMNS}))
+            buffer.write("\n")
+        
+        rows += 1
+        if rows % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    
+    if buffer.tell():
+        yield buffer.getvalue()
+
 @api_router.get("/transactions/stats")
 async def get_transaction_stats():
     """Get transaction statistics"""
-    transactions = await db.transactions.find({}, {"_id": 0}).to_list(10000)
+    is_income = {"$eq": ["$type", "income"]}
+    pipeline = [
+        {"$project": {"_id": 0, "type": 1, "amount": 1, "category": {"$ifNull": ["$category", "Other"]}}},
+        {"$facet": {
+            "totals": [
+                {"$group": {
+                    "_id": None,
+                    "income": {"$sum": {"$cond": [is_income, "$amount", 0]}},
+                    "expense": {"$sum": {"$cond": [{"$eq": ["$type", "expense"]}, "$amount", 0]}},
+                    "count": {"$sum": 1}
+                }}
+            ],
+            "categories": [
+                {"$group": {
+                    "_id": "$category",
+                    "income": {"$sum": {"$cond": [is_income, "$amount", 0]}},
+                    "expense": {"$sum": {"$cond": [is_income, 0, "$amount"]}},
+                    "count": {"$sum": 1}
+                }}
+            ]
+        }}
+    ]
     
-    total_income = sum(tx['amount'] for tx in transactions if tx['type'] == 'income')
-    total_expense = sum(tx['amount'] for tx in transactions if tx['type'] == 'expense')
+    result = await db.transactions.aggregate(pipeline).to_list(1)
+    facets = result[0] if result else {"totals": [], "categories": []}
+    totals = facets["totals"][0] if facets["totals"] else {"income": 0, "expense": 0, "count": 0}
     
-    category_breakdown = {}
-    for tx in transactions:
-        cat = tx.get('category', 'Other')
-        if cat not in category_breakdown:
-            category_breakdown[cat] = {"income": 0, "expense": 0, "count": 0}
-        
-        if tx['type'] == 'income':
-            category_breakdown[cat]['income'] += tx['amount']
-        else:
-            category_breakdown[cat]['expense'] += tx['amount']
-        category_breakdown[cat]['count'] += 1
+    category_breakdown = {
+        c["_id"]: {"income": c["income"], "expense": c["expense"], "count": c["count"]}
+        for c in facets["categories"]
+    }
     
     return {
-        "total_income": total_income,
-        "total_expense": total_expense,
-        "net": total_income - total_expense,
-        "total_transactions": len(transactions),
+        "total_income": totals["income"],
+        "total_expense": totals["expense"],
+        "net": totals["income"] - totals["expense"],
+        "total_transactions": totals["count"],
         "category_breakdown": category_breakdown
     }
 
@@ -682,8 +3137,8 @@ async def get_transaction_stats():
 # ==================== STOCK ROUTES ====================
 @api_router.get("/stocks", response_model=List[Stock])
 async def get_stocks():
-    stocks = await db.stocks.find({}, {"_id": 0}).to_list(1000)
-    return [deserialize_datetime(s) for s in stocks]
+    stocks = await db.stocks.find({}, MODEL_CODECS[Stock].projection).to_list(1000)
+    return fast_list_response(Stock, stocks)
 
 @api_router.post("/stocks", response_model=Stock)
 async def create_stock(stock: StockCreate):
@@ -691,40 +3146,73 @@ async def create_stock(stock: StockCreate):
     if stock_dict.get('buy_date') is None:
         stock_dict['buy_date'] = datetime.now(timezone.utc)
     stock_obj = Stock(**stock_dict)
-    doc = serialize_datetime(stock_obj.model_dump())
+    doc = to_document(stock_obj)
     await db.stocks.insert_one(doc)
+    await inc_summary(holding_delta("stocks", after=doc))
+    await record_holding_price("stocks", doc)
     return stock_obj
 
 @api_router.put("/stocks/{stock_id}", response_model=Stock)
 async def update_stock(stock_id: str, stock_data: dict):
-    existing = await db.stocks.find_one({"id": stock_id}, {"_id": 0})
-    if not existing:
+    updated = await update_priced_holding("stocks", stock_id, stock_data)
+    if updated is None:
         raise HTTPException(status_code=404, detail="Stock not found")
-    
-    stock_data['updated_at'] = datetime.now(timezone.utc).isoformat()
-    await db.stocks.update_one({"id": stock_id}, {"$set": stock_data})
-    
-    updated = await db.stocks.find_one({"id": stock_id}, {"_id": 0})
-    return deserialize_datetime(updated)
+    return MODEL_CODECS[Stock].decode(updated)
 
 @api_router.delete("/stocks/{stock_id}")
 async def delete_stock(stock_id: str):
-    result = await db.stocks.delete_one({"id": stock_id})
-    if result.deleted_count == 0:
+    deleted = await db.stocks.find_one_and_delete({"id": stock_id}, {"_id": 0})
+    if not deleted:
         raise HTTPException(status_code=404, detail="Stock not found")
+    await inc_summary(holding_delta("stocks", before=deleted))
     return {"message": "Stock deleted successfully"}
 
 
 # ==================== DEPOSIT ROUTES ====================
 @api_router.get("/deposits", response_model=List[Deposit])
 async def get_deposits():
-    deposits = await db.deposits.find({}, {"_id": 0}).to_list(1000)
-    return [deserialize_datetime(d) for d in deposits]
+    deposits = await db.deposits.find({}, MODEL_CODECS[Deposit].projection).to_list(1000)
+    return fast_list_response(Deposit, deposits)
+
+@api_router.get("/deposits/valuation")
+async def get_deposit_valuation():
+    """Accrued interest, tax withheld and current value of every deposit"""
+    now = datetime.now(timezone.utc)
+    await load_deposit_book()
+    book = DEPOSIT_BOOK
+    days, gross, tax = book.accrue(now)
+    net = gross - tax
+    matured = book.maturity <= now.timestamp()
+    
+    deposits = [{
+        "id": deposit_id,
+        "bank_name": bank_name,
+        "principal": principal,
+        "days_accrued": int(days_accrued),
+        "gross_interest": round(gross_interest, 2),
+        "tax_withheld": round(tax_withheld, 2),
+        "net_interest": round(net_interest, 2),
+        "value": round(principal + net_interest, 2),
+        "tax_exempt": not tax_rate,
+        "is_matured": is_matured
+    } for deposit_id, bank_name, principal, days_accrued, gross_interest, tax_withheld, net_interest, tax_rate, is_matured in zip(
+        book.ids, book.banks, book.principal.tolist(), days.tolist(), gross.tolist(), tax.tolist(),
+        net.tolist(), book.tax_rate.tolist(), matured.tolist()
+    )]
+    return {
+        "as_of": now,
+        "deposits": deposits,
+        "totals": {
+            "principal": float(book.principal.sum()),
+            "gross_interest": round(float(gross.sum()), 2),
+            "tax_withheld": round(float(tax.sum()), 2),
+            "net_interest": round(float(net.sum()), 2),
+            "value": round(float(book.principal.sum() + net.sum()), 2)
+        }
+    }
 
 @api_router.post("/deposits", response_model=Deposit)
 async def create_deposit(deposit: DepositCreate):
-    from dateutil.relativedelta import relativedelta
-    
     deposit_dict = deposit.model_dump()
     if deposit_dict.get('start_date') is None:
         deposit_dict['start_date'] = datetime.now(timezone.utc)
@@ -735,35 +3223,46 @@ async def create_deposit(deposit: DepositCreate):
     deposit_dict['maturity_date'] = maturity
     
     deposit_obj = Deposit(**deposit_dict)
-    doc = serialize_datetime(deposit_obj.model_dump())
+    doc = to_document(deposit_obj)
     await db.deposits.insert_one(doc)
+    await inc_summary(holding_delta("deposits", after=doc))
+    DEPOSIT_BOOK.invalidate()
     return deposit_obj
 
 @api_router.put("/deposits/{deposit_id}", response_model=Deposit)
 async def update_deposit(deposit_id: str, deposit_data: dict):
-    existing = await db.deposits.find_one({"id": deposit_id}, {"_id": 0})
+    coerce_datetimes(deposit_data)
+    deposit_data['updated_at'] = datetime.now(timezone.utc)
+    existing = await db.deposits.find_one_and_update(
+        {"id": deposit_id},
+        {"$set": deposit_data},
+        {"_id": 0},
+        return_document=ReturnDocument.BEFORE
+    )
     if not existing:
         raise HTTPException(status_code=404, detail="Deposit not found")
     
-    deposit_data['updated_at'] = datetime.now(timezone.utc).isoformat()
-    await db.deposits.update_one({"id": deposit_id}, {"$set": deposit_data})
-    
-    updated = await db.deposits.find_one({"id": deposit_id}, {"_id": 0})
-    return deserialize_datetime(updated)
+    updated = {**existing, **deposit_data}
+    updated.pop("_id", None)
+    await inc_summary(holding_delta("deposits", existing, updated))
+    DEPOSIT_BOOK.invalidate()
+    return MODEL_CODECS[Deposit].decode(updated)
 
 @api_router.delete("/deposits/{deposit_id}")
 async def delete_deposit(deposit_id: str):
-    result = await db.deposits.delete_one({"id": deposit_id})
-    if result.deleted_count == 0:
+    deleted = await db.deposits.find_one_and_delete({"id": deposit_id}, {"_id": 0})
+    if not deleted:
         raise HTTPException(status_code=404, detail="Deposit not found")
+    await inc_summary(holding_delta("deposits", before=deleted))
+    DEPOSIT_BOOK.invalidate()
     return {"message": "Deposit deleted successfully"}
 
 
 # ==================== GOLD ROUTES ====================
 @api_router.get("/gold", response_model=List[Gold])
 async def get_gold():
-    gold_items = await db.gold.find({}, {"_id": 0}).to_list(1000)
-    return [deserialize_datetime(g) for g in gold_items]
+    gold_items = await db.gold.find({}, MODEL_CODECS[Gold].projection).to_list(1000)
+    return fast_list_response(Gold, gold_items)
 
 @api_router.post("/gold", response_model=Gold)
 async def create_gold(gold: GoldCreate):
@@ -771,35 +3270,33 @@ async def create_gold(gold: GoldCreate):
     if gold_dict.get('buy_date') is None:
         gold_dict['buy_date'] = datetime.now(timezone.utc)
     gold_obj = Gold(**gold_dict)
-    doc = serialize_datetime(gold_obj.model_dump())
+    doc = to_document(gold_obj)
     await db.gold.insert_one(doc)
+    await inc_summary(holding_delta("gold", after=doc))
+    await record_holding_price("gold", doc)
     return gold_obj
 
 @api_router.put("/gold/{gold_id}", response_model=Gold)
 async def update_gold(gold_id: str, gold_data: dict):
-    existing = await db.gold.find_one({"id": gold_id}, {"_id": 0})
-    if not existing:
+    updated = await update_priced_holding("gold", gold_id, gold_data)
+    if updated is None:
         raise HTTPException(status_code=404, detail="Gold not found")
-    
-    gold_data['updated_at'] = datetime.now(timezone.utc).isoformat()
-    await db.gold.update_one({"id": gold_id}, {"$set": gold_data})
-    
-    updated = await db.gold.find_one({"id": gold_id}, {"_id": 0})
-    return deserialize_datetime(updated)
+    return MODEL_CODECS[Gold].decode(updated)
 
 @api_router.delete("/gold/{gold_id}")
 async def delete_gold(gold_id: str):
-    result = await db.gold.delete_one({"id": gold_id})
-    if result.deleted_count == 0:
+    deleted = await db.gold.find_one_and_delete({"id": gold_id}, {"_id": 0})
+    if not deleted:
         raise HTTPException(status_code=404, detail="Gold not found")
+    await inc_summary(holding_delta("gold", before=deleted))
     return {"message": "Gold deleted successfully"}
 
 
 # ==================== MUTUAL FUND ROUTES ====================
 @api_router.get("/mutual-funds", response_model=List[MutualFund])
 async def get_mutual_funds():
-    funds = await db.mutual_funds.find({}, {"_id": 0}).to_list(1000)
-    return [deserialize_datetime(f) for f in funds]
+    funds = await db.mutual_funds.find({}, MODEL_CODECS[MutualFund].projection).to_list(1000)
+    return fast_list_response(MutualFund, funds)
 
 @api_router.post("/mutual-funds", response_model=MutualFund)
 async def create_mutual_fund(fund: MutualFundCreate):
@@ -807,35 +3304,153 @@ async def create_mutual_fund(fund: MutualFundCreate):
     if fund_dict.get('buy_date') is None:
         fund_dict['buy_date'] = datetime.now(timezone.utc)
     fund_obj = MutualFund(**fund_dict)
-    doc = serialize_datetime(fund_obj.model_dump())
+    doc = to_document(fund_obj)
     await db.mutual_funds.insert_one(doc)
+    await inc_summary(holding_delta("mutual_funds", after=doc))
+    await record_holding_price("mutual_funds", doc)
     return fund_obj
 
 @api_router.put("/mutual-funds/{fund_id}", response_model=MutualFund)
 async def update_mutual_fund(fund_id: str, fund_data: dict):
-    existing = await db.mutual_funds.find_one({"id": fund_id}, {"_id": 0})
-    if not existing:
+    updated = await update_priced_holding("mutual_funds", fund_id, fund_data)
+    if updated is None:
         raise HTTPException(status_code=404, detail="Mutual fund not found")
-    
-    fund_data['updated_at'] = datetime.now(timezone.utc).isoformat()
-    await db.mutual_funds.update_one({"id": fund_id}, {"$set": fund_data})
-    
-    updated = await db.mutual_funds.find_one({"id": fund_id}, {"_id": 0})
-    return deserialize_datetime(updated)
+    return MODEL_CODECS[MutualFund].decode(updated)
 
 @api_router.delete("/mutual-funds/{fund_id}")
 async def delete_mutual_fund(fund_id: str):
-    result = await db.mutual_funds.delete_one({"id": fund_id})
-    if result.deleted_count == 0:
+    deleted = await db.mutual_funds.find_one_and_delete({"id": fund_id}, {"_id": 0})
+    if not deleted:
         raise HTTPException(status_code=404, detail="Mutual fund not found")
+    await inc_summary(holding_delta("mutual_funds", before=deleted))
     return {"message": "Mutual fund deleted successfully"}
 
 
+# ==================== MARKET PRICE ROUTES ====================
+@api_router.get("/prices", response_model=List[MarketPrice])
+async def get_market_prices(asset_class: Optional[str] = None):
+    """Latest quote per product, optionally for one asset class"""
+    query = {}
+    if asset_class:
+        query["asset_class"] = price_asset_class(asset_class) or asset_class
+    prices = await db.market_prices.find(query, MODEL_CODECS[MarketPrice].projection).sort("id", ASCENDING).to_list(None)
+    return fast_list_response(MarketPrice, prices)
+
+@api_router.post("/prices/bulk")
+async def bulk_update_prices(request: Request, quoted_at: Optional[datetime] = Query(None)):
+    """Apply a quote sheet: a JSON array or CSV with asset_class, symbol, price and optional quoted_at.
+    
+    Every stock (by ticker), gold holding (by type) and mutual fund (by product name) with a quote is
+    revalued. Rows without quoted_at take the `quoted_at` parameter, or the time of the request.
+    """
+    rows = await read_rows(request, "quotes")
+    sheet_time = to_utc(quoted_at) if quoted_at else datetime.now(timezone.utc)
+    
+    errors = []
+    quotes = []
+    for index, row in enumerate(rows):
+        try:
+            quote = MarketQuote.model_validate(row)
+        except ValidationError as e:
+            errors.append({"row": index, "errors": [
+                {"field": ".".join(str(loc) for loc in err["loc"]), "message": err["msg"]} for err in e.errors()
+            ]})
+            continue
+        asset_class = price_asset_class(quote.asset_class)
+        if asset_class is None:
+            errors.append({"row": index, "errors": [
+                {"field": "asset_class", "message": f"Must be one of: {', '.join(PRICED_HOLDINGS)}"}
+            ]})
+            continue
+        quote.asset_class = asset_class
+        quote.quoted_at = to_utc(quote.quoted_at) if quote.quoted_at else sheet_time
+        quotes.append(quote)
+    
+    result = await apply_market_quotes(quotes)
+    return {"received": len(rows), "accepted": len(quotes), "errors": errors, **result}
+
+@api_router.get("/prices/history")
+async def get_price_history(
+    asset_class: str,
+    symbol: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    interval: str = Query("auto", description="auto, raw, day, week or month")
+):
+    """Price history of one product: OHLC candles (the finest that fit in 500 by default) or raw points"""
+    collection = price_asset_class(asset_class)
+    if collection is None:
+        raise HTTPException(status_code=400, detail=f"asset_class must be one of: {', '.join(PRICED_HOLDINGS)}")
+    if interval not in ("auto", "raw", *PRICE_HISTORY_INTERVALS):
+        raise HTTPException(status_code=400, detail=f"interval must be auto, raw or one of: {', '.join(PRICE_HISTORY_INTERVALS)}")
+    end = to_utc(end) if end else datetime.now(timezone.utc)
+    start = to_utc(start) if start else end - timedelta(days=PRICE_HISTORY_DEFAULT_DAYS)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if interval == "auto":
+        interval = history_interval(start, end)
+    
+    match = {"meta.asset_class": collection, "meta.symbol": price_symbol(symbol), "quoted_at": {"$gte": start, "$lte": end}}
+    if interval == "raw":
+        docs = await db.price_history.find(match, {"_id": 0, "quoted_at": 1, "price": 1}).sort(
+            "quoted_at", ASCENDING
+        ).limit(PRICE_HISTORY_RAW_LIMIT).to_list(None)
+        points = [{"t": doc["quoted_at"], "price": doc["price"]} for doc in docs]
+    else:
+        candles = await db.price_history.aggregate(ohlc_pipeline(match, interval)).to_list(None)
+        points = [{"t": candle.pop("_id"), **candle} for candle in candles]
+    
+    return {
+        "asset_class": collection,
+        "symbol": price_symbol(symbol),
+        "interval": interval,
+        "start": start,
+        "end": end,
+        "points": points
+    }
+
+
 # ==================== DEBT ROUTES ====================
 @api_router.get("/debts", response_model=List[Debt])
 async def get_debts():
-    debts = await db.debts.find({}, {"_id": 0}).to_list(1000)
-    return [deserialize_datetime(d) for d in debts]
+    debts = await db.debts.find({}, MODEL_CODECS[Debt].projection).to_list(1000)
+    return fast_list_response(Debt, debts)
+
+@api_router.post("/debts/simulate")
+async def simulate_debt_payoff(request: DebtSimulationRequest):
+    """Compare payoff strategies for the active debts, month by month"""
+    unknown = [strategy for strategy in request.strategies if strategy not in DEBT_STRATEGIES]
+    if unknown or not request.strategies:
+        raise HTTPException(status_code=400, detail=f"strategies must be from: {', '.join(DEBT_STRATEGIES)}")
+    
+    query = {"is_active": True, "current_balance": {"$gt": 0}}
+    if request.debt_ids is not None:
+        query["id"] = {"$in": request.debt_ids}
+    projection = {"_id": 0, "id": 1, "creditor": 1, "current_balance": 1, "interest_rate": 1, "monthly_payment": 1}
+    debts = await db.debts.find(query, projection).sort("id", ASCENDING).to_list(1000)
+    
+    index = {debt["id"]: i for i, debt in enumerate(debts)}
+    missing = [debt_id for debt_id in request.custom_order if debt_id not in index]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"custom_order has unknown or inactive debts: {', '.join(missing)}")
+    if not debts:
+        return {"debts": 0, "monthly_budget": 0, "extra_payment": request.extra_payment, "strategies": []}
+    
+    balances = np.array([debt["current_balance"] for debt in debts], dtype=float)
+    rates = np.array([debt.get("interest_rate") or 0 for debt in debts], dtype=float)
+    minimums = np.array([debt.get("monthly_payment") or 0 for debt in debts], dtype=float)
+    custom_order = list(dict.fromkeys(index[debt_id] for debt_id in request.custom_order))
+    orders = np.array([debt_priority(strategy, balances, rates, custom_order) for strategy in request.strategies])
+    monthly_budget = float(minimums.sum()) + request.extra_payment
+    budgets = [np.nan if strategy == "minimum" else monthly_budget for strategy in request.strategies]
+    
+    schedule = simulate_debts(balances, rates, minimums, orders, budgets, request.months)
+    return {
+        "debts": len(debts),
+        "monthly_budget": monthly_budget,
+        "extra_payment": request.extra_payment,
+        "strategies": summarize_debt_simulation(debts, request.strategies, schedule, datetime.now(timezone.utc))
+    }
 
 @api_router.post("/debts", response_model=Debt)
 async def create_debt(debt: DebtCreate):
@@ -843,27 +3458,126 @@ async def create_debt(debt: DebtCreate):
     if debt_dict.get('start_date') is None:
         debt_dict['start_date'] = datetime.now(timezone.utc)
     debt_obj = Debt(**debt_dict)
-    doc = serialize_datetime(debt_obj.model_dump())
+    doc = to_document(debt_obj)
     await db.debts.insert_one(doc)
+    await inc_summary(holding_delta("debts", after=doc))
     return debt_obj
 
 @api_router.put("/debts/{debt_id}", response_model=Debt)
 async def update_debt(debt_id: str, debt_data: dict):
-    existing = await db.debts.find_one({"id": debt_id}, {"_id": 0})
+    coerce_datetimes(debt_data)
+    debt_data.pop('charge_account', None)
+    debt_data['updated_at'] = datetime.now(timezone.utc)
+    query = {"id": debt_id}
+    locked = {field: debt_data[field] for field in CHARGE_DEBT_FIELDS if field in debt_data}
+    if locked:
+        # Auto-created debts keep their creditor; only the stored value may be resent
+        query["$or"] = [{"charge_account": {"$exists": False}}, locked]
+    update = {"$set": debt_data}
+    if debt_data.get("is_active") is False:
+        # A closed debt releases its charge account, so the next charge opens a fresh debt
+        update["$unset"] = {"charge_account": ""}
+    existing = await db.debts.find_one_and_update(
+        query,
+        update,
+        {"_id": 0},
+        return_document=ReturnDocument.BEFORE
+    )
     if not existing:
+        if locked and await db.debts.find_one({"id": debt_id}, {"_id": 1}):
+            raise HTTPException(status_code=400, detail="The creditor of an auto-created debt cannot be changed")
         raise HTTPException(status_code=404, detail="Debt not found")
     
-    debt_data['updated_at'] = datetime.now(timezone.utc).isoformat()
-    await db.debts.update_one({"id": debt_id}, {"$set": debt_data})
-    
-    updated = await db.debts.find_one({"id": debt_id}, {"_id": 0})
-    return deserialize_datetime(updated)
+    updated = {**existing, **debt_data}
+    updated.pop("_id", None)
+    if "$unset" in update:
+        updated.pop("charge_account", None)
+    await inc_summary(holding_delta("debts", existing, updated))
+    return MODEL_CODECS[Debt].decode(updated)
+
+async def close_paid_debt(debt_id: str):
+    """Floor installments at zero and close the debt once its balance is paid off (safe to race)"""
+    await db.debts.update_one({"id": debt_id, "remaining_installments": {"$lt": 0}}, {"$set": {"remaining_installments": 0}})
+    closed = await db.debts.find_one_and_update(
+        {"id": debt_id, "is_active": True, "current_balance": {"$lt": DEBT_PAID_OFF}},
+        {
+            "$set": {"is_active": False, "current_balance": 0, "updated_at": datetime.now(timezone.utc)},
+            "$unset": {"charge_account": ""}
+        },
+        {"_id": 0},
+        return_document=ReturnDocument.BEFORE
+    )
+    if closed:
+        await inc_summary(holding_delta("debts", before=closed))
+
+@api_router.post("/debts/{debt_id}/payments", response_model=DebtPayment)
+async def pay_debt(debt_id: str, payment: DebtPaymentCreate):
+    """Pay down a debt from an account: one atomic $inc on the debt, plus its expense transaction"""
+    if payment.payment_method in DEBT_PAYMENT_METHODS:
+        raise HTTPException(status_code=400, detail=f"Debts cannot be paid by {payment.payment_method.value}")
+    
+    # The balance guard serializes concurrent payments: whichever would overpay fails instead
+    debt = await db.debts.find_one_and_update(
+        {"id": debt_id, "is_active": True, "current_balance": {"$gte": payment.amount - DEBT_PAID_OFF}},
+        {
+            "$inc": {"current_balance": -payment.amount, "remaining_installments": -payment.installments},
+            "$set": {"updated_at": datetime.now(timezone.utc)}
+        },
+        {"_id": 0, "creditor": 1, "current_balance": 1, "remaining_installments": 1},
+        return_document=ReturnDocument.BEFORE
+    )
+    if not debt:
+        existing = await db.debts.find_one({"id": debt_id}, {"_id": 0, "is_active": 1, "current_balance": 1})
+        if not existing:
+            raise HTTPException(status_code=404, detail="Debt not found")
+        if not existing.get("is_active", True):
+            raise HTTPException(status_code=400, detail="Debt is already paid off")
+        raise HTTPException(status_code=400, detail=f"Payment exceeds the outstanding balance of {existing['current_balance']:,.2f}")
+    
+    await inc_summary({"liabilities": -payment.amount})
+    balance_after = debt["current_balance"] - payment.amount
+    if balance_after < DEBT_PAID_OFF or debt["remaining_installments"] < payment.installments:
+        await close_paid_debt(debt_id)
+    
+    tx_obj = Transaction(
+        date=payment.date or datetime.now(timezone.utc),
+        description=f"Debt payment - {debt['creditor']}",
+        amount=payment.amount,
+        type=TransactionType.EXPENSE,
+        category=TransactionCategory.DEBT_PAYMENT,
+        account=payment.account,
+        payment_method=payment.payment_method,
+        notes=payment.notes
+    )
+    record = DebtPayment(
+        debt_id=debt_id,
+        creditor=debt["creditor"],
+        amount=payment.amount,
+        installments=payment.installments,
+        account=payment.account,
+        transaction_id=tx_obj.id,
+        balance_after=balance_after if balance_after >= DEBT_PAID_OFF else 0,
+        date=tx_obj.date,
+        notes=payment.notes
+    )
+    tx_doc = to_document(tx_obj)
+    await asyncio.gather(db.transactions.insert_one(tx_doc), db.debt_payments.insert_one(to_document(record)))
+    await inc_summary(transaction_delta(tx_doc))
+    await apply_balance_change(payment.account, -payment.amount)
+    return record
+
+@api_router.get("/debts/{debt_id}/payments", response_model=List[DebtPayment])
+async def get_debt_payments(debt_id: str):
+    """Payment history of a debt, newest first"""
+    payments = await db.debt_payments.find({"debt_id": debt_id}, MODEL_CODECS[DebtPayment].projection).sort("date", -1).to_list(1000)
+    return fast_list_response(DebtPayment, payments)
 
 @api_router.delete("/debts/{debt_id}")
 async def delete_debt(debt_id: str):
-    result = await db.debts.delete_one({"id": debt_id})
-    if result.deleted_count == 0:
+    deleted = await db.debts.find_one_and_delete({"id": debt_id}, {"_id": 0})
+    if not deleted:
         raise HTTPException(status_code=404, detail="Debt not found")
+    await inc_summary(holding_delta("debts", before=deleted))
     return {"message": "Debt deleted successfully"}
 
 
@@ -877,7 +3591,7 @@ async def get_bill_payments(bill_id: Optional[str] = None, month_year: Optional[
         query["month_year"] = month_year
     
     payments = await db.bill_payments.find(query, {"_id": 0}).to_list(1000)
-    return [deserialize_datetime(p) for p in payments]
+    return decode_documents(BillPayment, payments)
 
 @api_router.post("/bill-payments", response_model=BillPayment)
 async def mark_bill_paid(payment: BillPaymentCreate):
@@ -886,7 +3600,7 @@ async def mark_bill_paid(payment: BillPaymentCreate):
         payment_dict['payment_date'] = datetime.now(timezone.utc)
     
     payment_obj = BillPayment(**payment_dict)
-    doc = serialize_datetime(payment_obj.model_dump())
+    doc = to_document(payment_obj)
     await db.bill_payments.insert_one(doc)
     
     # Create transaction for this bill payment
@@ -901,8 +3615,9 @@ async def mark_bill_paid(payment: BillPaymentCreate):
         notes=f"Auto-created from bill payment: {payment.month_year}",
         date=payment_obj.payment_date
     )
-    tx_doc = serialize_datetime(tx.model_dump())
+    tx_doc = to_document(tx)
     await db.transactions.insert_one(tx_doc)
+    await inc_summary(transaction_delta(tx_doc))
     
     return payment_obj
 
@@ -910,13 +3625,13 @@ async def mark_bill_paid(payment: BillPaymentCreate):
 # ==================== FINANCIAL GOALS ROUTES ====================
 @api_router.get("/goals", response_model=List[FinancialGoal])
 async def get_goals():
-    goals = await db.financial_goals.find({}, {"_id": 0}).to_list(1000)
-    return [deserialize_datetime(g) for g in goals]
+    goals = await db.financial_goals.find({}, MODEL_CODECS[FinancialGoal].projection).to_list(1000)
+    return fast_list_response(FinancialGoal, goals)
 
 @api_router.post("/goals", response_model=FinancialGoal)
 async def create_goal(goal: FinancialGoalCreate):
     goal_obj = FinancialGoal(**goal.model_dump())
-    doc = serialize_datetime(goal_obj.model_dump())
+    doc = to_document(goal_obj)
     await db.financial_goals.insert_one(doc)
     return goal_obj
 
@@ -926,7 +3641,8 @@ async def update_goal(goal_id: str, goal_data: dict):
     if not existing:
         raise HTTPException(status_code=404, detail="Goal not found")
     
-    goal_data['updated_at'] = datetime.now(timezone.utc).isoformat()
+    coerce_datetimes(goal_data)
+    goal_data['updated_at'] = datetime.now(timezone.utc)
     
     # Check if goal is achieved
     if 'current_amount' in goal_data and 'target_amount' in existing:
@@ -936,7 +3652,7 @@ async def update_goal(goal_id: str, goal_data: dict):
     await db.financial_goals.update_one({"id": goal_id}, {"$set": goal_data})
     
     updated = await db.financial_goals.find_one({"id": goal_id}, {"_id": 0})
-    return deserialize_datetime(updated)
+    return MODEL_CODECS[FinancialGoal].decode(updated)
 
 @api_router.delete("/goals/{goal_id}")
 async def delete_goal(goal_id: str):
@@ -958,7 +3674,7 @@ async def add_goal_contribution(goal_id: str, contribution: GoalContributionCrea
         amount=contribution.amount,
         notes=contribution.notes
     )
-    contrib_doc = serialize_datetime(contrib.model_dump())
+    contrib_doc = to_document(contrib)
     await db.goal_contributions.insert_one(contrib_doc)
     
     # Update goal's current amount
@@ -970,56 +3686,39 @@ async def add_goal_contribution(goal_id: str, contribution: GoalContributionCrea
         {"$set": {
             "current_amount": new_amount,
             "is_achieved": is_achieved,
-            "updated_at": datetime.now(timezone.utc).isoformat()
+            "updated_at": datetime.now(timezone.utc)
         }}
     )
     
     updated_goal = await db.financial_goals.find_one({"id": goal_id}, {"_id": 0})
-    return deserialize_datetime(updated_goal)
+    return MODEL_CODECS[FinancialGoal].decode(updated_goal)
 
 @api_router.get("/goals/{goal_id}/contributions")
 async def get_goal_contributions(goal_id: str):
     """Get all contributions for a specific goal"""
     contributions = await db.goal_contributions.find({"goal_id": goal_id}, {"_id": 0}).sort("date", -1).to_list(1000)
-    return [deserialize_datetime(c) for c in contributions]
+    return decode_documents(GoalContribution, contributions)
 
 
 # ==================== BUDGET ROUTES ====================
 @api_router.get("/budgets")
-async def get_budgets(month_year: Optional[str] = None):
-    """Get budgets, optionally filtered by month"""
+async def get_budgets(month_year: Optional[str] = None, months: Optional[str] = None):
+    """Get budgets, optionally filtered by month or a months range ("2025-01:2025-12" or "2025-01,2025-03")"""
     query = {}
     if month_year:
         query["month_year"] = month_year
+    elif months:
+        try:
+            query["month_year"] = {"$in": parse_months(months)}
+        except ValueError:
+            raise HTTPException(status_code=400, detail=(
+                f"Invalid months, expected YYYY-MM:YYYY-MM or a comma-separated list of at most {MAX_MONTHS_SPAN} months"
+            ))
     
     budgets = await db.budgets.find(query, {"_id": 0}).to_list(1000)
-    budgets = [deserialize_datetime(b) for b in budgets]
-    
-    # Calculate spent amount for each budget from transactions
-    for budget in budgets:
-        # Get transactions for this category in this month
-        month_start = f"{budget['month_year']}-01"
-        month_parts = budget['month_year'].split('-')
-        year = int(month_parts[0])
-        month = int(month_parts[1])
-        if month == 12:
-            next_month = f"{year + 1}-01-01"
-        else:
-            next_month = f"{year}-{str(month + 1).zfill(2)}-01"
-        
-        pipeline = [
-            {"$match": {
-                "category": budget['category'],
-                "type": "expense",
-                "date": {"$gte": month_start, "$lt": next_month}
-            }},
-            {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
-        ]
-        
-        result = await db.transactions.aggregate(pipeline).to_list(1)
-        budget['spent'] = result[0]['total'] if result else 0
+    budgets = decode_documents(Budget, budgets)
     
-    return budgets
+    return await attach_budget_spending(budgets)
 
 @api_router.post("/budgets", response_model=Budget)
 async def create_budget(budget: BudgetCreate):
@@ -1043,7 +3742,7 @@ async def create_budget(budget: BudgetCreate):
         )
     
     budget_obj = Budget(**budget_dict)
-    doc = serialize_datetime(budget_obj.model_dump())
+    doc = to_document(budget_obj)
     await db.budgets.insert_one(doc)
     return budget_obj
 
@@ -1054,11 +3753,12 @@ async def update_budget(budget_id: str, budget_data: dict):
     if not existing:
         raise HTTPException(status_code=404, detail="Budget not found")
     
-    budget_data['updated_at'] = datetime.now(timezone.utc).isoformat()
+    coerce_datetimes(budget_data)
+    budget_data['updated_at'] = datetime.now(timezone.utc)
     await db.budgets.update_one({"id": budget_id}, {"$set": budget_data})
     
     updated = await db.budgets.find_one({"id": budget_id}, {"_id": 0})
-    return deserialize_datetime(updated)
+    return MODEL_CODECS[Budget].decode(updated)
 
 @api_router.delete("/budgets/{budget_id}")
 async def delete_budget(budget_id: str):
@@ -1151,7 +3851,8 @@ async def add_detailed_investment(investment_type: str, data: dict):
         raise HTTPException(status_code=400, detail="Invalid investment type")
     
     data["id"] = str(uuid.uuid4())
-    data["created_at"] = datetime.now(timezone.utc).isoformat()
+    coerce_datetimes(data)
+    data["created_at"] = datetime.now(timezone.utc)
     
     collection = db[collection_map[investment_type]]
     await collection.insert_one(data)
@@ -1171,7 +3872,8 @@ async def update_detailed_investment(investment_type: str, item_id: str, data: d
     if investment_type not in collection_map:
         raise HTTPException(status_code=400, detail="Invalid investment type")
     
-    data["updated_at"] = datetime.now(timezone.utc).isoformat()
+    coerce_datetimes(data)
+    data["updated_at"] = datetime.now(timezone.utc)
     data.pop("id", None)
     data.pop("_id", None)
     
@@ -1209,76 +3911,29 @@ async def delete_detailed_investment(investment_type: str, item_id: str):
 @api_router.get("/recurring-bills")
 async def get_recurring_bills():
     """Get all recurring bills (unified: income & expense) - also include legacy bills"""
-    items = await db.recurring_bills.find({}, {"_id": 0}).to_list(1000)
-    
-    # Normalize recurring_bills items to ensure all required fields exist
-    normalized_items = []
-    for item in items:
-        normalized = {
-            "id": item.get('id', str(uuid.uuid4())),
-            "name": item.get('name', 'Unnamed'),
-            "amount": float(item.get('amount', 0)),
-            "type": item.get('type', 'expense'),
-            "category": item.get('category', 'Bills'),
-            "account": item.get('account', 'Cash'),
-            "frequency": item.get('frequency', 'monthly'),
-            "day_of_month": int(item.get('day_of_month', 1)),
-            "due_date": item.get('due_date'),
-            "is_active": item.get('is_active', True) if item.get('is_active') is not None else True,
-            "notes": item.get('notes'),
-            "created_at": item.get('created_at')
-        }
-        normalized_items.append(normalized)
+    if RECURRING_BILLS_MIGRATION["done"]:
+        items = await db.recurring_bills.find({}, {"_id": 0, **{f: 1 for f in RECURRING_BILL_FIELDS}}).to_list(1000)
+        return decode_documents(RecurringTransaction, items)
     
-    # Also get legacy bills and convert them
-    legacy_bills = await db.bills.find({}, {"_id": 0}).to_list(1000)
-    for bill in legacy_bills:
-        # Convert legacy bill format to new format with proper defaults
-        try:
-            day_of_month = int(bill.get('due_date', '1')) if bill.get('due_date') else 1
-        except (ValueError, TypeError):
-            day_of_month = 1
-            
-        converted = {
-            "id": bill.get('id', str(uuid.uuid4())),
-            "name": bill.get('name', 'Unnamed'),
-            "amount": float(bill.get('amount', 0)),
-            "type": "expense",  # Legacy bills are all expenses
-            "category": bill.get('category', 'Bills'),
-            "account": bill.get('account', 'Cash'),
-            "frequency": bill.get('period', 'monthly').lower() if bill.get('period') else 'monthly',
-            "day_of_month": day_of_month,
-            "due_date": None,
-            "is_active": bill.get('is_active', True) if bill.get('is_active') is not None else True,
-            "notes": bill.get('notes'),
-            "created_at": bill.get('created_at')
-        }
-        # Only add if not already in recurring_bills
-        if not any(i.get('id') == converted['id'] for i in normalized_items):
-            normalized_items.append(converted)
+    # Until the migration finishes, normalize on read and merge legacy bills by id
+    items = [normalize_recurring_bill(item) for item in await db.recurring_bills.find({}).to_list(1000)]
+    seen = {item['id'] for item in items}
+    for bill in await db.bills.find({}).to_list(1000):
+        converted = convert_legacy_bill(bill)
+        if converted['id'] not in seen:
+            seen.add(converted['id'])
+            items.append(converted)
     
-    return [deserialize_datetime(i) for i in normalized_items]
+    return decode_documents(RecurringTransaction, items)
 
 @api_router.post("/recurring-bills")
 async def create_recurring_bill(data: RecurringTransactionCreate):
     """Create a new recurring bill"""
+    check_frequency(data.frequency)
     item = RecurringTransaction(**data.model_dump())
+    item.next_due = scheduled_due(item.frequency, item.day_of_month, datetime.now(timezone.utc))
     
-    # Calculate next due date
-    today = datetime.now(timezone.utc)
-    if item.frequency == "Monthly":
-        try:
-            next_due = today.replace(day=item.day_of_month)
-            if next_due <= today:
-                if today.month == 12:
-                    next_due = next_due.replace(year=today.year + 1, month=1)
-                else:
-                    next_due = next_due.replace(month=today.month + 1)
-            item.next_due = next_due
-        except:
-            pass
-    
-    doc = serialize_datetime(item.model_dump())
+    doc = to_document(item)
     await db.recurring_bills.insert_one(doc)
     return item
 
@@ -1287,6 +3942,30 @@ async def update_recurring_bill(item_id: str, data: dict):
     """Update a recurring bill"""
     data.pop("id", None)
     data.pop("_id", None)
+    coerce_datetimes(data)
+    if "frequency" in data:
+        check_frequency(data["frequency"])
+    if isinstance(data.get("next_due"), str):
+        try:
+            data["next_due"] = parse_datetime(data["next_due"])
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid datetime for next_due: {data['next_due']!r}")
+    
+    # Rescheduling or reactivating moves next_due to the next occurrence from now, unless the
+    # caller set it explicitly, so periods spent paused are never generated
+    if ("frequency" in data or "day_of_month" in data or data.get("is_active") is True) and "next_due" not in data:
+        existing = await db.recurring_bills.find_one(
+            {"id": item_id}, {"_id": 0, "frequency": 1, "day_of_month": 1, "is_active": 1}
+        )
+        if not existing:
+            raise HTTPException(status_code=404, detail="Item not found")
+        reactivated = data.get("is_active") is True and existing.get("is_active") is False
+        if "frequency" in data or "day_of_month" in data or reactivated:
+            data["next_due"] = scheduled_due(
+                data.get("frequency", existing.get("frequency")),
+                data.get("day_of_month", existing.get("day_of_month")),
+                datetime.now(timezone.utc)
+            )
     
     result = await db.recurring_bills.update_one(
         {"id": item_id},
@@ -1300,11 +3979,12 @@ async def update_recurring_bill(item_id: str, data: dict):
 
 @api_router.delete("/recurring-bills/{item_id}")
 async def delete_recurring_bill(item_id: str):
-    """Delete a recurring bill"""
+    """Delete a recurring bill; its payment history is kept, only unsettled claims are dropped"""
     result = await db.recurring_bills.delete_one({"id": item_id})
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Item not found")
+    await db.recurring_payments.delete_many({"recurring_id": item_id, "status": "pending"})
     
     return {"message": "Deleted successfully"}
 
@@ -1316,99 +3996,127 @@ async def pay_recurring_bill(item_id: str, data: dict):
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
     
-    month_year = data.get('month_year', datetime.now(timezone.utc).strftime('%Y-%m'))
+    if not item.get('account'):
+        raise HTTPException(status_code=400, detail="Set an account on this item before paying it")
     
-    # Check if already paid
-    existing = await db.recurring_payments.find_one({
-        "recurring_id": item_id,
-        "month_year": month_year
-    }, {"_id": 0})
+    now = datetime.now(timezone.utc)
+    month_year = data.get('month_year', now.strftime('%Y-%m'))
+    tx = await recurring_transaction(item, f"Auto-paid recurring: {item['name']}")
     
-    if existing:
+    # Claim the period first; money only moves for the request whose claim wins
+    claim = recurring_claim(item, tx, month_year, now)
+    try:
+        await db.recurring_payments.insert_one(claim)
+    except DuplicateKeyError:
         raise HTTPException(status_code=400, detail="Already paid for this month")
-    
-    # Create transaction
-    tx = Transaction(
-        description=item['name'],
-        amount=item['amount'],
-        type=TransactionType(item['type']),
-        category=item['category'],
-        account=item['account'],
-        notes=f"Auto-paid recurring: {item['name']}"
-    )
-    
-    tx_doc = serialize_datetime(tx.model_dump())
-    await db.transactions.insert_one(tx_doc)
-    
-    # Update account balance
-    amount = tx.amount if tx.type == TransactionType.INCOME else -tx.amount
-    await db.accounts.update_one(
-        {"name": tx.account},
-        {"$inc": {"balance": amount}}
-    )
-    
-    # Record payment
-    payment = {
-        "id": str(uuid.uuid4()),
-        "recurring_id": item_id,
-        "transaction_id": tx.id,
-        "amount": item['amount'],
-        "month_year": month_year,
-        "paid_at": datetime.now(timezone.utc).isoformat()
-    }
-    await db.recurring_payments.insert_one(payment)
+    await settle_recurring_payments([claim])
     
     return {"message": "Paid successfully", "transaction_id": tx.id}
 
 @api_router.get("/recurring-payments")
 async def get_recurring_payments(month_year: Optional[str] = None):
-    """Get payment records for recurring bills"""
-    query = {}
+    """Get payment records for recurring bills (daily/weekly records are keyed by day within the month)"""
+    query = {"status": {"$ne": "pending"}}
     if month_year:
-        query["month_year"] = month_year
+        query["month_year"] = {"$regex": f"^{re.escape(month_year)}"}
     
-    payments = await db.recurring_payments.find(query, {"_id": 0}).to_list(1000)
+    payments = await db.recurring_payments.find(query, {"_id": 0, "transaction": 0}).to_list(1000)
     return payments
 
 
 # ==================== SMART CATEGORIZATION ROUTES ====================
 @api_router.post("/smart-categorize")
-async def smart_categorize(description: str):
-    """Suggest category based on description keywords"""
-    description_lower = description.lower()
-    
-    for category, keywords in CATEGORY_KEYWORDS.items():
-        for keyword in keywords:
-            if keyword in description_lower:
-                return {"suggested_category": category, "confidence": "high"}
-    
-    return {"suggested_category": "Other Expense", "confidence": "low"}
+async def smart_categorize(description: str, type: Optional[TransactionType] = None):
+    """Suggest a category from the ledger-trained model and the keyword table"""
+    await refresh_category_model()
+    return suggest_category(description, type)
+
+@api_router.post("/smart-categorize/batch")
+async def smart_categorize_batch(batch: SmartCategorizeBatch):
+    """Suggest categories for many descriptions at once, in request order"""
+    await refresh_category_model()
+    return {"results": suggest_categories([(description, batch.type) for description in batch.descriptions])}
+
+
+# ==================== CATEGORIZATION RULE ROUTES ====================
+@api_router.get("/categorization-rules", response_model=List[CategorizationRule])
+async def get_categorization_rules():
+    """Get all categorization rules in the order they are tried"""
+    rules = await db.categorization_rules.find({}, MODEL_CODECS[CategorizationRule].projection).sort(
+        [("priority", ASCENDING), ("created_at", ASCENDING)]
+    ).to_list(1000)
+    return fast_list_response(CategorizationRule, rules)
+
+@api_router.post("/categorization-rules", response_model=CategorizationRule)
+async def create_categorization_rule(rule: CategorizationRuleCreate):
+    """Create a rule; it applies to transactions created or imported from now on"""
+    rule_obj = CategorizationRule(**rule.model_dump())
+    validate_rule(rule_obj)
+    await db.categorization_rules.insert_one(to_document(rule_obj))
+    await load_categorization_rules()
+    return rule_obj
+
+@api_router.put("/categorization-rules/{rule_id}", response_model=CategorizationRule)
+async def update_categorization_rule(rule_id: str, rule_data: dict):
+    """Update a categorization rule"""
+    existing = await db.categorization_rules.find_one({"id": rule_id}, {"_id": 0})
+    if not existing:
+        raise HTTPException(status_code=404, detail="Rule not found")
+    
+    rule_data.pop('id', None)
+    try:
+        rule_obj = CategorizationRule(**{**existing, **rule_data, "updated_at": datetime.now(timezone.utc)})
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    validate_rule(rule_obj)
+    await db.categorization_rules.replace_one({"id": rule_id}, to_document(rule_obj))
+    await load_categorization_rules()
+    return rule_obj
+
+@api_router.delete("/categorization-rules/{rule_id}")
+async def delete_categorization_rule(rule_id: str):
+    """Delete a categorization rule (transactions it already classified keep their category)"""
+    result = await db.categorization_rules.delete_one({"id": rule_id})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Rule not found")
+    await load_categorization_rules()
+    return {"message": "Rule deleted successfully"}
+
+@api_router.post("/categorization-rules/{rule_id}/apply")
+async def apply_categorization_rule(rule_id: str):
+    """Apply a rule to every existing transaction it matches"""
+    doc = await db.categorization_rules.find_one({"id": rule_id}, {"_id": 0})
+    if not doc:
+        raise HTTPException(status_code=404, detail="Rule not found")
+    return await apply_rule_retroactively(CategorizationRule(**doc))
 
 
 # ==================== NOTIFICATIONS/ALERTS ROUTES ====================
 @api_router.get("/alerts")
 async def get_alerts():
     """Get budget alerts and goal milestones"""
-    alerts = []
+    started = time.perf_counter()
+    budget_alerts, goal_alerts, bill_alerts = await asyncio.gather(
+        get_budget_alerts(),
+        get_goal_alerts(),
+        get_bill_alerts()
+    )
+    
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if elapsed_ms > ALERTS_LATENCY_BUDGET_MS:
+        logger.warning(f"GET /alerts took {elapsed_ms:.1f}ms (budget {ALERTS_LATENCY_BUDGET_MS:.0f}ms)")
     
-    # Check budget alerts
+    return budget_alerts + goal_alerts + bill_alerts
+
+async def get_budget_alerts():
+    """Budget alerts for the current month, from a single spending aggregation"""
+    alerts = []
     current_month = datetime.now(timezone.utc).strftime('%Y-%m')
     budgets = await db.budgets.find({"month_year": current_month}, {"_id": 0}).to_list(1000)
+    budgets = await attach_budget_spending(budgets)
     
     for budget in budgets:
-        # Calculate spent from transactions
-        month_start = f"{current_month}-01"
-        pipeline = [
-            {"$match": {
-                "category": budget['category'],
-                "type": "expense",
-                "date": {"$gte": month_start}
-            }},
-            {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
-        ]
-        result = await db.transactions.aggregate(pipeline).to_list(1)
-        spent = result[0]['total'] if result else 0
-        
+        spent = budget['spent']
         percentage = (spent / budget['amount'] * 100) if budget['amount'] > 0 else 0
         
         if percentage >= 100:
@@ -1431,14 +4139,24 @@ async def get_alerts():
                 "spent": spent,
                 "budget": budget['amount']
             })
-    
-    # Check goal milestones
-    goals = await db.financial_goals.find({"is_achieved": False}, {"_id": 0}).to_list(1000)
+    return alerts
+
+async def get_goal_alerts():
+    """Goal milestone alerts, only fetching goals in the 50-100% progress band"""
+    alerts = []
+    goals = await db.financial_goals.find({
+        "is_achieved": False,
+        "target_amount": {"$gt": 0},
+        "$expr": {"$and": [
+            {"$gte": ["$current_amount", {"$multiply": ["$target_amount", 0.5]}]},
+            {"$lt": ["$current_amount", "$target_amount"]}
+        ]}
+    }, {"_id": 0, "name": 1, "current_amount": 1, "target_amount": 1}).to_list(1000)
     
     for goal in goals:
-        progress = (goal['current_amount'] / goal['target_amount'] * 100) if goal['target_amount'] > 0 else 0
+        progress = goal['current_amount'] / goal['target_amount'] * 100
         
-        if progress >= 90 and progress < 100:
+        if progress >= 90:
             alerts.append({
                 "type": "goal_almost",
                 "severity": "low",
@@ -1447,7 +4165,7 @@ async def get_alerts():
                 "goal_name": goal['name'],
                 "progress": progress
             })
-        elif progress >= 50:
+        else:
             milestones = [50, 75]
             for milestone in milestones:
                 if progress >= milestone and progress < milestone + 10:
@@ -1459,155 +4177,151 @@ async def get_alerts():
                         "goal_name": goal['name'],
                         "progress": progress
                     })
-    
-    # Check bills due soon
-    today = datetime.now(timezone.utc).day
-    bills = await db.bills.find({}, {"_id": 0}).to_list(1000)
+    return alerts
+
+async def get_bill_alerts():
+    """Alerts for bills due in the next 3 days, looked up by due day"""
+    alerts = []
+    now = datetime.now(timezone.utc)
+    due_days = {(now + timedelta(days=days_until_due)).day: days_until_due for days_until_due in range(1, 4)}
+    
+    if RECURRING_BILLS_MIGRATION["done"]:
+        bills = await db.recurring_bills.find(
+            {"is_active": True, "day_of_month": {"$in": list(due_days)}, "type": "expense"},
+            {"_id": 0, "name": 1, "amount": 1, "day_of_month": 1}
+        ).to_list(1000)
+    else:
+        # Legacy bills keep the due day as a (possibly zero-padded) string
+        legacy_days = [str(day) for day in due_days] + [str(day).zfill(2) for day in due_days]
+        bills = await db.bills.find(
+            {"due_date": {"$in": legacy_days}},
+            {"_id": 0, "name": 1, "amount": 1, "due_date": 1}
+        ).to_list(1000)
+        for bill in bills:
+            bill['day_of_month'] = int(bill.pop('due_date'))
     
     for bill in bills:
-        due_day = int(bill.get('due_date', '01'))
-        days_until_due = due_day - today
-        
-        if 0 < days_until_due <= 3:
-            alerts.append({
-                "type": "bill_due_soon",
-                "severity": "medium",
-                "title": f"Tagihan Jatuh Tempo",
-                "message": f"Tagihan '{bill['name']}' jatuh tempo dalam {days_until_due} hari",
-                "bill_name": bill['name'],
-                "amount": bill['amount']
-            })
-    
+        days_until_due = due_days[bill['day_of_month']]
+        alerts.append({
+            "type": "bill_due_soon",
+            "severity": "medium",
+            "title": f"Tagihan Jatuh Tempo",
+            "message": f"Tagihan '{bill['name']}' jatuh tempo dalam {days_until_due} hari",
+            "bill_name": bill['name'],
+            "amount": bill['amount']
+        })
     return alerts
 
 
-
 @api_router.get("/dashboard")
-async def get_dashboard_data():
+async def get_dashboard_data(response: Response = None):
     """Get comprehensive dashboard data with accounting equation"""
+    timings = {}
+    summary, deposit_interest, accounts, recent_transactions, bills, goals = await asyncio.gather(
+        timed_section(timings, "summary", get_dashboard_summary()),
+        timed_section(timings, "deposit_interest", deposit_accrued_interest()),
+        timed_section(timings, "accounts", db.accounts.find({}, {"_id": 0}).to_list(1000)),
+        timed_section(timings, "recent_transactions", db.transactions.find({}, {"_id": 0}).sort("date", -1).limit(10).to_list(10)),
+        timed_section(timings, "recurring_bills", db.recurring_bills.find({}, {"_id": 0}).to_list(1000)),
+        timed_section(timings, "goals", db.financial_goals.find({}, {"_id": 0}).to_list(1000))
+    )
+    totals = summary_totals(summary, deposit_interest)
     
-    # ASSETS - Liquid Assets (Cash & Bank Accounts)
-    accounts = await db.accounts.find({}, {"_id": 0}).to_list(1000)
-    accounts = [deserialize_datetime(acc) for acc in accounts]
-    liquid_assets = sum(acc['balance'] for acc in accounts)
-    
-    # ASSETS - Investments (breakdown)
-    stocks = await db.stocks.find({}, {"_id": 0}).to_list(1000)
-    deposits = await db.deposits.find({}, {"_id": 0}).to_list(1000)
-    gold_items = await db.gold.find({}, {"_id": 0}).to_list(1000)
-    mutual_funds = await db.mutual_funds.find({}, {"_id": 0}).to_list(1000)
-    
-    total_stocks = sum(s['lots'] * s['current_price'] * 100 for s in stocks)
-    total_deposits = sum(d['amount'] for d in deposits)
-    total_gold = sum(g['weight_grams'] * g['current_price_per_gram'] for g in gold_items)
-    total_mutual_funds = sum(mf['units'] * mf['current_nav'] for mf in mutual_funds)
-    
-    total_investments = total_stocks + total_deposits + total_gold + total_mutual_funds
-    
-    # TOTAL ASSETS
-    total_assets = liquid_assets + total_investments
-    
-    # LIABILITIES - Debts
-    debts = await db.debts.find({"is_active": True}, {"_id": 0}).to_list(1000)
-    total_liabilities = sum(d['current_balance'] for d in debts)
-    
-    # EQUITY (NET WORTH) = ASSETS - LIABILITIES
-    net_worth = total_assets - total_liabilities
-    
-    # Transactions stats
-    transactions = await db.transactions.find({}, {"_id": 0}).to_list(10000)
-    total_income = sum(tx['amount'] for tx in transactions if tx['type'] == 'income')
-    total_expense = sum(tx['amount'] for tx in transactions if tx['type'] == 'expense')
-    
-    # Recent transactions
-    recent_transactions = await db.transactions.find({}, {"_id": 0}).sort("date", -1).limit(10).to_list(10)
-    recent_transactions = [deserialize_datetime(tx) for tx in recent_transactions]
-    
-    # Recurring bills
-    bills = await db.recurring_bills.find({}, {"_id": 0}).to_list(1000)
+    accounts = decode_documents(Account, accounts)
+    recent_transactions = decode_documents(Transaction, recent_transactions)
+    goals = decode_documents(FinancialGoal, goals)
     
-    # Financial goals
-    goals = await db.financial_goals.find({}, {"_id": 0}).to_list(1000)
-    goals = [deserialize_datetime(g) for g in goals]
+    if response is not None:
+        response.headers["Server-Timing"] = ", ".join(f"{name};dur={ms:.1f}" for name, ms in timings.items())
     
     return {
-        # Accounting Equation
-        "total_assets": total_assets,
-        "total_liabilities": total_liabilities,
-        "net_worth": net_worth,  # This is EQUITY
+        # Accounting Equation (ASSETS - LIABILITIES = EQUITY)
+        "total_assets": totals['total_assets'],
+        "total_liabilities": totals['total_liabilities'],
+        "net_worth": totals['net_worth'],  # This is EQUITY
         
         # Assets Breakdown
-        "liquid_assets": liquid_assets,
-        "total_investments": total_investments,
-        "investments_breakdown": {
-            "stocks": total_stocks,
-            "deposits": total_deposits,
-            "gold": total_gold,
-            "mutual_funds": total_mutual_funds
-        },
+        "liquid_assets": totals['liquid_assets'],
+        "total_investments": totals['total_investments'],
+        "investments_breakdown": totals['investments_breakdown'],
         
         # Legacy fields (for backward compatibility)
-        "cash_balance": liquid_assets,
-        "total_income": total_income,
-        "total_expense": total_expense,
-        "total_transactions": len(transactions),
+        "cash_balance": totals['liquid_assets'],
+        "total_income": totals['total_income'],
+        "total_expense": totals['total_expense'],
+        "total_transactions": summary['counts']['transactions'],
         
         # Details
         "accounts": accounts,
         "recent_transactions": recent_transactions,
         "recurring_bills": bills,
-        "active_debts": len(debts),
-        "total_debt_amount": total_liabilities,
+        "active_debts": summary['counts']['active_debts'],
+        "total_debt_amount": totals['total_liabilities'],
         "financial_goals": goals,
         
         # Investment details count
-        "investment_items_count": {
-            "stocks": len(stocks),
-            "deposits": len(deposits),
-            "gold": len(gold_items),
-            "mutual_funds": len(mutual_funds)
-        }
+        "investment_items_count": {c: summary['counts'][c] for c in HOLDING_COLLECTIONS}
     }
 
+async def timed_section(timings: dict, name: str, awaitable):
+    """Await a dashboard section and record how long it took in milliseconds"""
+    started = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        timings[name] = (time.perf_counter() - started) * 1000
+
 
 # ==================== ANALYTICS ROUTES ====================
 @api_router.get("/analytics/monthly")
-async def get_monthly_analytics():
+async def get_monthly_analytics(
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    account: Optional[str] = None,
+    type: Optional[str] = None
+):
     """Get monthly breakdown of income and expenses"""
-    transactions = await db.transactions.find({}, {"_id": 0}).to_list(10000)
-    transactions = [deserialize_datetime(tx) for tx in transactions]
-    
-    monthly_data = {}
-    for tx in transactions:
-        month_key = tx['date'].strftime('%Y-%m')
-        if month_key not in monthly_data:
-            monthly_data[month_key] = {"income": 0, "expense": 0}
-        
-        if tx['type'] == 'income':
-            monthly_data[month_key]['income'] += tx['amount']
-        else:
-            monthly_data[month_key]['expense'] += tx['amount']
-    
-    return monthly_data
+    query = build_transaction_query(type=type, account=account, date_from=date_from, date_to=date_to)
+    pipeline = [
+        {"$match": query},
+        {"$group": {
+            "_id": MONTH_KEY_EXPR,
+            "income": {"$sum": {"$cond": [{"$eq": ["$type", "income"]}, "$amount", 0]}},
+            "expense": {"$sum": {"$cond": [{"$eq": ["$type", "income"]}, 0, "$amount"]}}
+        }},
+        {"$sort": {"_id": 1}}
+    ]
+    
+    results = await db.transactions.aggregate(pipeline).to_list(None)
+    return {r["_id"]: {"income": r["income"], "expense": r["expense"]} for r in results}
 
 @api_router.get("/analytics/category")
-async def get_category_analytics():
-    """Get spending breakdown by category"""
-    transactions = await db.transactions.find({}, {"_id": 0}).to_list(10000)
-    
-    category_data = {}
-    for tx in transactions:
-        cat = tx.get('category', 'Other')
-        if cat not in category_data:
-            category_data[cat] = 0
-        category_data[cat] += tx['amount']
-    
-    return category_data
+async def get_category_analytics(
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    account: Optional[str] = None,
+    type: Optional[str] = None
+):
+    """Get income and expense breakdown by category"""
+    query = build_transaction_query(type=type, account=account, date_from=date_from, date_to=date_to)
+    pipeline = [
+        {"$match": query},
+        {"$group": {
+            "_id": {"$ifNull": ["$category", "Other"]},
+            "income": {"$sum": {"$cond": [{"$eq": ["$type", "income"]}, "$amount", 0]}},
+            "expense": {"$sum": {"$cond": [{"$eq": ["$type", "income"]}, 0, "$amount"]}},
+            "count": {"$sum": 1}
+        }},
+        {"$sort": {"_id": 1}}
+    ]
+    
+    results = await db.transactions.aggregate(pipeline).to_list(None)
+    return {r["_id"]: {"income": r["income"], "expense": r["expense"], "count": r["count"]} for r in results}
 
 @api_router.get("/analytics/balance-sheet")
 async def get_balance_sheet():
     """Get complete balance sheet"""
-    dashboard = await get_dashboard_data()
+    dashboard = summary_totals(*await asyncio.gather(get_dashboard_summary(), deposit_accrued_interest()))
     
     return {
         "assets": {
@@ -1632,7 +4346,7 @@ async def get_balance_sheet():
 @api_router.get("/analytics/ratios")
 async def get_financial_ratios():
     """Get financial health ratios"""
-    dashboard = await get_dashboard_data()
+    dashboard = summary_totals(*await asyncio.gather(get_dashboard_summary(), deposit_accrued_interest()))
     
     # Debt-to-Asset Ratio
     debt_to_asset = (dashboard['total_liabilities'] / dashboard['total_assets'] * 100) if dashboard['total_assets'] > 0 else 0
@@ -1652,6 +4366,132 @@ async def get_financial_ratios():
     }
 
 
+# ==================== ADMIN ROUTES ====================
+@api_router.get("/admin/indexes")
+async def get_indexes_status():
+    """Report drift between the declared index catalog and MongoDB"""
+    return await get_index_drift()
+
+@api_router.post("/admin/dashboard-summary/rebuild")
+async def rebuild_dashboard_summary_route():
+    """Recompute the materialized dashboard summary from scratch"""
+    return await rebuild_dashboard_summary()
+
+@api_router.get("/admin/migrations/datetime")
+async def get_datetime_migration_status():
+    """Progress of the ISO-string to BSON date migration"""
+    state = await load_datetime_migration_state()
+    progress = (state or {}).get("progress", {})
+    return {
+        "done": DATETIME_MIGRATION["done"],
+        "running": DATETIME_MIGRATION["running"],
+        "collections": {name: {k: v for k, v in p.items() if k != "last_id"} for name, p in progress.items()},
+        "started_at": (state or {}).get("started_at"),
+        "completed_at": (state or {}).get("completed_at")
+    }
+
+@api_router.post("/admin/migrations/datetime")
+async def start_datetime_migration():
+    """Start (or resume) the datetime migration in the background"""
+    if not DATETIME_MIGRATION["done"] and not DATETIME_MIGRATION["running"]:
+        asyncio.create_task(migrate_datetime_fields())
+    return await get_datetime_migration_status()
+
+@api_router.post("/admin/category-model/rebuild")
+async def rebuild_category_model_route():
+    """Retrain the smart-categorize model from the whole ledger"""
+    return await train_category_model()
+
+@api_router.get("/admin/migrations/recurring-bills")
+async def get_recurring_bills_migration_status():
+    """Progress of the legacy bills to recurring_bills migration"""
+    state = await load_recurring_bills_migration_state()
+    progress = (state or {}).get("progress", {})
+    return {
+        "done": RECURRING_BILLS_MIGRATION["done"],
+        "running": RECURRING_BILLS_MIGRATION["running"],
+        "collections": {name: {k: v for k, v in p.items() if k != "last_id"} for name, p in progress.items()},
+        "started_at": (state or {}).get("started_at"),
+        "completed_at": (state or {}).get("completed_at")
+    }
+
+@api_router.post("/admin/migrations/recurring-bills")
+async def start_recurring_bills_migration():
+    """Start (or resume) the recurring bills migration in the background"""
+    if not RECURRING_BILLS_MIGRATION["done"] and not RECURRING_BILLS_MIGRATION["running"]:
+        asyncio.create_task(migrate_recurring_bills())
+    return await get_recurring_bills_migration_status()
+
+@api_router.post("/admin/recurring/run")
+async def run_recurring_now():
+    """Generate due recurring transactions now, if no other worker holds the scheduler lease"""
+    if not await acquire_scheduler_lease():
+        raise HTTPException(status_code=409, detail="Another worker is running the recurring scheduler")
+    await settle_stale_claims()
+    await backfill_next_due()
+    return {"generated": await generate_due_recurring()}
+
+@api_router.post("/admin/deposits/rollover")
+async def roll_over_deposits_now():
+    """Roll over matured auto-renewal deposits now, if no other worker holds the scheduler lease"""
+    if not await acquire_scheduler_lease():
+        raise HTTPException(status_code=409, detail="Another worker is running the scheduler")
+    return await roll_over_deposits()
+
+@api_router.post("/admin/indexes/ensure")
+async def ensure_indexes_route():
+    """Re-apply the declared index catalog"""
+    return await ensure_indexes()
+
+
+# ==================== RESPONSE COMPRESSION ====================
+class BrotliMiddleware:
+    """Brotli-compress complete responses for clients that accept `br`.
+    
+    Streamed responses pass through untouched (GZipMiddleware still handles them), as do
+    bodies below COMPRESSION_MINIMUM_SIZE or that are already encoded.
+    """
+    
+    def __init__(self, app, minimum_size: int = COMPRESSION_MINIMUM_SIZE, quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.quality = quality
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or brotli is None or "br" not in Headers(scope=scope).get("accept-encoding", ""):
+            await self.app(scope, receive, send)
+            return
+        
+        start_message = None
+        passthrough = False
+        
+        async def send_compressed(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+            elif message["type"] == "http.response.start":
+                start_message = message
+            elif message["type"] == "http.response.body":
+                headers = MutableHeaders(raw=start_message["headers"])
+                body = message.get("body", b"")
+                if message.get("more_body", False) or "content-encoding" in headers or len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                
+                compressed = brotli.compress(body, quality=self.quality)
+                headers["Content-Encoding"] = "br"
+                headers["Content-Length"] = str(len(compressed))
+                headers.add_vary_header("Accept-Encoding")
+                await send(start_message)
+                await send({"type": "http.response.body", "body": compressed})
+            else:
+                await send(message)
+        
+        await self.app(scope, receive, send_compressed)
+
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -1661,8 +4501,13 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Next-Cursor"],
 )
 
+# Brotli runs inside gzip; GZipMiddleware leaves responses that already have a Content-Encoding alone
+app.add_middleware(BrotliMiddleware)
+app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MINIMUM_SIZE)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -1670,6 +4515,48 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def startup_ensure_indexes():
+    await ensure_indexes()
+
+@app.on_event("startup")
+async def startup_dashboard_summary():
+    await get_dashboard_summary()
+
+@app.on_event("startup")
+async def startup_datetime_migration():
+    await load_datetime_migration_state()
+    if not DATETIME_MIGRATION["done"]:
+        asyncio.create_task(migrate_datetime_fields())
+
+@app.on_event("startup")
+async def startup_recurring_bills_migration():
+    await load_recurring_bills_migration_state()
+    if not RECURRING_BILLS_MIGRATION["done"]:
+        asyncio.create_task(migrate_recurring_bills())
+
+@app.on_event("startup")
+async def startup_recurring_scheduler():
+    if RECURRING_SCHEDULER:
+        app.state.recurring_scheduler = asyncio.create_task(run_recurring_scheduler())
+
+@app.on_event("startup")
+async def startup_category_model():
+    await load_category_model()
+    if not CATEGORY_MODEL.categories and await db.transactions.find_one({}, {"_id": 1}):
+        asyncio.create_task(train_category_model())
+
+@app.on_event("startup")
+async def startup_categorization_rules():
+    await load_categorization_rules()
+
+@app.on_event("shutdown")
+async def shutdown_recurring_scheduler():
+    task = getattr(app.state, "recurring_scheduler", None)
+    if task is not None:
+        task.cancel()
+        await release_scheduler_lease()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
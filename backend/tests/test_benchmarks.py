@@ -0,0 +1,342 @@
+"""
+In-process micro-benchmarks for hot backend helpers
+Run with: pytest backend/tests/test_benchmarks.py -v -s
+"""
+import os
+import sys
+import copy
+import json
+import time
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import List
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+# server.py reads these at import time; no database connection is made by these benchmarks
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'benchmark')
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import server  # noqa: E402
+
+ROWS = 10000
+
+
+def make_transaction_docs(native_dates: bool):
+    """Transaction documents as stored in MongoDB, with ISO-string or native dates"""
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    docs = []
+    for i in range(ROWS):
+        when = start + timedelta(hours=i)
+        docs.append({
+            "id": f"tx-{i}",
+            "date": when if native_dates else when.isoformat(),
+            "description": f"Transaction {i}",
+            "amount": float(i % 500) * 1000,
+            "type": "expense" if i % 3 else "income",
+            "category": "Food",
+            "sub_category": None,
+            "account": "Cash",
+            "payment_method": "Cash",
+            "status": "Completed",
+            "notes": None,
+            "tags": ["benchmark"],
+            "created_at": when if native_dates else when.isoformat(),
+            "updated_at": when if native_dates else when.isoformat()
+        })
+    return docs
+
+
+def walk_encode(obj):
+    """Baseline encoder: visits every value, normalizing datetimes to UTC"""
+    if isinstance(obj, dict):
+        return {k: walk_encode(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [walk_encode(item) for item in obj]
+    if isinstance(obj, datetime):
+        return server.to_utc(obj)
+    return obj
+
+
+def walk_decode(doc):
+    """Baseline decoder: parses every known datetime key that holds a string"""
+    for key in server.DATETIME_FIELDS:
+        if isinstance(doc.get(key), str):
+            try:
+                doc[key] = datetime.fromisoformat(doc[key])
+            except ValueError:
+                pass
+    return doc
+
+
+def docs_per_second(fn, docs):
+    """Throughput of fn over fresh copies of docs (copying is excluded from the timing)"""
+    batch = copy.deepcopy(docs)
+    started = time.perf_counter()
+    for doc in batch:
+        fn(doc)
+    return len(batch) / (time.perf_counter() - started)
+
+
+class TestCodecBenchmark:
+    """Compiled DocumentCodec vs walking every value of each document"""
+
+    def test_decode_throughput(self):
+        """Benchmark decoding documents read from MongoDB"""
+        codec = server.MODEL_CODECS[server.Transaction]
+        for native_dates in (False, True):
+            docs = make_transaction_docs(native_dates)
+            legacy = docs_per_second(walk_decode, docs)
+            compiled = docs_per_second(codec.decode, docs)
+            label = "native" if native_dates else "iso-string"
+            print(f"decode ({label}): walk {legacy:,.0f} docs/s, codec {compiled:,.0f} docs/s ({compiled / legacy:.1f}x)")
+            assert compiled > legacy * 0.8
+
+    def test_encode_throughput(self):
+        """Benchmark encoding model dumps for MongoDB"""
+        codec = server.MODEL_CODECS[server.Transaction]
+        docs = [
+            server.Transaction(description=f"Transaction {i}", amount=1000, type="expense", category="Food", account="Cash").model_dump()
+            for i in range(ROWS)
+        ]
+        legacy = docs_per_second(walk_encode, docs)
+        compiled = docs_per_second(codec.encode, docs)
+        print(f"encode: walk {legacy:,.0f} docs/s, codec {compiled:,.0f} docs/s ({compiled / legacy:.1f}x)")
+        assert compiled > legacy
+
+    def test_codec_matches_helpers(self):
+        """The codec must convert exactly what the baseline walk does for model fields"""
+        codec = server.MODEL_CODECS[server.Transaction]
+        doc = make_transaction_docs(native_dates=False)[0]
+        assert codec.decode(dict(doc)) == walk_decode(dict(doc))
+
+
+class TestSerializationBenchmark:
+    """response_model validation + stdlib JSON vs the fast orjson path for list endpoints"""
+
+    def test_list_serialization_throughput(self):
+        """Benchmark serializing a page of transactions to JSON bytes"""
+        orjson = pytest.importorskip("orjson")
+        docs = make_transaction_docs(native_dates=True)
+        adapter = TypeAdapter(List[server.Transaction])
+
+        # What FastAPI does for response_model=List[Transaction]: validate, dump, encode, json.dumps
+        started = time.perf_counter()
+        validated = adapter.validate_python(docs)
+        content = jsonable_encoder(adapter.dump_python(validated, mode="json"))
+        before_body = json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        before = len(docs) / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        after_body = server.fast_list_response(server.Transaction, docs).body
+        after = len(docs) / (time.perf_counter() - started)
+
+        print(f"list serialization: response_model {before:,.0f} rows/s, fast path {after:,.0f} rows/s ({after / before:.1f}x)")
+        assert len(orjson.loads(after_body)) == len(json.loads(before_body))
+        assert after > before
+
+
+
+def legacy_categorize(description: str):
+    """The nested keyword loop /smart-categorize used before KeywordMatcher"""
+    description_lower = description.lower()
+    for category, keywords in server.CATEGORY_KEYWORDS.items():
+        for keyword in keywords:
+            if keyword in description_lower:
+                return category
+    return "Other Expense"
+
+
+class TestCategorizeBenchmark:
+    """suggest_category (model + keywords, cached) vs the legacy keyword loop on a bank statement"""
+
+    @pytest.fixture
+    def trained_model(self, monkeypatch):
+        """A CATEGORY_MODEL trained on a small ledger, as in production once transactions exist"""
+        model = server.CategoryModel()
+        categories = ["Food", "Transport", "Bills", "Shopping", "Health", "Entertainment"]
+        for i in range(2000):
+            category = categories[i % len(categories)]
+            model.learn(server.category_features(server.normalize_description(f"{category} merchant {i % 97}")), category)
+        monkeypatch.setattr(server, "CATEGORY_MODEL", model)
+        server.match_category.cache_clear()
+        return model
+
+    def statement(self):
+        merchants = [
+            "TRF GOFOOD KOPI KENANGAN", "PEMBAYARAN PLN PASCABAYAR", "SHOPEEPAY TOPUP", "QRIS INDOMARET",
+            "NETFLIX.COM SUBSCRIPTION", "BIAYA ADMIN BULANAN", "GAJI PT MAJU BERSAMA", "TOKOPEDIA ORDER",
+        ] + [f"MERCHANT LOKAL {i} JAKARTA" for i in range(300)]
+        return [f"{merchants[i % len(merchants)]} {100000 + i}" for i in range(ROWS)]
+
+    def test_statement_categorize_throughput(self, trained_model):
+        """Benchmark categorizing a statement where merchants repeat with new reference numbers"""
+        descriptions = self.statement()
+
+        started = time.perf_counter()
+        for description in descriptions:
+            legacy_categorize(description)
+        legacy = len(descriptions) / (time.perf_counter() - started)
+
+        # What suggest_category did before suggestions were cached: a model prediction per row
+        started = time.perf_counter()
+        for description in descriptions:
+            normalized = server.normalize_description(description)
+            probabilities = trained_model.predict(server.category_features(normalized), server.EXPENSE_CATEGORIES)
+            server.build_suggestion(normalized, "expense", server.EXPENSE_CATEGORIES, probabilities)
+        uncached = len(descriptions) / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        for description in descriptions:
+            server.suggest_category(description, "expense")
+        compiled = len(descriptions) / (time.perf_counter() - started)
+
+        print(f"categorize: keyword loop {legacy:,.0f} rows/s, uncached model {uncached:,.0f} rows/s, "
+              f"suggest_category {compiled:,.0f} rows/s ({compiled / uncached:.1f}x uncached)")
+        assert compiled > uncached * 3
+        assert compiled > legacy / 2
+
+    def test_batch_categorize_latency(self, trained_model):
+        """A 10k-row batch (smart-categorize/batch, import auto_categorize) must take milliseconds"""
+        items = [(description, "expense") for description in self.statement()]
+        server.SUGGESTION_CACHE.update(version=None, entries={})
+
+        started = time.perf_counter()
+        results = server.suggest_categories(items)
+        elapsed = time.perf_counter() - started
+
+        print(f"batch categorize ({ROWS} rows, cold cache): {elapsed * 1000:.1f} ms")
+        assert results[0] == server.suggest_category(*items[0])
+        assert elapsed < 0.5
+
+
+class TestCategoryModelBenchmark:
+    """Naive Bayes category model: incremental learning and per-description inference"""
+
+    def test_inference_latency(self):
+        """Inference on a model trained from a 10k-row ledger must stay well under a millisecond"""
+        categories = ["Food", "Transport", "Bills", "Shopping", "Health", "Education"]
+        model = server.CategoryModel()
+        started = time.perf_counter()
+        for i in range(ROWS):
+            category = categories[i % len(categories)]
+            description = f"{category} merchant {i % 97} cabang {i % 13}"
+            model.learn(server.category_features(server.normalize_description(description)), category)
+        learn_us = (time.perf_counter() - started) / ROWS * 1e6
+
+        features = [server.category_features(server.normalize_description(f"health merchant {i % 97}")) for i in range(1000)]
+        model.predict(features[0])
+        started = time.perf_counter()
+        for f in features:
+            probabilities = model.predict(f)
+        predict_us = (time.perf_counter() - started) / len(features) * 1e6
+
+        print(f"category model: learn {learn_us:.1f} us/row, predict {predict_us:.1f} us/description")
+        assert next(iter(probabilities)) == "Health"
+        assert abs(sum(probabilities.values()) - 1) < 1e-9
+        assert predict_us < 1000
+
+
+def legacy_simulate(balances, rates, minimums, order, budget, months):
+    """Per-debt Python loop over one strategy: what a month-by-month projection costs without NumPy"""
+    balances = list(balances)
+    history = []
+    for _ in range(months):
+        payments = []
+        for i, rate in enumerate(rates):
+            balances[i] += balances[i] * rate / 100 / 12
+            payments.append(min(minimums[i], balances[i]))
+        leftover = max(budget - sum(payments), 0) if budget is not None else 0
+        for i in order:
+            extra = min(leftover, balances[i] - payments[i])
+            payments[i] += extra
+            leftover -= extra
+        for i in range(len(balances)):
+            balances[i] -= payments[i]
+            if balances[i] < server.DEBT_PAID_OFF:
+                balances[i] = 0
+        history.append(list(balances))
+        if not any(balances):
+            break
+    return history
+
+
+class TestDebtSimulationBenchmark:
+    """Vectorized strategy x debt amortization vs a per-debt loop per strategy"""
+
+    def test_simulation_throughput(self):
+        """30 debts over 360 months under four strategies must simulate in milliseconds"""
+        count, months = 30, 360
+        balances = [5_000_000 + 750_000 * i for i in range(count)]
+        rates = [6 + (i * 7) % 30 for i in range(count)]
+        minimums = [b * 0.004 + 40_000 for b in balances]
+        strategies = list(server.DEBT_STRATEGIES)
+        budget = sum(minimums) + 250_000
+
+        arrays = [server.np.array(values, dtype=float) for values in (balances, rates, minimums)]
+        orders = server.np.array([server.debt_priority(s, *arrays[:2], custom_order=[count - 1, 0]) for s in strategies])
+        budgets = [server.np.nan if s == "minimum" else budget for s in strategies]
+        server.simulate_debts(*arrays, orders, budgets, months)
+
+        started = time.perf_counter()
+        schedule = server.simulate_debts(*arrays, orders, budgets, months)
+        vectorized = time.perf_counter() - started
+
+        started = time.perf_counter()
+        legacy = [
+            legacy_simulate(balances, rates, minimums, orders[s].tolist(), None if strategy == "minimum" else budget, months)
+            for s, strategy in enumerate(strategies)
+        ]
+        looped = time.perf_counter() - started
+
+        print(f"debt simulation ({count} debts x {months} months x {len(strategies)} strategies): "
+              f"loop {looped * 1000:.1f} ms, vectorized {vectorized * 1000:.1f} ms ({looped / vectorized:.1f}x)")
+        for s, history in enumerate(legacy):
+            expected = server.np.array(history)
+            assert server.np.allclose(schedule["balance"][:len(expected), s], expected, rtol=1e-9, atol=1e-3)
+        assert vectorized < 0.1
+        assert vectorized < looped
+
+
+class TestDepositValuationBenchmark:
+    """Vectorized DepositBook accrual vs valuing deposits one document at a time"""
+
+    def test_accrual_throughput(self):
+        """Accrued interest on 10k deposits must be cheap enough for every dashboard request"""
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        now = datetime(2025, 6, 1, tzinfo=timezone.utc)
+        docs = [{
+            "id": f"dep-{i}",
+            "bank_name": f"Bank {i % 40}",
+            "amount": 1_000_000 + 5_000 * i,
+            "interest_rate": 3 + i % 4,
+            "start_date": start + timedelta(days=i % 400),
+            "maturity_date": start + timedelta(days=i % 400 + 30 * (1 + i % 12))
+        } for i in range(ROWS)]
+        book = server.DepositBook()
+        book.load(docs)
+        book.accrue(now)
+
+        started = time.perf_counter()
+        _, gross, tax = book.accrue(now)
+        vectorized = time.perf_counter() - started
+
+        started = time.perf_counter()
+        expected = []
+        for doc, tax_rate in zip(docs, book.tax_rate.tolist()):
+            elapsed = min(max(now - doc["start_date"], timedelta(0)), doc["maturity_date"] - doc["start_date"])
+            interest = doc["amount"] * doc["interest_rate"] / 100 * elapsed.days / server.DEPOSIT_DAY_COUNT
+            expected.append(interest * (1 - tax_rate))
+        looped = time.perf_counter() - started
+
+        print(f"deposit accrual ({ROWS} deposits): loop {looped * 1000:.2f} ms, vectorized {vectorized * 1000:.2f} ms ({looped / vectorized:.1f}x)")
+        assert server.np.allclose(gross - tax, expected)
+        assert vectorized < 0.005
+        assert vectorized < looped
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "-s"])
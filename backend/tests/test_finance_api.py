@@ -4,10 +4,16 @@ Tests: Dashboard, Budget Planner, Financial Goals, Transactions, Bills, Debts, S
 """
 import pytest
 import requests
+import json
+import math
 import os
-from datetime import datetime, timedelta
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
 
 BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+# Opt-in: wall-clock latency depends on the machine and network, so it is only checked when a budget is set
+ALERTS_LATENCY_BUDGET_MS = os.environ.get('ALERTS_LATENCY_BUDGET_MS')
 
 class TestHealthAndDashboard:
     """Test API health and dashboard endpoints"""
@@ -45,7 +51,39 @@ class TestHealthAndDashboard:
         assert "recurring_bills" in data
         assert "financial_goals" in data
         
+        # Per-section timings are exposed via Server-Timing
+        assert "accounts;dur=" in response.headers.get("Server-Timing", "")
+        
         print(f"Dashboard: Assets={data['total_assets']}, Liabilities={data['total_liabilities']}, Net Worth={data['net_worth']}")
+    
+    def test_alerts(self):
+        """Test alerts endpoint returns budget, goal and bill alerts"""
+        response = requests.get(f"{BASE_URL}/api/alerts")
+        assert response.status_code == 200
+        data = response.json()
+        assert isinstance(data, list)
+        for alert in data:
+            assert "type" in alert
+            assert "severity" in alert
+            assert "title" in alert
+            assert "message" in alert
+        print(f"Found {len(data)} alerts")
+    
+    @pytest.mark.skipif(not ALERTS_LATENCY_BUDGET_MS, reason="set ALERTS_LATENCY_BUDGET_MS to benchmark GET /alerts")
+    def test_alerts_latency_budget(self):
+        """Benchmark GET /alerts against its latency budget (nearest-rank p95 over 20 calls)"""
+        budget_ms = float(ALERTS_LATENCY_BUDGET_MS)
+        timings = []
+        for _ in range(20):
+            started = time.perf_counter()
+            response = requests.get(f"{BASE_URL}/api/alerts")
+            timings.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200
+        
+        timings.sort()
+        p95 = timings[math.ceil(len(timings) * 0.95) - 1]
+        assert p95 < budget_ms, f"GET /alerts p95 {p95:.1f}ms exceeds {budget_ms:.0f}ms"
+        print(f"Alerts latency: p50={timings[len(timings) // 2]:.1f}ms p95={p95:.1f}ms")
 
 
 class TestBudgetPlanner:
@@ -102,6 +140,34 @@ class TestBudgetPlanner:
         assert isinstance(data, list)
         print(f"Found {len(data)} budgets for {current_month}")
     
+    def test_get_budgets_by_months_range(self):
+        """Test getting a year of budget-vs-actual in one call"""
+        year = datetime.now().strftime('%Y')
+        response = requests.get(f"{BASE_URL}/api/budgets?months={year}-01:{year}-12")
+        assert response.status_code == 200
+        data = response.json()
+        assert isinstance(data, list)
+        for budget in data:
+            assert budget["month_year"].startswith(year)
+            assert "spent" in budget
+        print(f"Found {len(data)} budgets for {year}")
+    
+    def test_get_budgets_invalid_months(self):
+        """Test that a malformed months range is rejected"""
+        response = requests.get(f"{BASE_URL}/api/budgets?months=not-a-month")
+        assert response.status_code == 400
+        # Longer than the ten-year cap
+        response = requests.get(f"{BASE_URL}/api/budgets?months=2000-01:2025-12")
+        assert response.status_code == 400
+    
+    def test_get_budgets_unpadded_months(self):
+        """Test that unpadded months in a range are zero-padded"""
+        year = datetime.now().strftime('%Y')
+        padded = requests.get(f"{BASE_URL}/api/budgets?months={year}-01:{year}-03").json()
+        response = requests.get(f"{BASE_URL}/api/budgets?months={year}-1:{year}-3")
+        assert response.status_code == 200
+        assert [b["id"] for b in response.json()] == [b["id"] for b in padded]
+    
     def test_budget_summary(self):
         """Test budget summary endpoint"""
         response = requests.get(f"{BASE_URL}/api/budgets/summary")
@@ -314,6 +380,110 @@ class TestTransactions:
             assert tx["type"] == "expense"
         print(f"Found {len(data)} expense transactions")
     
+    def test_get_transactions_cursor_pagination(self):
+        """Test walking transactions page by page with X-Next-Cursor"""
+        seen_ids = []
+        url = f"{BASE_URL}/api/transactions?limit=5&sort_by=date&sort_order=desc"
+        response = requests.get(url)
+        for _ in range(3):
+            assert response.status_code == 200
+            seen_ids.extend(tx["id"] for tx in response.json())
+            next_cursor = response.headers.get("X-Next-Cursor")
+            if not next_cursor:
+                break
+            response = requests.get(f"{url}&cursor={next_cursor}")
+        
+        assert len(seen_ids) == len(set(seen_ids)), "Pages overlap"
+        print(f"Paged through {len(seen_ids)} transactions")
+    
+    def test_export_transactions_csv(self):
+        """Test streaming the ledger as CSV"""
+        response = requests.get(f"{BASE_URL}/api/transactions/export?format=csv&type=expense", stream=True)
+        assert response.status_code == 200
+        assert response.headers["Content-Type"].startswith("text/csv")
+        
+        lines = response.text.splitlines()
+        assert lines[0].startswith("id,date,description,amount")
+        print(f"Exported {len(lines) - 1} expense rows as CSV")
+    
+    def test_export_transactions_ndjson(self):
+        """Test streaming the ledger as NDJSON"""
+        response = requests.get(f"{BASE_URL}/api/transactions/export?format=ndjson", stream=True)
+        assert response.status_code == 200
+        
+        rows = [json.loads(line) for line in response.iter_lines() if line]
+        for row in rows:
+            assert "id" in row and "amount" in row
+        print(f"Exported {len(rows)} rows as NDJSON")
+    
+    def test_import_transactions(self):
+        """Test bulk import reports bad rows without aborting the batch"""
+        rows = [
+            {"description": "TEST_Import_1", "amount": 10000, "type": "expense", "category": "Food", "account": "Cash"},
+            {"description": "TEST_Import_Bad", "amount": "not-a-number", "type": "expense", "category": "Food", "account": "Cash"},
+            {"description": "TEST_Import_2", "amount": 20000, "type": "income", "category": "Other Income", "account": "Cash"}
+        ]
+        response = requests.post(f"{BASE_URL}/api/transactions/import", json=rows)
+        assert response.status_code == 200
+        data = response.json()
+        
+        assert data["imported"] == 2
+        assert data["failed"] == 1
+        assert data["errors"][0]["row"] == 1
+        
+        # Cleanup
+        for tx in requests.get(f"{BASE_URL}/api/transactions?search=TEST_Import").json():
+            requests.delete(f"{BASE_URL}/api/transactions/{tx['id']}")
+        print(f"Imported {data['imported']} rows, {data['failed']} rejected")
+    
+    def test_import_transactions_csv(self):
+        """Test bulk import from a CSV body"""
+        csv_body = "description,amount,type,category,account\nTEST_Import_CSV,15000,expense,Food,Cash\n"
+        response = requests.post(
+            f"{BASE_URL}/api/transactions/import",
+            data=csv_body,
+            headers={"Content-Type": "text/csv"}
+        )
+        assert response.status_code == 200
+        assert response.json()["imported"] == 1
+        
+        for tx in requests.get(f"{BASE_URL}/api/transactions?search=TEST_Import_CSV").json():
+            requests.delete(f"{BASE_URL}/api/transactions/{tx['id']}")
+    
+    def test_search_transactions_text_relevance(self):
+        """Test text search ranks the better match first and combines with filters"""
+        ids = []
+        for description in ["TEST_Search kopi kopi", "TEST_Search kopi", "TEST_Search teh"]:
+            tx_data = {"description": description, "amount": 1000, "type": "expense", "category": "Food", "account": "Cash"}
+            ids.append(requests.post(f"{BASE_URL}/api/transactions", json=tx_data).json()["id"])
+        
+        response = requests.get(f"{BASE_URL}/api/transactions?search=kopi&search_mode=text&sort_by=relevance&type=expense&category=Food")
+        assert response.status_code == 200
+        found = [tx["id"] for tx in response.json() if tx["id"] in ids]
+        assert found == ids[:2]
+        
+        for tx_id in ids:
+            requests.delete(f"{BASE_URL}/api/transactions/{tx_id}")
+    
+    def test_search_transactions_literal(self):
+        """Test the default literal search treats regex metacharacters as plain text"""
+        tx_data = {"description": "TEST_Literal (a+b)*", "amount": 1000, "type": "expense", "category": "Food", "account": "Cash"}
+        tx_id = requests.post(f"{BASE_URL}/api/transactions", json=tx_data).json()["id"]
+        
+        response = requests.get(f"{BASE_URL}/api/transactions", params={"search": "(a+b)*"})
+        assert response.status_code == 200
+        assert tx_id in [tx["id"] for tx in response.json()]
+        
+        response = requests.get(f"{BASE_URL}/api/transactions?sort_by=relevance")
+        assert response.status_code == 400
+        
+        requests.delete(f"{BASE_URL}/api/transactions/{tx_id}")
+    
+    def test_get_transactions_rejects_unindexed_sort(self):
+        """Test that sort_by is restricted to indexed fields"""
+        response = requests.get(f"{BASE_URL}/api/transactions?sort_by=description")
+        assert response.status_code == 400
+    
     def test_transaction_stats(self):
         """Test transaction statistics endpoint"""
         response = requests.get(f"{BASE_URL}/api/transactions/stats")
@@ -595,6 +765,124 @@ class TestDebts:
         assert delete_response.status_code == 200
         print(f"Successfully deleted debt: {debt_id}")
     
+    def test_debt_payments_close_debt(self):
+        """Test paying a debt down to zero through the payment ledger"""
+        debt_data = {
+            "debt_type": "Installment",
+            "creditor": "TEST_Payment_Debt",
+            "principal_amount": 1000000,
+            "current_balance": 1000000,
+            "interest_rate": 0,
+            "monthly_payment": 500000,
+            "remaining_installments": 2,
+            "due_date": "20"
+        }
+        debt_id = requests.post(f"{BASE_URL}/api/debts", json=debt_data).json()["id"]
+        
+        response = requests.post(f"{BASE_URL}/api/debts/{debt_id}/payments", json={"amount": 400000, "account": "Cash"})
+        assert response.status_code == 200
+        first = response.json()
+        assert first["balance_after"] == 600000
+        assert first["transaction_id"]
+        
+        # Overpaying is rejected without touching the balance
+        response = requests.post(f"{BASE_URL}/api/debts/{debt_id}/payments", json={"amount": 700000, "account": "Cash"})
+        assert response.status_code == 400
+        
+        response = requests.post(f"{BASE_URL}/api/debts/{debt_id}/payments", json={"amount": 600000, "account": "Cash"})
+        assert response.status_code == 200
+        assert response.json()["balance_after"] == 0
+        
+        debt = next(d for d in requests.get(f"{BASE_URL}/api/debts").json() if d["id"] == debt_id)
+        assert debt["current_balance"] == 0
+        assert debt["remaining_installments"] == 0
+        assert debt["is_active"] == False
+        
+        payments = requests.get(f"{BASE_URL}/api/debts/{debt_id}/payments").json()
+        assert len(payments) == 2
+        
+        # Cleanup
+        for payment in payments:
+            requests.delete(f"{BASE_URL}/api/transactions/{payment['transaction_id']}")
+        requests.delete(f"{BASE_URL}/api/debts/{debt_id}")
+    
+    def test_charge_debt_keeps_its_creditor(self):
+        """Test that an auto-created charge debt cannot be renamed, and that closing it frees the card for a new debt"""
+        tx_data = {
+            "description": "TEST_Charge_Lock",
+            "amount": 200000,
+            "type": "expense",
+            "category": "Shopping",
+            "account": "TEST_Charge_Lock_Card",
+            "payment_method": "Credit Card",
+            "status": "Completed"
+        }
+        tx_ids = [requests.post(f"{BASE_URL}/api/transactions", json=tx_data).json()["id"]]
+        debt = next(d for d in requests.get(f"{BASE_URL}/api/debts").json() if d["creditor"] == "TEST_Charge_Lock_Card")
+        
+        response = requests.put(f"{BASE_URL}/api/debts/{debt['id']}", json={"creditor": "TEST_Renamed_Card"})
+        assert response.status_code == 400
+        # Resending the whole form, as the edit dialog does, is allowed
+        response = requests.put(f"{BASE_URL}/api/debts/{debt['id']}", json={**debt, "notes": "TEST"})
+        assert response.status_code == 200
+        
+        tx_ids.append(requests.post(f"{BASE_URL}/api/transactions", json=tx_data).json()["id"])
+        debts = [d for d in requests.get(f"{BASE_URL}/api/debts").json() if d["creditor"] == "TEST_Charge_Lock_Card"]
+        assert len(debts) == 1
+        assert debts[0]["current_balance"] == 400000
+        
+        # Closing the debt lets the next charge open a fresh one
+        response = requests.put(f"{BASE_URL}/api/debts/{debt['id']}", json={"is_active": False})
+        assert response.status_code == 200
+        tx_ids.append(requests.post(f"{BASE_URL}/api/transactions", json=tx_data).json()["id"])
+        debts = [d for d in requests.get(f"{BASE_URL}/api/debts").json() if d["creditor"] == "TEST_Charge_Lock_Card"]
+        assert len(debts) == 2
+        reopened = next(d for d in debts if d["id"] != debt["id"])
+        assert reopened["is_active"] is True
+        assert reopened["current_balance"] == 200000
+        
+        # Cleanup
+        for tx_id in tx_ids:
+            requests.delete(f"{BASE_URL}/api/transactions/{tx_id}")
+        for d in debts:
+            requests.delete(f"{BASE_URL}/api/debts/{d['id']}")
+    
+    def test_simulate_debt_strategies(self):
+        """Test comparing avalanche, snowball and minimum-payment payoff of the active debts"""
+        debt_data = {
+            "debt_type": "Personal Loan",
+            "creditor": "TEST_Simulate_Debt",
+            "principal_amount": 6000000,
+            "current_balance": 6000000,
+            "interest_rate": 18,
+            "monthly_payment": 300000,
+            "remaining_installments": 24,
+            "due_date": "10"
+        }
+        debt_id = requests.post(f"{BASE_URL}/api/debts", json=debt_data).json()["id"]
+        
+        response = requests.post(f"{BASE_URL}/api/debts/simulate", json={
+            "strategies": ["avalanche", "snowball", "minimum"],
+            "extra_payment": 500000,
+            "debt_ids": [debt_id]
+        })
+        assert response.status_code == 200
+        data = response.json()
+        
+        assert data["debts"] == 1
+        results = {result["strategy"]: result for result in data["strategies"]}
+        assert results["avalanche"]["months_to_payoff"] < results["minimum"]["months_to_payoff"]
+        assert results["avalanche"]["total_interest"] < results["minimum"]["total_interest"]
+        assert results["avalanche"]["schedule"][-1]["balance"] == 0
+        assert len(results["avalanche"]["debts"][0]["balances"]) == results["avalanche"]["months_to_payoff"]
+        
+        # Unknown strategies are rejected
+        response = requests.post(f"{BASE_URL}/api/debts/simulate", json={"strategies": ["fastest"]})
+        assert response.status_code == 400
+        
+        # Cleanup
+        requests.delete(f"{BASE_URL}/api/debts/{debt_id}")
+    
     def test_debt_ratios_via_balance_sheet(self):
         """Test debt ratios via balance sheet endpoint (debt-ratios endpoint not implemented)"""
         response = requests.get(f"{BASE_URL}/api/analytics/balance-sheet")
@@ -664,6 +952,18 @@ class TestAccounts:
         delete_response = requests.delete(f"{BASE_URL}/api/accounts/{account_id}")
         assert delete_response.status_code == 200
         print(f"Successfully deleted account: {account_id}")
+    
+    def test_duplicate_account_name_ignores_case(self):
+        """Test that account names are unique regardless of case, including regex metacharacters"""
+        account_data = {"name": "TEST_Dup (BCA)+", "type": "Bank", "balance": 0}
+        create_response = requests.post(f"{BASE_URL}/api/accounts", json=account_data)
+        assert create_response.status_code == 200
+        account_id = create_response.json()["id"]
+        
+        duplicate_response = requests.post(f"{BASE_URL}/api/accounts", json={**account_data, "name": "test_dup (bca)+"})
+        assert duplicate_response.status_code == 400
+        
+        requests.delete(f"{BASE_URL}/api/accounts/{account_id}")
 
 
 class TestAnalytics:
@@ -685,6 +985,24 @@ class TestAnalytics:
         assert isinstance(data, dict)
         print(f"Category analytics: {len(data)} categories")
     
+    def test_analytics_with_date_range(self):
+        """Test analytics endpoints accept date range and type filters"""
+        params = "date_from=2025-01-01&date_to=2025-12-31&type=expense"
+        
+        monthly = requests.get(f"{BASE_URL}/api/analytics/monthly?{params}")
+        assert monthly.status_code == 200
+        for month, totals in monthly.json().items():
+            assert month.startswith("2025-")
+            assert totals["income"] == 0
+        
+        category = requests.get(f"{BASE_URL}/api/analytics/category?{params}")
+        assert category.status_code == 200
+        for cat, totals in category.json().items():
+            assert "income" in totals
+            assert "expense" in totals
+            assert "count" in totals
+        print(f"Filtered analytics: {len(monthly.json())} months, {len(category.json())} categories")
+    
     def test_balance_sheet(self):
         """Test balance sheet endpoint"""
         response = requests.get(f"{BASE_URL}/api/analytics/balance-sheet")
@@ -739,6 +1057,105 @@ class TestInvestments:
         assert isinstance(data, list)
         print(f"Found {len(data)} deposits")
     
+    def test_deposit_valuation_accrues_interest(self):
+        """Test accrued interest and tax withholding on a deposit above the tax-free limit"""
+        start = datetime.now(timezone.utc) - timedelta(days=73)
+        deposit_data = {
+            "bank_name": "TEST_Valuation_Bank",
+            "amount": 100000000,
+            "tenor_months": 12,
+            "interest_rate": 5,
+            "start_date": start.isoformat()
+        }
+        deposit_id = requests.post(f"{BASE_URL}/api/deposits", json=deposit_data).json()["id"]
+        
+        response = requests.get(f"{BASE_URL}/api/deposits/valuation")
+        assert response.status_code == 200
+        data = response.json()
+        valuation = next(d for d in data["deposits"] if d["id"] == deposit_id)
+        
+        # 100M x 5% x 73/365 = 1M gross, 20% withheld
+        assert valuation["days_accrued"] == 73
+        assert valuation["gross_interest"] == 1000000
+        assert valuation["tax_withheld"] == 200000
+        assert valuation["value"] == 100800000
+        assert valuation["tax_exempt"] == False
+        
+        # Cleanup
+        requests.delete(f"{BASE_URL}/api/deposits/{deposit_id}")
+    
+    def test_bulk_price_update_revalues_holdings(self):
+        """Test a CSV quote sheet revaluing a stock by ticker, ignoring case"""
+        # Stored prices have no delete route, so every run quotes a fresh symbol
+        symbol = f"TEST_ZZ_{uuid.uuid4().hex[:8].upper()}"
+        stock_data = {
+            "ticker": symbol.lower(),
+            "name": "TEST_Price_Stock",
+            "securities": "TEST_Sekuritas",
+            "lots": 2,
+            "buy_price": 1000,
+            "current_price": 1000
+        }
+        stock_id = requests.post(f"{BASE_URL}/api/stocks", json=stock_data).json()["id"]
+        
+        sheet = f"asset_class,symbol,price\nstocks,{symbol},1250\ncrypto,BTC,1\n"
+        response = requests.post(f"{BASE_URL}/api/prices/bulk", data=sheet, headers={"Content-Type": "text/csv"})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["accepted"] == 1
+        assert data["errors"][0]["row"] == 1
+        assert data["revalued"]["stocks"] >= 1
+        
+        stock = next(s for s in requests.get(f"{BASE_URL}/api/stocks").json() if s["id"] == stock_id)
+        assert stock["current_price"] == 1250
+        assert stock["price_as_of"] is not None
+        
+        # A quote older than the stored one is ignored
+        stale = [{"asset_class": "stocks", "symbol": symbol, "price": 1, "quoted_at": "2000-01-01T00:00:00Z"}]
+        data = requests.post(f"{BASE_URL}/api/prices/bulk", json=stale).json()
+        assert data["stale_quotes"] == 1
+        
+        prices = requests.get(f"{BASE_URL}/api/prices", params={"asset_class": "stocks"}).json()
+        assert any(p["symbol"] == symbol and p["price"] == 1250 for p in prices)
+        
+        # Cleanup
+        requests.delete(f"{BASE_URL}/api/stocks/{stock_id}")
+    
+    def test_price_history_downsamples_to_candles(self):
+        """Test that quote sheets build a price history served as daily OHLC candles"""
+        symbol = f"TEST_History_Fund_{uuid.uuid4().hex[:8].upper()}"
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        quotes = [{
+            "asset_class": "mutual_funds",
+            "symbol": symbol,
+            "price": 1000 + i,
+            "quoted_at": (start + timedelta(hours=6 * i)).isoformat()
+        } for i in range(4 * 30)]
+        response = requests.post(f"{BASE_URL}/api/prices/bulk", json={"quotes": quotes})
+        assert response.status_code == 200
+        assert response.json()["history_points"] == len(quotes)
+        
+        params = {
+            "asset_class": "mutual_funds",
+            "symbol": symbol.lower(),
+            "start": start.isoformat(),
+            "end": (start + timedelta(days=30)).isoformat()
+        }
+        response = requests.get(f"{BASE_URL}/api/prices/history", params=params)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["interval"] == "day"
+        assert len(data["points"]) == 30
+        first = data["points"][0]
+        assert (first["open"], first["high"], first["low"], first["close"], first["count"]) == (1000, 1003, 1000, 1003, 4)
+        
+        # Weekly candles cover the same points
+        weekly = requests.get(f"{BASE_URL}/api/prices/history", params={**params, "interval": "week"}).json()
+        assert sum(candle["count"] for candle in weekly["points"]) == len(quotes)
+        
+        response = requests.get(f"{BASE_URL}/api/prices/history", params={**params, "interval": "hour"})
+        assert response.status_code == 400
+    
     def test_get_gold(self):
         """Test getting gold investments"""
         response = requests.get(f"{BASE_URL}/api/gold")
@@ -756,5 +1173,269 @@ class TestInvestments:
         print(f"Found {len(data)} mutual funds")
 
 
+class TestSmartCategorize:
+    """Test keyword-based smart categorization"""
+    
+    def test_smart_categorize(self):
+        """Test that keywords only match whole words and the longest keyword wins"""
+        response = requests.post(f"{BASE_URL}/api/smart-categorize", params={"description": "Bayar RUMAH SAKIT 8812"})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["suggested_category"] == "Health"
+        assert data["matched_keyword"] == "rumah sakit"
+        
+        # "fee" inside "coffee" is not a keyword match
+        response = requests.post(f"{BASE_URL}/api/smart-categorize", params={"description": "coffee"})
+        assert response.json()["confidence"] == "low"
+    
+    def test_smart_categorize_batch(self):
+        """Test categorizing many descriptions in one call, in request order"""
+        descriptions = ["GOFOOD 123", "Tagihan listrik", "something else"] * 1000
+        response = requests.post(f"{BASE_URL}/api/smart-categorize/batch", json={"descriptions": descriptions})
+        assert response.status_code == 200
+        results = response.json()["results"]
+        
+        assert len(results) == len(descriptions)
+        assert [r["suggested_category"] for r in results[:3]] == ["Food", "Bills", "Other Expense"]
+    
+    def test_smart_categorize_learns_from_ledger(self):
+        """Test that the category model picks up categories from newly created transactions"""
+        ids = []
+        for i in range(10):
+            tx_data = {"description": f"TEST_Learn qwzxkursus {i}", "amount": 1000, "type": "expense", "category": "Education", "account": "Cash"}
+            ids.append(requests.post(f"{BASE_URL}/api/transactions", json=tx_data).json()["id"])
+        
+        response = requests.post(f"{BASE_URL}/api/smart-categorize", params={"description": "qwzxkursus", "type": "expense"})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["suggested_category"] == "Education"
+        assert data["source"] == "model"
+        assert 0 < data["probability"] <= 1
+        
+        for tx_id in ids:
+            requests.delete(f"{BASE_URL}/api/transactions/{tx_id}")
+    
+    def test_import_auto_categorize(self):
+        """Test that imports fill in missing categories when asked to"""
+        csv_body = "description,amount,type,account\nTEST_AutoCat gofood,15000,expense,Cash\n"
+        response = requests.post(
+            f"{BASE_URL}/api/transactions/import?auto_categorize=true",
+            data=csv_body,
+            headers={"Content-Type": "text/csv"}
+        )
+        assert response.status_code == 200
+        assert response.json()["imported"] == 1
+        
+        transactions = requests.get(f"{BASE_URL}/api/transactions?search=TEST_AutoCat").json()
+        assert transactions[0]["category"] == "Food"
+        for tx in transactions:
+            requests.delete(f"{BASE_URL}/api/transactions/{tx['id']}")
+
+
+class TestCategorizationRules:
+    """Test user-defined categorization rules"""
+    
+    def test_rule_applies_on_insert(self):
+        """Test that a matching rule classifies a new transaction"""
+        rule_data = {"name": "TEST_Rule", "description_pattern": "TEST_RuleMart", "max_amount": 100000,
+                     "category": "Shopping", "sub_category": "Needs", "add_tags": ["groceries"]}
+        rule = requests.post(f"{BASE_URL}/api/categorization-rules", json=rule_data).json()
+        
+        tx_data = {"description": "TEST_RuleMart 123", "amount": 50000, "type": "expense", "category": "Other Expense", "account": "Cash"}
+        tx = requests.post(f"{BASE_URL}/api/transactions", json=tx_data).json()
+        assert tx["category"] == "Shopping"
+        assert tx["sub_category"] == "Needs"
+        assert "groceries" in tx["tags"]
+        
+        # Above max_amount the rule does not match
+        big = requests.post(f"{BASE_URL}/api/transactions", json={**tx_data, "amount": 500000}).json()
+        assert big["category"] == "Other Expense"
+        
+        requests.delete(f"{BASE_URL}/api/categorization-rules/{rule['id']}")
+        for tx_id in [tx["id"], big["id"]]:
+            requests.delete(f"{BASE_URL}/api/transactions/{tx_id}")
+    
+    def test_rule_applies_retroactively(self):
+        """Test applying a rule to existing transactions without moving balances"""
+        tx_data = {"description": "TEST_RetroRule kedai", "amount": 25000, "type": "expense", "category": "Other Expense", "account": "Cash"}
+        tx_id = requests.post(f"{BASE_URL}/api/transactions", json=tx_data).json()["id"]
+        summary_before = requests.get(f"{BASE_URL}/api/dashboard").json()
+        
+        rule_data = {"name": "TEST_Retro", "description_pattern": "^TEST_RetroRule", "pattern_type": "regex", "category": "Food"}
+        rule = requests.post(f"{BASE_URL}/api/categorization-rules", json=rule_data).json()
+        response = requests.post(f"{BASE_URL}/api/categorization-rules/{rule['id']}/apply")
+        assert response.status_code == 200
+        assert response.json()["updated"] >= 1
+        
+        txs = requests.get(f"{BASE_URL}/api/transactions?search=TEST_RetroRule").json()
+        assert [t["category"] for t in txs if t["id"] == tx_id] == ["Food"]
+        summary_after = requests.get(f"{BASE_URL}/api/dashboard").json()
+        assert summary_after["liquid_assets"] == summary_before["liquid_assets"]
+        
+        requests.delete(f"{BASE_URL}/api/categorization-rules/{rule['id']}")
+        requests.delete(f"{BASE_URL}/api/transactions/{tx_id}")
+    
+    def test_rule_validation(self):
+        """Test that rules without conditions or with broken regexes are rejected"""
+        response = requests.post(f"{BASE_URL}/api/categorization-rules", json={"name": "TEST_Empty", "category": "Food"})
+        assert response.status_code == 400
+        response = requests.post(f"{BASE_URL}/api/categorization-rules", json={
+            "name": "TEST_BadRegex", "description_pattern": "(", "pattern_type": "regex", "category": "Food"
+        })
+        assert response.status_code == 400
+
+
+class TestAdmin:
+    """Test admin/maintenance endpoints"""
+    
+    def test_index_catalog_in_sync(self):
+        """Test that every declared index exists in MongoDB"""
+        response = requests.get(f"{BASE_URL}/api/admin/indexes")
+        assert response.status_code == 200
+        data = response.json()
+        
+        assert "in_sync" in data
+        assert "transactions" in data["collections"]
+        for name, report in data["collections"].items():
+            assert report["missing"] == [], f"Missing indexes on {name}: {report['missing']}"
+        print(f"Index catalog in sync: {data['in_sync']}")
+    
+    def test_datetime_migration_status(self):
+        """Test the datetime migration reports per-collection progress"""
+        response = requests.get(f"{BASE_URL}/api/admin/migrations/datetime")
+        assert response.status_code == 200
+        data = response.json()
+        assert "done" in data
+        assert "collections" in data
+        print(f"Datetime migration done: {data['done']}")
+    
+    def test_transaction_dates_round_trip(self):
+        """Test that a transaction date filter matches a natively stored date"""
+        tx_data = {
+            "description": "TEST_Native_Date",
+            "amount": 1000,
+            "type": "expense",
+            "category": "Other Expense",
+            "account": "Cash",
+            "date": "2024-03-15T08:30:00+07:00"
+        }
+        tx_id = requests.post(f"{BASE_URL}/api/transactions", json=tx_data).json()["id"]
+        
+        # 08:30 at +07:00 is 01:30 UTC on the same day
+        response = requests.get(f"{BASE_URL}/api/transactions?date_from=2024-03-15&date_to=2024-03-15&search=TEST_Native_Date")
+        assert response.status_code == 200
+        assert tx_id in [tx["id"] for tx in response.json()]
+        
+        requests.delete(f"{BASE_URL}/api/transactions/{tx_id}")
+    
+    def test_recurring_bills_migration_status(self):
+        """Test the legacy bills migration status endpoint and stable recurring bill ids"""
+        response = requests.get(f"{BASE_URL}/api/admin/migrations/recurring-bills")
+        assert response.status_code == 200
+        assert "done" in response.json()
+        
+        first = [b["id"] for b in requests.get(f"{BASE_URL}/api/recurring-bills").json()]
+        second = [b["id"] for b in requests.get(f"{BASE_URL}/api/recurring-bills").json()]
+        assert first == second
+        assert len(first) == len(set(first))
+    
+    def test_adhoc_recurring_item_is_not_scheduled(self):
+        """Test that an ad-hoc item is accepted but never scheduled, and malformed frequencies are rejected"""
+        item_data = {"name": "TEST_Adhoc_Item", "amount": 1000, "type": "expense", "category": "Bills",
+                     "account": "Cash", "frequency": "adhoc"}
+        response = requests.post(f"{BASE_URL}/api/recurring-bills", json=item_data)
+        assert response.status_code == 200
+        item = response.json()
+        assert item["next_due"] is None
+        
+        response = requests.put(f"{BASE_URL}/api/recurring-bills/{item['id']}", json={"frequency": "adhoc", "amount": 2000})
+        assert response.status_code == 200
+        response = requests.post(f"{BASE_URL}/api/recurring-bills", json={**item_data, "frequency": "every 2 days"})
+        assert response.status_code == 400
+        
+        requests.delete(f"{BASE_URL}/api/recurring-bills/{item['id']}")
+    
+    def test_recurring_scheduler_generates_due_items(self):
+        """Test that a due daily recurring item is generated once and rescheduled"""
+        item_data = {"name": "TEST_Scheduler_Daily", "amount": 1000, "type": "expense", "category": "Food",
+                     "account": "Cash", "frequency": "Daily"}
+        item = requests.post(f"{BASE_URL}/api/recurring-bills", json=item_data).json()
+        assert item["next_due"] is not None
+        
+        yesterday = (datetime.now(timezone.utc) - timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        requests.put(f"{BASE_URL}/api/recurring-bills/{item['id']}", json={"next_due": yesterday.isoformat()})
+        
+        response = requests.post(f"{BASE_URL}/api/admin/recurring/run")
+        generated = []
+        if response.status_code == 200:
+            payments = requests.get(f"{BASE_URL}/api/recurring-payments").json()
+            generated = [p for p in payments if p["recurring_id"] == item["id"]]
+            assert len(generated) >= 1
+            # A second run finds nothing due for this item
+            requests.post(f"{BASE_URL}/api/admin/recurring/run")
+            payments = requests.get(f"{BASE_URL}/api/recurring-payments").json()
+            assert len([p for p in payments if p["recurring_id"] == item["id"]]) == len(generated)
+            for payment in generated:
+                requests.delete(f"{BASE_URL}/api/transactions/{payment['transaction_id']}")
+        else:
+            # Another worker holds the scheduler lease
+            assert response.status_code == 409
+        
+        # Deleting the item keeps its payment history
+        requests.delete(f"{BASE_URL}/api/recurring-bills/{item['id']}")
+        payments = requests.get(f"{BASE_URL}/api/recurring-payments").json()
+        assert len([p for p in payments if p["recurring_id"] == item["id"]]) == len(generated)
+
+    def test_reactivated_recurring_item_skips_paused_periods(self):
+        """Test that reactivating a paused item does not back-generate the periods it was paused for"""
+        item_data = {"name": "TEST_Scheduler_Paused", "amount": 1000, "type": "expense", "category": "Food",
+                     "account": "Cash", "frequency": "Daily"}
+        item = requests.post(f"{BASE_URL}/api/recurring-bills", json=item_data).json()
+
+        requests.put(f"{BASE_URL}/api/recurring-bills/{item['id']}", json={"is_active": False})
+        last_week = (datetime.now(timezone.utc) - timedelta(days=7)).replace(hour=0, minute=0, second=0, microsecond=0)
+        requests.put(f"{BASE_URL}/api/recurring-bills/{item['id']}", json={"next_due": last_week.isoformat()})
+        response = requests.put(f"{BASE_URL}/api/recurring-bills/{item['id']}", json={"is_active": True})
+        assert response.status_code == 200
+
+        response = requests.post(f"{BASE_URL}/api/admin/recurring/run")
+        assert response.status_code in (200, 409)
+        payments = requests.get(f"{BASE_URL}/api/recurring-payments").json()
+        assert [p for p in payments if p["recurring_id"] == item["id"]] == []
+
+        requests.delete(f"{BASE_URL}/api/recurring-bills/{item['id']}")
+
+    def test_rebuild_category_model(self):
+        """Test retraining the category model from the ledger"""
+        response = requests.post(f"{BASE_URL}/api/admin/category-model/rebuild")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["documents"] >= 0
+        print(f"Category model: {data['categories']} categories from {data['documents']} transactions")
+    
+    def test_dashboard_summary_matches_rebuild(self):
+        """Test that the incrementally maintained summary matches a full rebuild"""
+        tx_data = {
+            "description": "TEST_Summary_Income",
+            "amount": 125000,
+            "type": "income",
+            "category": "Other Income",
+            "account": "Cash"
+        }
+        tx_id = requests.post(f"{BASE_URL}/api/transactions", json=tx_data).json()["id"]
+        
+        before = requests.get(f"{BASE_URL}/api/dashboard").json()
+        rebuilt = requests.post(f"{BASE_URL}/api/admin/dashboard-summary/rebuild")
+        assert rebuilt.status_code == 200
+        after = requests.get(f"{BASE_URL}/api/dashboard").json()
+        
+        for field in ["total_assets", "total_liabilities", "net_worth", "total_income", "total_expense"]:
+            assert abs(before[field] - after[field]) < 0.01, f"{field} drifted: {before[field]} != {after[field]}"
+        assert before["total_transactions"] == after["total_transactions"]
+        
+        requests.delete(f"{BASE_URL}/api/transactions/{tx_id}")
+        print(f"Summary in sync: net worth {after['net_worth']}")
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v", "--tb=short"])